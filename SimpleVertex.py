@@ -1,8 +1,16 @@
 class SimpleVertex():
 
-    def __init__(self, graph_idx, label):
+    def __init__(self, graph_idx, label, idx=None):
         self.graph_idx = graph_idx
         self.label = label
+        # the dense id of this vertex in the CSRGraph it was created from
+        self.idx = idx
+        # the SimpleVertex objects of the neighbours, only for the copies made by utilities.copy_vertices()
+        self.neighbours = None
+
+    @property
+    def degree(self):
+        return len(self.neighbours)
 
 
     # def __init__(self, colornum, nb, graph_idx, label):
@@ -8,6 +8,7 @@ This module contains some basic permutation group algorithms, for:
 Most important functions:
 
  Orbit		(computes orbit and transversal)
+ SchreierVector	(a transversal stored as a Schreier tree, with lazy coset representatives)
  Stabilizer	(computes generators for a stabilizer subgroup)
 
 Use this with permutation objects generated by the module permv2.py
@@ -20,8 +21,73 @@ Use this with permutation objects generated by the module permv2.py
 
 
 from permv2 import permutation
+import search_stats
 
-def Orbit(generators,el,returntransversal=False):
+class SchreierVector:
+	"""
+	A Schreier vector (Schreier tree) for the orbit of <root> under <generators>.
+	Instead of a full permutation for every orbit point, it only stores, for every point p,
+	the index of the generator P that first reached p, and the point q with P[q]=p.
+	The coset representative of p is then reconstructed on demand, by walking up the tree
+	to the root. This takes O(n) memory instead of O(|O|*n).
+	
+	It can be used as the transversal <U> returned by Orbit:
+	len(S) is the orbit length, and S[i] is a permutation that maps <root> to S.orbit[i].
+	"""
+	def __init__(self,generators,root):
+		n=generators[0].n
+		self.generators=generators
+		self.root=root
+		self.n=n
+		self.orbit=[root]
+		# label[p]: index of the generator that reached p, -1 for the root, None if p is not in the orbit
+		self.label=[None]*n
+		# parent[p]: the point q with generators[label[p]][q]=p
+		self.parent=[None]*n
+		# positions[p]: the index of p in self.orbit
+		self.positions=[None]*n
+		self.label[root]=-1
+		self.positions[root]=0
+		ind=0
+		while ind<len(self.orbit):
+			el=self.orbit[ind]
+			for i in range(len(generators)):
+				mapel=generators[i][el]
+				if self.label[mapel] is None:
+					self.label[mapel]=i
+					self.parent[mapel]=el
+					self.positions[mapel]=len(self.orbit)
+					self.orbit.append(mapel)
+			ind+=1
+
+	def __len__(self):
+		return len(self.orbit)
+
+	def __contains__(self,el):
+		return self.label[el] is not None
+
+	def __getitem__(self,i):
+		return self.representative(self.orbit[i])
+
+	def position(self,el):
+		"""
+		Returns the index of <el> in the orbit in O(1), or None if <el> is not in the orbit.
+		"""
+		return self.positions[el]
+
+	def representative(self,el):
+		"""
+		Returns a permutation that maps the root to <el>, or None if <el> is not in the orbit.
+		"""
+		if self.label[el] is None:
+			return None
+		U=permutation(self.n)
+		while el!=self.root:
+			U=U*self.generators[self.label[el]]
+			el=self.parent[el]
+		return U
+
+def Orbit(generators,el,returntransversal=False,schreiervector=False):
 	"""
 	<generators> should be a Python list of permutations (from permv2.py), which
 	represent a generating set of a permutation group H.
@@ -32,6 +98,9 @@ def Orbit(generators,el,returntransversal=False):
 	If <returntransversal> = True, it also returns a transversal <U>, which is
 	an equal length python list:
 	For every index i, U[i] is a permutation from H that maps <el> to O[i].
+	If also <schreiervector> = True, U is a SchreierVector object instead, which
+	supports the same len(U) and U[i], but computes U[i] only when it is asked for,
+	and finds the index of a point in O with U.position(point).
 	
 	(The lists O and U are returned as a 2-tuple.)
 	
@@ -40,6 +109,12 @@ def Orbit(generators,el,returntransversal=False):
 	O=[el]
 	if len(generators)==0:
 		return O,None
+	if schreiervector:
+		S=SchreierVector(generators,el)
+		if returntransversal:
+			return S.orbit,S
+		else:
+			return S.orbit
 	n=generators[0].n
 	memberVec=[0]*n
 	memberVec[el]=1
@@ -63,7 +138,7 @@ def Orbit(generators,el,returntransversal=False):
 	else:
 		return O
 	
-def SchreierGenerators(generators,el):
+def SchreierGenerators(generators,el,schreiervector=False):
 	"""
 	(Mostly for internal use.)
 	Given a generating set <generators> (a Python list containing permutations) that
@@ -71,16 +146,31 @@ def SchreierGenerators(generators,el):
 	this function returns a number of permutations that are in the <el>-stabilizer subgroup
 	of H, which is in fact a generating set for this stabilizer subgroup.
 	This may be a long list, which may even contain duplicates.
+	With <schreiervector> = True, the transversal is kept as a SchreierVector
+	(see Orbit), and the Schreier generators of tree edges, which are trivial, are skipped.
 	"""
-	O,U=Orbit(generators,el,True)
+	O,U=Orbit(generators,el,True,schreiervector)
+	if schreiervector:
+		positions=U.positions
+	else:
+		positions=[None]*generators[0].n
+		for ind in range(len(O)):
+			positions[O[ind]]=ind
 	SchrGen=[]
 	for ind in range(len(O)):
 		el=O[ind]
-		for P in generators:
-			mapel=O.index(P[el])
-			newgen=-U[mapel]*P*U[ind]
+		Uind=U[ind]
+		for i in range(len(generators)):
+			P=generators[i]
+			image=P[el]
+			if schreiervector and U.label[image]==i and U.parent[image]==el:
+				continue
+			newgen=-U[positions[image]]*P*Uind
 			if not newgen.istrivial():
 				SchrGen.append(newgen)
+	stats=search_stats.current()
+	if stats is not None:
+		stats.schreier_generators+=len(SchrGen)
 	return SchrGen
 
 
@@ -115,7 +205,9 @@ def Reduce(generators,wordy=0):
 	n=generators[0].n
 	outputgenerators=[]
 	todo=generators
+	iterations=0
 	while todo!=[]:
+		iterations+=1
 		el=FindNonTrivialOrbit(todo)
 		if el==None:	# can happen if the input (erroneously) contains trivial permutations
 			break
@@ -139,12 +231,15 @@ def Reduce(generators,wordy=0):
 				if not Q.istrivial():
 					todonext.append(Q)
 		todo=todonext
+	stats=search_stats.current()
+	if stats is not None:
+		stats.reduce_iterations+=iterations
 	if wordy>=1:
 		print("  Output length:",len(outputgenerators))
 	return outputgenerators
 
 
-def Stabilizer(generators,el):
+def Stabilizer(generators,el,schreiervector=False):
 	"""
 	<generators> should be a python list containing permutations (from permv2.py),
 	which is viewed as a generating set for a group H.
@@ -152,6 +247,7 @@ def Stabilizer(generators,el):
 	
 	This function returns a generating set for H_{el}, the stabilizer subgroup of H
 	for element <el>. The generating set has size less than n^2.
+	With <schreiervector> = True, the transversal is kept as a SchreierVector (see Orbit),
+	which needs O(n) instead of O(|orbit|*n) memory.
 	"""
-	return Reduce(SchreierGenerators(generators,el),0)
-
+	return Reduce(SchreierGenerators(generators,el,schreiervector),0)
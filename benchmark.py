@@ -0,0 +1,349 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import zipfile
+from datetime import datetime
+
+from grl_stream import iter_grl
+from utilities import initialization_automorphism_csr, get_info, color_refinement, generating_set_search, \
+    order_computing
+from final_AUT import GI, AUT_generators_readcsr
+from twins import TwinQuotient
+from trees import is_forest
+from csr_graph import connected_components, sparse_side
+from search_stats import collecting
+from target_cells import STRATEGIES
+from result_cache import encode_count
+from graph_families import cycle, path, hypercube, cartesian_product, relabel, threepaths, torus_family, \
+    products_family, cubes_family, trees_family, complement_graph, write_grl
+
+# Benchmark runner over a fixed corpus, with per-phase timings and regression checks against a baseline.
+#
+# The corpus is the basicGI/basicAut files from project_submission/proj_submission.zip, plus generated instances
+# from graph_families.py with a known number of automorphisms. Every instance is a .gr/.grl file, and for every
+# graph in it
+#   - load:        parse the file into CSRGraphs, see grl_stream.py
+#   - refinement:  the complement of G if G is dense (see csr_graph.sparse_side()), the twin quotient of that
+#                  (see twins.py), and the coarsest stable coloring of it and its copy, the root of the search
+#   - search:      the search for a generating set of Aut(G), starting from that coloring
+#                  (for forests and disconnected graphs: their own paths, see final_AUT.AUT_generators_readcsr())
+#   - group_order: |Aut(G)| from the generating set, see permutation_group.py
+#   - gi:          (only for .grl files) the isomorphism classes of the whole file, see final_AUT.GI()
+# is timed <repeats> times. The results are written as JSON, and every phase whose median time grew by more than
+# the tolerance compared to a baseline JSON file of an earlier run is reported as a regression.
+# The |Aut| of every graph is written in hex, see result_cache.encode_count(), since str() fails for more than
+# 4300 decimal digits.
+#
+# Usage:
+#   python benchmark.py --output bench.json                        (run, and write the results)
+#   python benchmark.py --baseline bench.json --output new.json    (run, and compare to an earlier run)
+#   python benchmark.py --strategies                               (compare the target cell strategies of the
+#                                                                   search per instance, see target_cells.py)
+
+ZIP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'project_submission', 'proj_submission.zip')
+ZIP_INSTANCES = ['basicAut1.gr', 'basicAut2.gr', 'basicGI1.grl', 'basicGI2.grl', 'basicGI3.grl', 'basicGIAut.grl']
+# the known |Aut| of the graphs in the bundled files, None where the file is only used for GI
+ZIP_EXPECTED = {'basicAut1.gr': [512], 'basicAut2.gr': [1152]}
+
+PHASES = ['load', 'refinement', 'search', 'group_order', 'gi']
+
+# differences below this many seconds are noise, they are never reported as regressions
+NOISE_FLOOR = 0.005
+
+
+# tier 0
+def prepare_corpus(directory):
+    """
+    Extract the bundled instances and write the generated ones into <directory>.
+    Return:
+        - a list of (name, path, expected), where expected is a list of |Aut| per graph in the file, or None
+    """
+    os.makedirs(directory, exist_ok=True)
+    corpus = []
+
+    with zipfile.ZipFile(ZIP_FILE) as z:
+        for name in ZIP_INSTANCES:
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(z.read('proj_submission/' + name))
+            corpus.append((name, path, ZIP_EXPECTED.get(name)))
+
+    for name, graphs, expected in generated_instances():
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            write_grl(path, graphs)
+        corpus.append((name, path, expected))
+
+    return corpus
+
+
+# tier 1
+def generated_instances():
+    """
+    Return a list of (filename, list of GeneratedGraph, list of |Aut|) of generated instances, see graph_families.py.
+    """
+    instances = [
+        ('cycle2000.gr', [cycle(2000)]),
+        ('grid40x40.gr', [cartesian_product(path(40), path(40))]),
+        ('hypercube7.gr', [relabel(hypercube(7))]),
+        ('threepaths640.gr', [threepaths(640)]),
+        ('torus144.grl', torus_family(144)),
+        ('products36.grl', products_family(36)),
+        ('cubes6.grl', cubes_family(6)),
+        ('trees90.grl', trees_family(90, 6)),
+        ('cotorus144.grl', [complement_graph(g) for g in torus_family(144)]),
+    ]
+    return [(name, graphs, [g.num_auto for g in graphs]) for name, graphs in instances]
+
+
+# tier 0
+def run_instance(path, repeats):
+    """
+    Time every phase on the instance <repeats> times.
+    Return:
+        - timings: {phase: [seconds per repeat]}
+        - nums_auto: the list of |Aut| of the graphs in the file
+    """
+    timings = {}
+    for phase in PHASES:
+        timings[phase] = []
+    nums_auto = None
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        csrs = [csr for offset, csr in iter_grl(path)]
+        timings['load'].append(time.perf_counter() - start)
+
+        refinement = 0.0
+        search = 0.0
+        group_order = 0.0
+        nums_auto = []
+        for csr in csrs:
+            start = time.perf_counter()
+            sparse, _ = sparse_side(csr)
+            if is_forest(sparse) or len(connected_components(sparse)) > 1:
+                # forests and disconnected graphs take their own paths, which are counted as search
+                middle = time.perf_counter()
+                nums_auto.append(AUT_generators_readcsr(sparse, False, 1, False)[0])
+                search += time.perf_counter() - middle
+                refinement += middle - start
+                continue
+            st_info, matrix, reference, factor = search_root(sparse)
+            middle = time.perf_counter()
+            X = []
+            generating_set_search(st_info, [], [], matrix, reference, X, False, [])
+            end = time.perf_counter()
+            nums_auto.append(order_computing(X) * factor)
+            refinement += middle - start
+            search += end - middle
+            group_order += time.perf_counter() - end
+        timings['refinement'].append(refinement)
+        timings['search'].append(search)
+        timings['group_order'].append(group_order)
+
+        if path.endswith('.grl'):
+            start = time.perf_counter()
+            GI(path)
+            timings['gi'].append(time.perf_counter() - start)
+
+    return timings, nums_auto
+
+
+# tier 1
+def search_root(csr):
+    """
+    Return:
+        - the stable info of the root of the automorphism search of the (connected, sparse) graph, its matrix and
+          reference, and the factor |Aut| is multiplied by for the twins, see final_AUT.AUT_generators_readcsr()
+    """
+    twins = TwinQuotient(csr)
+    all_v, matrix, reference = initialization_automorphism_csr(twins.quotient)
+    colors = twins.color_ranks()
+    if colors is not None:
+        colors = colors + colors
+    info = get_info([], [], all_v, True, matrix, reference, colors)
+    return color_refinement(info, True, matrix, reference), matrix, reference, twins.factor
+
+
+# tier 0
+def run_strategies(corpus, strategies, repeats):
+    """
+    Time the search phase of every instance with every target cell strategy, see target_cells.py.
+    Forests and disconnected graphs are skipped, they are not searched as a whole.
+    Return:
+        - {instance: {strategy: {'median': seconds, 'nodes': search nodes, 'num_auto': [|Aut| per graph]}}}
+    """
+    results = {}
+    for name, path, _ in corpus:
+        roots = []
+        for offset, csr in iter_grl(path):
+            sparse, _ = sparse_side(csr)
+            if not is_forest(sparse) and len(connected_components(sparse)) == 1:
+                roots.append(search_root(sparse))
+        if len(roots) == 0:
+            continue
+
+        results[name] = {}
+        for strategy in strategies:
+            runs = []
+            for _ in range(repeats):
+                generating_sets = []
+                with collecting() as stats:
+                    start = time.perf_counter()
+                    for st_info, matrix, reference, _ in roots:
+                        X = []
+                        generating_set_search(st_info, [], [], matrix, reference, X, False, [], strategy)
+                        generating_sets.append(X)
+                    runs.append(time.perf_counter() - start)
+            nums_auto = [order_computing(X) * root[3] for X, root in zip(generating_sets, roots)]
+            results[name][strategy] = {
+                'median': statistics.median(runs),
+                'nodes': stats.nodes,
+                'num_auto': [encode_count(num) for num in nums_auto],
+            }
+    return results
+
+
+# tier 0
+def run_benchmark(corpus, repeats):
+    """
+    Return:
+        - the results as a JSON-compatible dict, see the module description
+    """
+    results = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.platform(),
+            'repeats': repeats,
+            'counts': 'hex',
+        },
+        'instances': {},
+    }
+    for name, path, expected in corpus:
+        timings, nums_auto = run_instance(path, repeats)
+        entry = {'num_auto': [encode_count(num) for num in nums_auto], 'phases': {}}
+        # graphs without a closed form |Aut| (None) are not checked
+        if expected is not None:
+            entry['correct'] = all(e is None or e == num for e, num in zip(expected, nums_auto))
+        for phase in PHASES:
+            runs = timings[phase]
+            if len(runs) == 0:
+                continue
+            entry['phases'][phase] = {
+                'min': min(runs),
+                'median': statistics.median(runs),
+                'runs': runs,
+            }
+        results['instances'][name] = entry
+    return results
+
+
+# tier 0
+def compare(results, baseline, tolerance):
+    """
+    Params:
+        - tolerance: a phase is a regression if its median time is more than (1 + tolerance) times the baseline
+    Return:
+        - regressions: a list of (instance, phase, baseline median, new median)
+        - changed: a list of (instance, baseline |Aut| list, new |Aut| list) for answers that differ
+    """
+    regressions = []
+    changed = []
+    for name, entry in results['instances'].items():
+        if name not in baseline['instances']:
+            continue
+        old = baseline['instances'][name]
+        old_counts = old['num_auto']
+        # baselines of earlier runs hold the counts in decimal
+        if baseline['meta'].get('counts') != 'hex':
+            old_counts = [encode_count(int(num)) for num in old_counts]
+        if old_counts != entry['num_auto']:
+            changed.append((name, old_counts, entry['num_auto']))
+        for phase, timing in entry['phases'].items():
+            if phase not in old['phases']:
+                continue
+            old_median = old['phases'][phase]['median']
+            new_median = timing['median']
+            if new_median > old_median * (1 + tolerance) and new_median - old_median > NOISE_FLOOR:
+                regressions.append((name, phase, old_median, new_median))
+    return regressions, changed
+
+
+# tier 0
+def print_report(results, regressions, changed):
+    line = '{:<20} {:>5}' + ' {:>12}' * len(PHASES)
+    print(line.format('instance', 'ok', *PHASES))
+    for name, entry in results['instances'].items():
+        medians = []
+        for phase in PHASES:
+            if phase in entry['phases']:
+                medians.append('{:.4f}'.format(entry['phases'][phase]['median']))
+            else:
+                medians.append('-')
+        print(line.format(name, {True: 'yes', False: 'NO'}.get(entry.get('correct'), '?'), *medians))
+
+    for name, phase, old_median, new_median in regressions:
+        print('REGRESSION {} {}: {:.4f}s -> {:.4f}s'.format(name, phase, old_median, new_median))
+    for name, old, new in changed:
+        print('CHANGED ANSWER {}: {} -> {}'.format(name, old, new))
+
+
+# tier 0
+def print_strategies(results, strategies):
+    line = '{:<20}' + ' {:>20}' * len(strategies)
+    print(line.format('search (s / nodes)', *strategies))
+    for name, entry in results.items():
+        cells = ['{:.4f} / {}'.format(entry[strategy]['median'], entry[strategy]['nodes']) for strategy in strategies]
+        print(line.format(name, *cells))
+        answers = set(tuple(entry[strategy]['num_auto']) for strategy in strategies)
+        if len(answers) > 1:
+            print('DIFFERENT ANSWERS {}: {}'.format(name, answers))
+
+
+# tier 0
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the AUT/GI phases over the benchmark corpus.')
+    parser.add_argument('--corpus', default='bench_corpus', help='directory for the corpus files')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative slowdown of a median time that counts as a regression')
+    parser.add_argument('--strategies', nargs='*', choices=sorted(STRATEGIES),
+                        help='instead, compare the search with these target cell strategies (default all)')
+    args = parser.parse_args(argv)
+
+    sys.setrecursionlimit(100000)
+    if args.strategies is not None:
+        strategies = args.strategies if len(args.strategies) > 0 else list(STRATEGIES)
+        results = run_strategies(prepare_corpus(args.corpus), strategies, args.repeats)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=1)
+        print_strategies(results, strategies)
+        return 0
+
+    results = run_benchmark(prepare_corpus(args.corpus), args.repeats)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    regressions = []
+    changed = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions, changed = compare(results, json.load(f), args.tolerance)
+    print_report(results, regressions, changed)
+
+    incorrect = [name for name, entry in results['instances'].items() if entry.get('correct') is False]
+    return 1 if len(regressions) > 0 or len(changed) > 0 or len(incorrect) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,331 @@
+from csr_graph import csr_from_graphs, connected_components, induced_subgraph, sparse_side
+from partition_refinement import Partition, refine
+from twins import TwinQuotient
+from trees import is_forest, RootedForest
+import search_stats
+
+# Canonical labeling by individualization-refinement, in the style of nauty/Traces.
+#
+# Every node of the search tree is an equitable ordered partition; a child individualizes one vertex of
+# the target cell (the first non-singleton cell) and refines. Every leaf is a discrete partition, which is
+# a labeling of the graph. Among all leaves, the one with the smallest key (node invariants, certificate)
+# is the canonical one, so two graphs are isomorphic iff their certificates are equal.
+#
+# The tree is pruned in three ways:
+#   - by node invariants: a node whose invariants are larger than those of the best leaf is cut,
+#     unless they equal the invariants of the first leaf (it may hold an automorphic image of the first leaf)
+#   - by automorphisms: when a leaf is equivalent to the first or best leaf, the search jumps back to
+#     the node where the two paths split
+#   - by orbits: of the children of a node, only one per orbit of the automorphisms found so far that
+#     fix the individualized vertices is explored
+# The automorphisms found form a strong generating set of Aut(G) relative to the first path.
+
+
+class CanonicalForm():
+
+    def __init__(self, csr, colors=None):
+        """
+        Compute the canonical form of the graph given by <csr>.
+        Params:
+            - csr: a CSRGraph, usually of a single graph
+            - colors: optional list of vertex colors indexed by vertex id, they must be comparable values
+                      that do not depend on the labeling (e.g. degrees, or twin class sizes)
+        After construction:
+            - certificate: a hashable tuple, equal for two (colored) graphs iff they are isomorphic
+            - labeling: a list, labeling[v] is the canonical label of vertex id v
+            - automorphisms: a list of mappings (lists), generating the automorphism group
+            - num_nodes, num_leaves: the size of the search tree that was explored
+            - num_pruned: the number of children that were not explored
+        """
+        self.csr = csr
+        self.colors = colors
+        self.n = csr.n
+
+        self.automorphisms = []
+        self.num_nodes = 0
+        self.num_leaves = 0
+        self.num_pruned = 0
+
+        # the first leaf and the best leaf found so far
+        self.first_path = None
+        self.first_invariants = None
+        self.first_certificate = None
+        self.first_order = None
+        self.best_path = None
+        self.best_invariants = None
+        self.best_certificate = None
+        self.best_order = None
+
+        part = Partition(self.n, colors)
+        trace = []
+        refine(csr, part, None, trace)
+        self.search(part, [], [trace_invariant(-1, trace)])
+
+        self.labeling = [0] * self.n
+        for i in range(self.n):
+            self.labeling[self.best_order[i]] = i
+        self.certificate = self.best_certificate
+
+        stats = search_stats.current()
+        if stats is not None:
+            stats.nodes += self.num_nodes
+            stats.leaves += self.num_leaves
+            stats.pruned += self.num_pruned
+            stats.generators += len(self.automorphisms)
+
+    def search(self, part, path, invariants):
+        """
+        (Mostly for internal use.)
+        Explore the subtree of the node given by <part>, reached by individualizing the vertices in <path>.
+        Return:
+            - the depth to jump back to, or len(path) + 1 if the search should continue normally
+        """
+        self.num_nodes += 1
+        depth = len(path)
+
+        if part.is_discrete():
+            return self.process_leaf(part, path, invariants)
+
+        # ===== [1] target cell: the first non-singleton cell =====
+        target = 0
+        while part.cell_end[target] - target == 1:
+            target = part.cell_end[target]
+        children = sorted(part.cell_vertices(target))
+
+        explored = []
+        num_autos = -1
+        orbit_of = None
+        for i in range(len(children)):
+            v = children[i]
+            # ===== [2] orbit pruning, with the automorphisms that fix the path pointwise =====
+            if len(self.automorphisms) != num_autos:
+                num_autos = len(self.automorphisms)
+                orbit_of = self.orbits(path)
+                explored_orbits = set()
+                for u in explored:
+                    explored_orbits.add(orbit_of[u])
+            if orbit_of[v] in explored_orbits:
+                self.num_pruned += 1
+                continue
+            explored.append(v)
+            explored_orbits.add(orbit_of[v])
+
+            # ===== [3] individualize v, refine, and compare the node invariant =====
+            mark = part.mark()
+            cell = part.individualize(v)
+            trace = []
+            refine(self.csr, part, [cell], trace)
+            new_invariants = invariants + [trace_invariant(cell, trace)]
+
+            jump = depth + 1
+            if self.is_promising(new_invariants):
+                jump = self.search(part, path + [v], new_invariants)
+            else:
+                self.num_pruned += 1
+            part.undo(mark)
+
+            if jump < depth:
+                self.num_pruned += len(children) - i - 1
+                return jump
+
+        return depth + 1
+
+    def is_promising(self, invariants):
+        """
+        (Mostly for internal use.)
+        Return False if no leaf below a node with these invariants can be the canonical leaf,
+        or be equivalent to the first leaf.
+        """
+        if self.first_invariants is None:
+            return True
+        k = len(invariants)
+        if invariants == self.first_invariants[:k]:
+            return True
+        return invariants <= self.best_invariants[:k]
+
+    def process_leaf(self, part, path, invariants):
+        """
+        (Mostly for internal use.)
+        Compare the leaf with the first and the best leaf.
+        Return:
+            - the depth to jump back to, see search()
+        """
+        self.num_leaves += 1
+        depth = len(path)
+        order = list(part.elements)
+        certificate = self.certificate_of(part)
+
+        if self.first_path is None:
+            self.first_path = path
+            self.first_invariants = invariants
+            self.first_certificate = certificate
+            self.first_order = order
+            self.best_path = path
+            self.best_invariants = invariants
+            self.best_certificate = certificate
+            self.best_order = order
+            return depth + 1
+
+        if invariants == self.first_invariants and certificate == self.first_certificate:
+            self.add_automorphism(self.first_order, order)
+            return common_prefix_length(path, self.first_path)
+
+        key = (invariants, certificate)
+        best_key = (self.best_invariants, self.best_certificate)
+        if key == best_key:
+            self.add_automorphism(self.best_order, order)
+            return common_prefix_length(path, self.best_path)
+        if key < best_key:
+            self.best_path = path
+            self.best_invariants = invariants
+            self.best_certificate = certificate
+            self.best_order = order
+        return depth + 1
+
+    def certificate_of(self, part):
+        """
+        (Mostly for internal use.)
+        The certificate of a discrete partition: the colors and the sorted edge list after relabeling
+        every vertex v to its position part.pos[v].
+        """
+        csr = self.csr
+        pos = part.pos
+        edges = []
+        for v in range(self.n):
+            pv = pos[v]
+            for j in range(csr.offsets[v], csr.offsets[v + 1]):
+                pu = pos[csr.nbs[j]]
+                if pv < pu:
+                    edges.append(pv * self.n + pu)
+        edges.sort()
+        if self.colors is None:
+            colors = None
+        else:
+            colors = tuple(self.colors[v] for v in part.elements)
+        return self.n, colors, tuple(edges)
+
+    def add_automorphism(self, reference_order, order):
+        """
+        (Mostly for internal use.)
+        Record the automorphism mapping the leaf <order> to the leaf <reference_order>,
+        i.e. the vertex at position i of order is mapped to the vertex at position i of reference_order.
+        """
+        mapping = [0] * self.n
+        for i in range(self.n):
+            mapping[order[i]] = reference_order[i]
+        self.automorphisms.append(mapping)
+
+    def orbits(self, fixed):
+        """
+        Return a list indexed by vertex id, with a representative of the orbit of every vertex
+        under the group generated by the automorphisms found so far that fix every vertex in <fixed>.
+        """
+        parent = list(range(self.n))
+
+        def find(v):
+            while parent[v] != v:
+                parent[v] = parent[parent[v]]
+                v = parent[v]
+            return v
+
+        for mapping in self.automorphisms:
+            fixes_all = True
+            for v in fixed:
+                if mapping[v] != v:
+                    fixes_all = False
+                    break
+            if not fixes_all:
+                continue
+            for v in range(self.n):
+                a = find(v)
+                b = find(mapping[v])
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+
+        return [find(v) for v in range(self.n)]
+
+
+# tier 1
+def trace_invariant(cell, trace):
+    """
+    Compress the individualized cell and the trace of refine() into one int.
+    Unlike hash(), the result does not depend on the Python version, so certificates can be stored and
+    compared across runs.
+    """
+    modulus = (1 << 61) - 1
+    h = cell + 1
+    for popped, split, sizes, counts in trace:
+        h = (h * 1000003 + popped) % modulus
+        h = (h * 1000003 + split) % modulus
+        for k in range(len(sizes)):
+            h = (h * 1000003 + sizes[k]) % modulus
+            h = (h * 1000003 + counts[k]) % modulus
+    return len(trace), h
+
+
+# tier 1
+def common_prefix_length(a, b):
+    k = 0
+    while k < len(a) and k < len(b) and a[k] == b[k]:
+        k += 1
+    return k
+
+
+# tier 0
+def canonical_certificate(g: "Graph"):
+    """
+    Return the canonical certificate of a single graph object, see CanonicalForm.
+    """
+    return csr_certificate(csr_from_graphs([g]))
+
+
+# tier 0
+def csr_certificate(csr):
+    """
+    Return the canonical certificate of the graph given by a CSRGraph, see canonical_order().
+    Unlike a Graph object, a CSRGraph can be sent to a worker process.
+    """
+    return canonical_order(csr)[0]
+
+
+# tier 0
+def canonical_order(csr):
+    """
+    Return:
+        - certificate: a hashable value, equal for two graphs iff they are isomorphic
+        - order: the vertex ids in canonical order, for two graphs with equal certificates,
+                 mapping order[i] of one graph to order[i] of the other is an isomorphism
+    Depending on the graph, the certificate is
+        - for a dense graph: the certificate of its complement, tagged, see csr_graph.sparse_side()
+        - for a forest: its canonical string, see trees.py
+        - for a disconnected graph: the certificates of its components, sorted
+        - otherwise: the certificate of CanonicalForm of the colored twin quotient of the graph, see twins.py
+    """
+    sparse, complemented = sparse_side(csr)
+    if complemented:
+        certificate, order = canonical_order(sparse)
+        return ('complement', certificate), order
+
+    if is_forest(csr):
+        forest = RootedForest(csr)
+        return forest.certificate(), [v for v in forest.order if v < csr.n]
+
+    components = connected_components(csr)
+    if len(components) > 1:
+        parts = []
+        for component in components:
+            certificate, order = canonical_order(induced_subgraph(csr, component))
+            parts.append((repr(certificate), certificate, [component[v] for v in order]))
+        # certificates of different kinds do not compare, their repr does
+        parts.sort(key=lambda part: part[0])
+        order = []
+        for _, _, component_order in parts:
+            order.extend(component_order)
+        return ('components', tuple(part[1] for part in parts)), order
+
+    twins = TwinQuotient(csr)
+    form = CanonicalForm(twins.quotient, twins.colors)
+    order = []
+    for v in form.best_order:
+        order.extend(twins.members[v])
+    return form.certificate, order
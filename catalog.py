@@ -0,0 +1,344 @@
+import hashlib
+import json
+import sqlite3
+import time
+from array import array
+from csr_graph import CSRGraph
+from grl_stream import iter_grl, refinement_fingerprint
+from grb_format import open_graph_file
+from invariants import invariant_rows, invariant_digest, iter_invariants
+from canonical_form import csr_certificate
+from result_cache import certificate_digest, encode_count, decode_count
+from final_AUT import AUT_single_readcsr
+
+# A persistent catalog of isomorphism classes in an SQLite file, to classify new graphs against the classes
+# seen before, without running GI on everything again.
+#
+# Every class is stored once, with a representative graph, its |Aut| (see final_AUT.AUT_single_readcsr()),
+# the number of graphs inserted into it, and a hierarchy of fingerprints, from cheap to exact:
+#   - level0: a digest of the invariants n, m, components, triangles and degree sequence, see invariants.py
+#   - level1: the refinement fingerprint, see grl_stream.refinement_fingerprint()
+#   - certificate: a digest of the canonical certificate, see canonical_form.csr_certificate()
+# A query computes the levels of the new graph one by one, and stops as soon as no class shares the level:
+# most new graphs are told apart by the invariants alone. Only if some class shares every fingerprint, the
+# certificate of the new graph is computed. The certificate of a class is computed from its representative the
+# first time it is needed, and then stored, so inserting a graph never recomputes anything of the existing classes.
+#
+# The representatives and |Aut| do not depend on how the fingerprints are computed: when the VERSION of the file
+# differs, the fingerprints are recomputed from the representatives, and the certificates are dropped.
+#
+# Several processes may share the file. The connection is in autocommit mode, so every write is committed right
+# away, and no transaction is held while a certificate or |Aut| is computed. Only the final check and write of
+# insert() run in one BEGIN IMMEDIATE transaction, so that two processes never add the same class twice. The check
+# only compares stored certificates: if one is missing (a class added by another process in the meantime), the
+# transaction is rolled back, the certificates are computed, and the check is repeated.
+# |Aut| is stored in hex, see result_cache.encode_count().
+
+# bump whenever the fingerprints, certificates or the encoding of |Aut| change
+VERSION = 3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS classes (
+    id INTEGER PRIMARY KEY,
+    n INTEGER NOT NULL,
+    m INTEGER NOT NULL,
+    level0 TEXT NOT NULL,
+    level1 TEXT NOT NULL,
+    certificate TEXT,
+    num_auto TEXT,
+    offsets BLOB NOT NULL,
+    nbs BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    source TEXT,
+    added REAL NOT NULL
+)
+'''
+
+INDEX = 'CREATE INDEX IF NOT EXISTS classes_level0 ON classes (level0)'
+
+INSERT = '''
+INSERT INTO classes (n, m, level0, level1, certificate, num_auto, offsets, nbs, size, source, added)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+'''
+
+
+class IsoCatalog():
+
+    def __init__(self, filename, num_auto=True):
+        """
+        Open (or create) the catalog in the SQLite file <filename>.
+        Params:
+            - num_auto: False to skip computing |Aut| of new classes, which is then stored as None
+        """
+        self.filename = filename
+        self.num_auto = num_auto
+        # several processes may share the file, wait for each other's (short) writes
+        self.connection = sqlite3.connect(filename, timeout=60, isolation_level=None)
+        self.connection.execute(SCHEMA)
+        self.connection.execute(INDEX)
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != VERSION:
+            self.rebuild()
+        # the number of queries decided at each level, and the number of certificates computed
+        self.counts = {'level0': 0, 'level1': 0, 'certificate': 0, 'certificates': 0}
+
+    def rebuild(self):
+        """
+        (Mostly for internal use.)
+        Recompute the fingerprints of every class from its representative, and drop the certificates.
+        |Aut| of a file of version 1 is converted from decimal to hex.
+        """
+        self.connection.execute('BEGIN IMMEDIATE')
+        # another process may have rebuilt the file in the meantime
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version == VERSION:
+            self.connection.execute('COMMIT')
+            return
+        rows = self.connection.execute('SELECT id, num_auto FROM classes').fetchall()
+        for class_id, num_auto in rows:
+            if num_auto is not None and version < 2:
+                num_auto = encode_count(int(num_auto))
+            csr = self.representative(class_id)
+            self.connection.execute(
+                'UPDATE classes SET level0 = ?, level1 = ?, certificate = NULL, num_auto = ? WHERE id = ?',
+                (level0_digest(csr, invariant_rows([csr])[0]), level1_digest(csr), num_auto, class_id))
+        self.connection.execute('PRAGMA user_version = {}'.format(VERSION))
+        self.connection.execute('COMMIT')
+
+    def query(self, csr, invariants=None):
+        """
+        Return the id of the class of the graph given by the CSRGraph <csr>, or None if it is not in the catalog.
+        Params:
+            - invariants: the row of csr in invariant_rows(), if it is computed already (e.g. for a whole file)
+        """
+        class_id, _ = self.find(csr, invariants)
+        return class_id
+
+    def find(self, csr, invariants=None):
+        """
+        (Mostly for internal use.)
+        Return:
+            - the id of the class of csr, or None
+            - the fingerprints of csr computed on the way, {'level0': ..., 'level1': ..., 'certificate': ...}
+        """
+        if invariants is None:
+            invariants = invariant_rows([csr])[0]
+        levels = {'level0': level0_digest(csr, invariants)}
+        candidates = self.connection.execute('SELECT id, level1 FROM classes WHERE level0 = ?',
+                                             (levels['level0'],)).fetchall()
+        if len(candidates) == 0:
+            self.counts['level0'] += 1
+            return None, levels
+
+        levels['level1'] = level1_digest(csr)
+        candidates = [class_id for class_id, level1 in candidates if level1 == levels['level1']]
+        if len(candidates) == 0:
+            self.counts['level1'] += 1
+            return None, levels
+
+        self.counts['certificate'] += 1
+        levels['certificate'] = self.compute_certificate(csr)
+        for class_id in candidates:
+            if self.certificate(class_id) == levels['certificate']:
+                return class_id, levels
+        return None, levels
+
+    def insert(self, csr, source=None, invariants=None):
+        """
+        Add the graph given by the CSRGraph <csr> to the catalog: to its class if there is one, or as a new class
+        with csr as representative. The insert is committed right away.
+        Params:
+            - source: a description of where the graph comes from, stored for new classes, e.g. 'file.grl:3'
+            - invariants: see query()
+        Return:
+            - the id of the class of csr
+            - True iff it is a new class
+        """
+        class_id, levels = self.find(csr, invariants)
+        num_auto = None
+        if class_id is None:
+            # the expensive part is done before the transaction
+            if 'level1' not in levels:
+                levels['level1'] = level1_digest(csr)
+            if self.num_auto:
+                num_auto = encode_count(AUT_single_readcsr(csr, False))
+
+        while True:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                complete = True
+                if class_id is None:
+                    # another process may have added the class in the meantime
+                    class_id, complete = self.find_added(levels)
+                if complete:
+                    return self.write_insert(csr, class_id, levels, num_auto, source)
+            finally:
+                if self.connection.in_transaction:
+                    self.connection.execute('ROLLBACK')
+            # some certificates are not known yet, they are computed without holding the lock, then check again
+            self.complete_certificates(csr, levels)
+
+    def write_insert(self, csr, class_id, levels, num_auto, source):
+        """
+        (Mostly for internal use.)
+        The write of insert(), in its transaction: add csr to the class <class_id>, or as a new class if it is None,
+        and commit.
+        """
+        if class_id is not None:
+            self.connection.execute('UPDATE classes SET size = size + 1 WHERE id = ?', (class_id,))
+            new = False
+        else:
+            cursor = self.connection.execute(INSERT, (csr.n, csr.m, levels['level0'], levels['level1'],
+                                                      levels.get('certificate'), num_auto,
+                                                      array('i', csr.offsets).tobytes(),
+                                                      array('i', csr.nbs).tobytes(), source, time.time()))
+            class_id = cursor.lastrowid
+            new = True
+        self.connection.execute('COMMIT')
+        return class_id, new
+
+    def find_added(self, levels):
+        """
+        (Mostly for internal use.)
+        Run in the transaction of insert(), to find a class another process added after find(). Only stored
+        certificates are compared, nothing is computed.
+        Params:
+            - levels: the fingerprints of the graph from find(), with level1
+        Return:
+            - the id of the class with all the fingerprints in levels, or None
+            - False if that is not decided, because the certificate of the graph or of some class sharing level0
+              and level1 with it is not known yet, see complete_certificates()
+        """
+        rows = self.connection.execute('SELECT id, certificate FROM classes WHERE level0 = ? AND level1 = ?',
+                                       (levels['level0'], levels['level1'])).fetchall()
+        if len(rows) == 0:
+            return None, True
+        if 'certificate' not in levels or any(certificate is None for _, certificate in rows):
+            return None, False
+        for class_id, certificate in rows:
+            if certificate == levels['certificate']:
+                return class_id, True
+        return None, True
+
+    def complete_certificates(self, csr, levels):
+        """
+        (Mostly for internal use.)
+        Outside of any transaction, compute the certificate of csr into levels, and store the certificates of the
+        classes sharing level0 and level1 with it, see find_added().
+        """
+        if 'certificate' not in levels:
+            levels['certificate'] = self.compute_certificate(csr)
+        rows = self.connection.execute('SELECT id FROM classes WHERE level0 = ? AND level1 = ?',
+                                       (levels['level0'], levels['level1'])).fetchall()
+        for (class_id,) in rows:
+            self.certificate(class_id)
+
+    def insert_file(self, filename):
+        """
+        Insert every graph of a .gr/.grl/.grb file, see insert(). The file is streamed, and the invariants are
+        computed for a chunk of graphs at once, see invariants.iter_invariants().
+        Return:
+            - the list of class ids of the graphs, in the order of the file
+            - the number of new classes
+        """
+        class_ids = []
+        new_classes = 0
+        for i, csr, row in iter_invariants(enumerate(iter_graphs(filename))):
+            class_id, new = self.insert(csr, '{}:{}'.format(filename, i), row)
+            class_ids.append(class_id)
+            new_classes += new
+        return class_ids, new_classes
+
+    def query_file(self, filename):
+        """
+        Return the list of class ids (None for graphs of no known class) of the graphs of a file, see query().
+        The file is streamed, see insert_file().
+        """
+        return [self.query(csr, row) for _, csr, row in iter_invariants(enumerate(iter_graphs(filename)))]
+
+    def compute_certificate(self, csr):
+        """
+        (Mostly for internal use.)
+        Return the certificate digest of csr.
+        """
+        self.counts['certificates'] += 1
+        return certificate_digest(csr_certificate(csr))
+
+    def certificate(self, class_id):
+        """
+        Return the certificate digest of a class, computing and storing it if it is not known yet.
+        """
+        certificate = self.connection.execute('SELECT certificate FROM classes WHERE id = ?',
+                                              (class_id,)).fetchone()[0]
+        if certificate is None:
+            certificate = self.compute_certificate(self.representative(class_id))
+            self.connection.execute('UPDATE classes SET certificate = ? WHERE id = ?', (certificate, class_id))
+        return certificate
+
+    def representative(self, class_id):
+        """
+        Return the representative of a class as a CSRGraph, vertex i has label i.
+        """
+        n, offsets, nbs = self.connection.execute('SELECT n, offsets, nbs FROM classes WHERE id = ?',
+                                                  (class_id,)).fetchone()
+        offsets_array = array('i')
+        offsets_array.frombytes(offsets)
+        nbs_array = array('i')
+        nbs_array.frombytes(nbs)
+        return CSRGraph(offsets_array, nbs_array, array('i', [0]) * n, array('i', range(n)))
+
+    def class_info(self, class_id):
+        """
+        Return {'n', 'm', 'num_auto', 'size', 'source'} of a class, where num_auto is an int or None.
+        """
+        n, m, num_auto, size, source = self.connection.execute(
+            'SELECT n, m, num_auto, size, source FROM classes WHERE id = ?', (class_id,)).fetchone()
+        return {'n': n, 'm': m, 'num_auto': None if num_auto is None else decode_count(num_auto), 'size': size,
+                'source': source}
+
+    def __len__(self):
+        return self.connection.execute('SELECT count(*) FROM classes').fetchone()[0]
+
+    def commit(self):
+        """
+        Every write is committed right away, kept for symmetry with result_cache.ResultCache.
+        """
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# tier 1
+def iter_graphs(filename):
+    """
+    A generator over the graphs of a .gr/.grl file (see grl_stream.py) or a .grb file (see grb_format.py),
+    as CSRGraphs.
+    """
+    if filename.endswith('.grb'):
+        for csr in open_graph_file(filename):
+            yield csr
+    else:
+        for _, csr in iter_grl(filename):
+            yield csr
+
+
+# tier 1
+def level0_digest(csr, invariants):
+    """
+    Return a hex digest of the row of csr in invariant_rows(), see invariants.invariant_digest().
+    """
+    return invariant_digest(invariants)
+
+
+# tier 1
+def level1_digest(csr):
+    """
+    Return the refinement fingerprint of csr as a string, see grl_stream.refinement_fingerprint().
+    """
+    return json.dumps(refinement_fingerprint(csr))
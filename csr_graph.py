@@ -0,0 +1,216 @@
+from array import array
+
+# A compact, array-backed representation of (a disjoint union of) graphs.
+# Every vertex gets a dense integer id 0...n-1, and the neighbours of vertex i are
+# nbs[offsets[i]:offsets[i+1]] (compressed sparse row, CSR).
+# It is built once at load time and shared by refinement and automorphism search,
+# so the hot paths never have to hash (graph_idx, label) tuples or walk Vertex objects.
+
+
+class CSRGraph():
+
+    def __init__(self, offsets, nbs, graph_idx, labels):
+        """
+        Params:
+            - offsets: int array of length n+1, the neighbours of vertex i start at offsets[i]
+            - nbs: int array of length 2m, the concatenated neighbour lists
+            - graph_idx: int array of length n, the graph each vertex belongs to
+            - labels: int array of length n, the label of each vertex within its own graph
+        """
+        self.offsets = offsets
+        self.nbs = nbs
+        self.graph_idx = graph_idx
+        self.labels = labels
+
+    @property
+    def n(self):
+        return len(self.offsets) - 1
+
+    @property
+    def m(self):
+        return len(self.nbs) // 2
+
+    def neighbours(self, v):
+        """
+        Return the neighbours of vertex id v, as a slice of the nbs array.
+        """
+        return self.nbs[self.offsets[v]:self.offsets[v + 1]]
+
+    def degree(self, v):
+        return self.offsets[v + 1] - self.offsets[v]
+
+    def __repr__(self):
+        return 'CSRGraph(#vertices={}, #edges={})'.format(self.n, self.m)
+
+
+# tier 0
+def csr_from_graphs(graphs, graph_indices=None):
+    """
+    Build a CSRGraph for the disjoint union of graphs.
+    The ids are assigned graph by graph, in the order of g.vertices,
+    so the i-th vertex of graphs[k] gets id (number of vertices before graphs[k]) + i.
+    The same graph may appear more than once (e.g. G and its copy G' in automorphism search).
+    Params:
+        - graphs: a list of graph objects
+        - graph_indices: the graph_idx given to the vertices of each graph, default 0...len(graphs)-1
+    Return:
+        - a CSRGraph
+    """
+    if graph_indices is None:
+        graph_indices = range(len(graphs))
+
+    offsets = array('i', [0])
+    nbs = array('i')
+    graph_idx = array('i')
+    labels = array('i')
+
+    base = 0
+    for g, idx in zip(graphs, graph_indices):
+        vertices = g.vertices
+        # local id of each vertex within g, shifted by base in the union
+        local = {}
+        for i in range(len(vertices)):
+            local[vertices[i]] = i
+        for v in vertices:
+            for nb in v.neighbours:
+                nbs.append(base + local[nb])
+            offsets.append(len(nbs))
+            graph_idx.append(idx)
+            labels.append(v.label)
+        base += len(vertices)
+
+    return CSRGraph(offsets, nbs, graph_idx, labels)
+
+
+# tier 0
+def csr_disjoint_union(csrs, graph_indices=None):
+    """
+    Build the disjoint union of several CSRGraphs, without going back to Graph objects.
+    Params:
+        - csrs: a list of CSRGraph, which may contain the same object more than once
+        - graph_indices: the graph_idx of each part in the union, default 0...len(csrs)-1
+    Return:
+        - a CSRGraph
+    """
+    if graph_indices is None:
+        graph_indices = range(len(csrs))
+
+    offsets = array('i', [0])
+    nbs = array('i')
+    graph_idx = array('i')
+    labels = array('i')
+
+    base = 0
+    for csr, idx in zip(csrs, graph_indices):
+        edge_base = len(nbs)
+        nbs.extend(u + base for u in csr.nbs)
+        offsets.extend(edge_base + off for off in csr.offsets[1:])
+        graph_idx.extend([idx] * csr.n)
+        labels.extend(csr.labels)
+        base += csr.n
+
+    return CSRGraph(offsets, nbs, graph_idx, labels)
+
+
+# tier 0
+def connected_components(csr):
+    """
+    Return the connected components of the graph, as lists of vertex ids in BFS order.
+    """
+    seen = bytearray(csr.n)
+    components = []
+    for s in range(csr.n):
+        if seen[s]:
+            continue
+        seen[s] = 1
+        component = [s]
+        for v in component:
+            for j in range(csr.offsets[v], csr.offsets[v + 1]):
+                u = csr.nbs[j]
+                if not seen[u]:
+                    seen[u] = 1
+                    component.append(u)
+        components.append(component)
+    return components
+
+
+# tier 0
+def induced_subgraph(csr, vertices):
+    """
+    Build the subgraph induced by a list of vertex ids, vertex vertices[i] gets id i and label i.
+    Return:
+        - a CSRGraph
+    """
+    local = {}
+    for i in range(len(vertices)):
+        local[vertices[i]] = i
+
+    offsets = array('i', [0])
+    nbs = array('i')
+    for v in vertices:
+        for j in range(csr.offsets[v], csr.offsets[v + 1]):
+            u = csr.nbs[j]
+            if u in local:
+                nbs.append(local[u])
+        offsets.append(len(nbs))
+    k = len(vertices)
+    return CSRGraph(offsets, nbs, array('i', [csr.graph_idx[vertices[0]] if k > 0 else 0]) * k, array('i', range(k)))
+
+
+# tier 1
+def is_simple(csr):
+    """
+    Return True iff the graph has no self-loops and no multiple edges.
+    """
+    mark = array('i', [-1] * csr.n)
+    for v in range(csr.n):
+        for j in range(csr.offsets[v], csr.offsets[v + 1]):
+            u = csr.nbs[j]
+            if u == v or mark[u] == v:
+                return False
+            mark[u] = v
+    return True
+
+
+# tier 1
+def is_dense(csr):
+    """
+    Return True iff the graph is simple and has more than half of all n(n-1)/2 possible edges,
+    so that its complement has fewer edges than the graph itself.
+    """
+    return 4 * csr.m > csr.n * (csr.n - 1) and is_simple(csr)
+
+
+# tier 1
+def complement(csr):
+    """
+    Build the complement of a simple graph, with the same vertex ids, graph_idx and labels.
+    Every automorphism of a graph is one of its complement and vice versa, and two graphs are isomorphic iff their
+    complements are, so a dense graph can be handled as its complement, see sparse_side().
+    Return:
+        - a CSRGraph
+    """
+    n = csr.n
+    mark = array('i', [-1] * n)
+    offsets = array('i', [0])
+    nbs = array('i')
+    for v in range(n):
+        for j in range(csr.offsets[v], csr.offsets[v + 1]):
+            mark[csr.nbs[j]] = v
+        mark[v] = v
+        nbs.extend(u for u in range(n) if mark[u] != v)
+        offsets.append(len(nbs))
+    return CSRGraph(offsets, nbs, csr.graph_idx, csr.labels)
+
+
+# tier 0
+def sparse_side(csr):
+    """
+    Return:
+        - the complement of the graph if it is dense, see is_dense(), else the graph itself
+        - True iff it is the complement
+    Whether a graph is dense only depends on n and m, so isomorphic graphs are always on the same side.
+    """
+    if is_dense(csr):
+        return complement(csr), True
+    return csr, False
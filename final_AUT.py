@@ -1,4 +1,16 @@
 from utilities import *
+from canonical_form import csr_certificate, canonical_order
+from csr_graph import connected_components, induced_subgraph, sparse_side
+from invariants import invariant_buckets
+from math import factorial
+from twins import TwinQuotient, swap_blocks, moved_points
+from trees import is_forest, RootedForest
+from parallel import run_jobs
+from grl_stream import summarize_grl, read_grl_graph
+from grb_format import summarize_grb, read_grb_graph
+from result_cache import ResultCache, graph_key
+import search_stats
+from search_stats import collecting, counted
 from os import listdir
 from graph_io import write_dot, load_graph
 from datetime import datetime
@@ -11,93 +23,341 @@ from datetime import datetime
 # tier 0
 def get_files(path):
     """
-    Get a list of filenames that are either .gr or .grl files in the given path.
+    Get a list of filenames that are either .gr, .grl or .grb files in the given path.
     """
-    files = list(filter(lambda x: x.endswith('.grl') or x.endswith('.gr'), listdir(path)))
+    files = list(filter(lambda x: x.endswith('.grl') or x.endswith('.gr') or x.endswith('.grb'), listdir(path)))
     return files
 
 
+# tier 2
+def summarize_file(filename, cache=None):
+    """
+    Return the GraphSummary of every graph in a .gr/.grl file (see grl_stream.py) or a .grb file (see grb_format.py).
+    With a ResultCache <cache>, the fingerprints are looked up in it, and every summary has a key.
+    """
+    if filename.endswith('.grb'):
+        return summarize_grb(filename, cache)
+    return summarize_grl(filename, cache)
+
+
+# tier 2
+def read_graph_at(filename, offset):
+    """
+    Return the graph with the given summary offset in the file as a CSRGraph, see summarize_file().
+    """
+    if filename.endswith('.grb'):
+        return read_grb_graph(filename, offset)
+    return read_grl_graph(filename, offset)
+
+
+# tier 2: runs in a worker process
+def certificate_at(filename, offset):
+    """
+    Return the canonical certificate of the graph with the given summary offset in the file, see canonical_form.py.
+    """
+    return csr_certificate(read_graph_at(filename, offset))
+
+
 # tier 0
-def AUT(filename, do_m_test=False):
+def AUT(filename, do_m_test=False, workers=1, cache=None, stats=False):
     """
-    Input a filename, can be a .gr file or .grl file,
+    Input a filename, can be a .gr file, .grl file or .grb file (which is handled like a .grl file),
     compute its automorphism result and output as project manual demanded.
     Params:
         - do_m_test: is True if you want to do membership testing
+        - workers: number of worker processes, None for one per core.
+                   For a .grl file the isomorphism classes are the jobs, see parallel.run_jobs(),
+                   for a .gr file the branches of the search tree are, see utilities.generating_set_parallel()
+        - cache: optional ResultCache, results of graphs found in it are not computed again,
+                 and new results are stored in it, see result_cache.py
+        - stats: if True, return (result, SearchStats) with the counters of the call, see search_stats.py.
+                 For a .grl file, stats.per_graph holds the counters of the search of every class representative
+                 (and of the certificates of the graphs that needed one), by graph index.
     """
+    if stats:
+        with collecting() as total:
+            result = AUT(filename, do_m_test, workers, cache)
+        return result, total
+
     if filename.endswith('.gr'):
         # file contains single graph
-        return AUT_single_readfile(filename, do_m_test)
+        return AUT_single_readfile(filename, do_m_test, workers, cache)
 
-    elif filename.endswith('.grl'):
+    elif filename.endswith('.grl') or filename.endswith('.grb'):
         # file contains a list of graphs
-        return AUT_many(filename, do_m_test)
+        return AUT_many(filename, do_m_test, workers, cache)
+
+
+# tier 0
+def AUT_files(filenames, do_m_test=False, workers=None, cache_file=None, stats=False):
+    """
+    Run AUT() on every file, one file per worker process.
+    Params:
+        - cache_file: optional filename of a ResultCache, which every worker opens for itself
+        - stats: see AUT()
+    Return:
+        - a list of the results of AUT(), in the order of filenames
+    """
+    return run_jobs(AUT_cached, [(filename, do_m_test, cache_file, stats) for filename in filenames], workers)
+
+
+# tier 1: runs in a worker process
+def AUT_cached(filename, do_m_test, cache_file, stats=False):
+    """
+    AUT() with a ResultCache opened from <cache_file>, if it is not None.
+    """
+    if cache_file is None:
+        return AUT(filename, do_m_test, 1, None, stats)
+    with ResultCache(cache_file) as cache:
+        return AUT(filename, do_m_test, 1, cache, stats)
 
 
 # tier 1
-def AUT_many(filename, do_m_test):
+def AUT_many(filename, do_m_test, workers=1, cache=None):
     """
+    The file is streamed, see GI(), and the representative of every isomorphism class is read again by its offset.
+    The automorphisms of the isomorphism classes are counted in parallel if workers != 1.
     Return:
         - a list of tuples, where for each tuple,
           first ele is a list of iso class, second ele is num_auto
     """
-    with open(filename) as f:
-        G = load_graph(f, read_list=True)
-    list_of_graphs = G[0]
+    summaries = summarize_file(filename, cache)
+    GI_classes = GI_readsummaries(filename, summaries, workers, cache)
+
+    nums_auto = [None] * len(GI_classes)
+    # only the filename and offset of the representative are sent to a worker
+    jobs = []
+    todo = []
+    for i in range(len(GI_classes)):
+        summary = summaries[GI_classes[i][0]]
+        if cache is not None:
+            cached = cache.automorphisms(summary.key)
+            if cached is not None:
+                nums_auto[i] = cached[0]
+                continue
+        # the generators are only kept in the cache
+        jobs.append((filename, summary.offset, do_m_test, cache is not None))
+        todo.append(i)
+
+    representatives = [GI_classes[i][0] for i in todo]
+    results = run_graph_jobs(AUT_generators_readoffset, jobs, workers, representatives)
+    for i, (num_auto, generators) in zip(todo, results):
+        nums_auto[i] = num_auto
+        if cache is not None:
+            summary = summaries[GI_classes[i][0]]
+            cache.store_automorphisms(summary.key, summary.n, summary.m, num_auto, generators)
+    if cache is not None:
+        cache.commit()
 
     class_to_autonum = []
-    GI_classes = GI_readlistgraph(list_of_graphs)
-    for ele in GI_classes:
-        graph_obj = list_of_graphs[ele[0]]      # turn index into a graph object
-        num_auto = AUT_single_readobj(graph_obj, do_m_test)
-
-        class_to_autonum.append((ele, num_auto))
+    for i in range(len(GI_classes)):
+        class_to_autonum.append((GI_classes[i], nums_auto[i]))
 
     return class_to_autonum
 
 
+# tier 2
+def run_graph_jobs(function, jobs, workers, indices):
+    """
+    parallel.run_jobs() for jobs that each work on one graph of a file, job i on graph <indices[i]>.
+    If counting is on (see search_stats.py), every job is counted in its own SearchStats,
+    which is added to the active one as the work on its graph.
+    """
+    stats = search_stats.current()
+    if stats is None:
+        return run_jobs(function, jobs, workers)
+    results = []
+    counted_jobs = [(function,) + job for job in jobs]
+    for (result, job_stats), index in zip(run_jobs(counted, counted_jobs, workers), indices):
+        stats.add_graph(index, job_stats)
+        results.append(result)
+    return results
+
+
 # tier 2: helper of AUT_many
 def AUT_single_readobj(graph_obj, do_m_test):
     """
     Return:
         - num_auto: int, number of auto for a single graph.
     """
+    return AUT_single_readcsr(csr_from_graphs([graph_obj]), do_m_test)
 
-    all_v, matrix, reference = initialization_automorphism(graph_obj)
-
-    X = []
 
-    count, _ = get_generating_set([], [], all_v, matrix, reference, X, do_m_test)
+# tier 2: helper of AUT_many, runs in a worker process
+def AUT_generators_readoffset(filename, offset, do_m_test, generators=True):
+    """
+    Return:
+        - see AUT_generators_readcsr(), for the graph with the given summary offset in the file.
+    """
+    return AUT_generators_readcsr(read_graph_at(filename, offset), do_m_test, 1, generators)
 
-    num_auto = order_computing(X)
 
-    return num_auto
+# tier 2
+def AUT_single_readcsr(csr, do_m_test, workers=1, strategy=None):
+    """
+    Params:
+        - workers: number of worker processes for the search tree, see utilities.get_generating_set()
+        - strategy: the target cell selection of the search, see target_cells.py
+    Return:
+        - num_auto: int, number of auto for a single graph given by a CSRGraph.
+    """
+    return AUT_generators_readcsr(csr, do_m_test, workers, False, strategy)[0]
 
 
-# tier 1
-def AUT_single_readfile(filename, do_m_test):
+# tier 2
+def AUT_generators_readcsr(csr, do_m_test, workers=1, generators=True, strategy=None):
     """
+    Params:
+        - workers: number of worker processes for the search tree, see utilities.get_generating_set()
+        - generators: False to skip building the generating set that is returned (as []),
+                      which is only kept in the cache
+        - strategy: the target cell selection of the search, see target_cells.py, None for the first cell
     Return:
-        - num_auto: int, number of auto for a single graph.
+        - num_auto: int, number of auto for a single graph given by a CSRGraph.
+        - generators: a generating set of its automorphism group, every generator as a list of (label, image) pairs
+                      of the points it moves, which keeps the Theta(n) generators of e.g. a tree small
+    Dense graphs are handled as their complement, which has the same automorphisms, see csr_graph.sparse_side().
+    Forests are counted without search, see trees.py, and disconnected graphs component by component,
+    see AUT_components(). Otherwise the search runs on the twin quotient of the graph, see twins.py:
+    every twin class is a single vertex, colored by its size, and |Aut| is corrected by the sizes of the twin classes.
+    (For forests, disconnected graphs and graphs with twins, the generators are given in vertex ids,
+    which are the labels for graphs read from a file.)
     """
-    with open(filename) as f:
-        G = load_graph(f)
+    sparse, complemented = sparse_side(csr)
+    if complemented:
+        return AUT_generators_readcsr(sparse, do_m_test, workers, generators, strategy)
+
+    if is_forest(csr):
+        forest = RootedForest(csr)
+        return forest.num_auto, forest.generators() if generators else []
+
+    components = connected_components(csr)
+    if len(components) > 1:
+        return AUT_components(csr, components, do_m_test, workers, generators, strategy)
+
+    twins = TwinQuotient(csr)
 
-    all_v, matrix, reference = initialization_automorphism(G)
+    all_v, matrix, reference = initialization_automorphism_csr(twins.quotient)
+
+    # G and its copy G' get the same colors
+    colors = twins.color_ranks()
+    if colors is not None:
+        colors = colors + colors
 
     X = []
 
-    count, _ = get_generating_set([], [], all_v, matrix, reference, X, do_m_test)
+    count, _ = get_generating_set([], [], all_v, matrix, reference, X, do_m_test, workers, colors, strategy)
+
+    num_auto = order_computing(X) * twins.factor
+
+    if not generators:
+        return num_auto, []
+    if twins.quotient is csr:
+        return num_auto, [moved_points(perm.P) for perm in X]
+    return num_auto, [twins.lift(perm.P) for perm in X] + twins.generators
 
-    num_auto = order_computing(X)
 
+# tier 2
+def AUT_components(csr, components, do_m_test, workers=1, generators=True, strategy=None):
+    """
+    AUT_generators_readcsr() for a disconnected graph. The components are classed by their canonical certificate,
+    see canonical_form.canonical_order(), and only one component per class is searched:
+        |Aut| = prod over the classes of |Aut(component)|^k * k!, for a class of k isomorphic components.
+    Params:
+        - components: the connected components of the graph, see csr_graph.connected_components()
+    """
+    # {certificate: [(component, vertex ids of the component in canonical order)]}
+    classes = {}
+    for component in components:
+        certificate, order = canonical_order(induced_subgraph(csr, component))
+        copy = (component, [component[v] for v in order])
+        if certificate not in classes:
+            classes[certificate] = [copy]
+        else:
+            classes[certificate].append(copy)
+
+    num_auto = 1
+    all_generators = []
+    for copies in classes.values():
+        component = copies[0][0]
+        num, component_generators = AUT_generators_readcsr(induced_subgraph(csr, component), do_m_test, workers,
+                                                           generators, strategy)
+        num_auto *= num ** len(copies) * factorial(len(copies))
+        if not generators:
+            continue
+
+        for local in component_generators:
+            all_generators.append([(component[v], component[image]) for v, image in local])
+        # swap the first two copies, and cycle all copies, mapping them onto each other in canonical order
+        blocks = [order for _, order in copies]
+        if len(blocks) >= 2:
+            all_generators.append(swap_blocks(blocks[:2]))
+        if len(blocks) > 2:
+            all_generators.append(swap_blocks(blocks))
+
+    return num_auto, all_generators
+
+
+# tier 1
+def AUT_single_readfile(filename, do_m_test, workers=1, cache=None):
+    """
+    Params:
+        - workers: number of worker processes for the search tree, see utilities.get_generating_set()
+        - cache: optional ResultCache, see AUT()
+    Return:
+        - num_auto: int, number of auto for a single graph.
+    """
+    csr = read_grl_graph(filename, 0)
+    if cache is None:
+        return AUT_single_readcsr(csr, do_m_test, workers)
+
+    key = graph_key(csr)
+    cached = cache.automorphisms(key)
+    if cached is not None:
+        return cached[0]
+    num_auto, generators = AUT_generators_readcsr(csr, do_m_test, workers)
+    cache.store_automorphisms(key, csr.n, csr.m, num_auto, generators)
+    cache.commit()
     return num_auto
 
 
-def GI_readlistgraph(list_of_graphs):
+def GI_readlistgraph(list_of_graphs, workers=1):
+    """
+    Params:
+        - workers: number of worker processes for the canonical certificates of the graphs that
+                   color refinement cannot tell apart, None for one per core, see parallel.run_jobs()
+    Return:
+        - a list of equivalent classes, ordered by their smallest graph index.
+    The graphs are first bucketed by cheap invariants, computed with NumPy for all graphs at once,
+    see invariants.py. Only the graphs within a bucket go through color refinement (as one disjoint union per
+    bucket) and canonical certificates, see GI_readbucket().
+    """
+    csrs = [csr_from_graphs([g]) for g in list_of_graphs]
+
+    GI_classes = []
+    for bucket in invariant_buckets(csrs):
+        if len(bucket) == 1:
+            GI_classes.append(bucket)
+            continue
+        for cls in GI_readbucket([list_of_graphs[idx] for idx in bucket], workers):
+            GI_classes.append([bucket[i] for i in cls])
+
+    GI_classes.sort()
+    return GI_classes
+
+
+# tier 2
+def GI_readbucket(list_of_graphs, workers=1):
+    """
+    (Mostly for internal use.)
+    The equivalent classes of graphs with equal invariants, see GI_readlistgraph(): color refinement of their
+    disjoint union, and canonical certificates for the graphs that it cannot tell apart.
+    Return:
+        - a list of equivalent classes, as indices into list_of_graphs
+    """
     # color refinement
-    init_info = initialization(list_of_graphs)
-    info = color_refinement(init_info)
+    init_info, matrix, reference = initialization_csr(list_of_graphs)
+    info = color_refinement(init_info, True, matrix, reference)
 
     # processing result
     num_graphs = len(list_of_graphs)
@@ -115,9 +375,16 @@ def GI_readlistgraph(list_of_graphs):
 
     # if there are undecided groups
     if len(bal_g) > 0:
+        # the certificates of all undecided graphs are independent jobs, across all groups
+        undecided = []
+        for key in bal_g:
+            undecided.extend(bal_g[key])
+        jobs = [(csr_from_graphs([list_of_graphs[idx]]),) for idx in undecided]
+        certificates = dict(zip(undecided, run_jobs(csr_certificate, jobs, workers)))
+
         for key in bal_g:
             group = bal_g[key]  # a list of graphs that potentially is isomorphic
-            bij_from_bal.extend((typify_group(group, list_of_graphs)))
+            bij_from_bal.extend(typify_group_by_certificate(group, certificates))
 
         for ele in bij_from_bal:
             GI_classes.append(ele)
@@ -126,68 +393,126 @@ def GI_readlistgraph(list_of_graphs):
 
 
 # tier 0 and tier 1
-def GI(filename):
+def GI(filename, workers=1, cache=None, stats=False):
     """
-    filename will always be a .grl file.
+    filename will always be a .grl or .grb file.
+    The file is streamed graph by graph, see grl_stream.py: only a summary of every graph is kept in memory,
+    and the graphs that the summaries cannot tell apart are read again one by one.
+    Params:
+        - workers, cache: see GI_readsummaries()
+        - stats: if True, return (result, SearchStats) with the counters of the call, see search_stats.py.
+                 stats.per_graph holds the counters of the certificate of every graph that needed one.
     Return:
-        - a list of equivalent classes.
+        - a list of equivalent classes, ordered by their smallest graph index.
     """
-    # file contains a list of graphs
-    with open(filename) as f:
-        G = load_graph(f, read_list=True)
-
-    list_of_graphs = G[0]
+    if stats:
+        with collecting() as total:
+            result = GI(filename, workers, cache)
+        return result, total
 
-    # test one equi class with more than 2 graphs!!!!!
-    # dup = deepcopy(G[0][-1])
-    # list_of_graphs.append(dup)
+    return GI_readsummaries(filename, summarize_file(filename, cache), workers, cache)
 
-    return GI_readlistgraph(list_of_graphs)
 
+# tier 1
+def GI_readsummaries(filename, summaries, workers=1, cache=None):
+    """
+    Params:
+        - summaries: the list of GraphSummary of the file, see summarize_file()
+        - workers: number of worker processes for the canonical certificates of the graphs with equal
+                   fingerprints, None for one per core, see parallel.run_jobs()
+        - cache: optional ResultCache that summaries were made with, the certificates are looked up in it,
+                 and then only their digests are compared, see result_cache.certificate_digest()
+    Return:
+        - a list of equivalent classes, ordered by their smallest graph index.
+    """
+    # {fingerprint: [list_of_graph_idx_with_this_fingerprint]}
+    buckets = {}
+    for summary in summaries:
+        if summary.fingerprint not in buckets:
+            buckets[summary.fingerprint] = [summary.index]
+        else:
+            buckets[summary.fingerprint].append(summary.index)
 
+    GI_classes = []
+    for key in buckets:
+        group = buckets[key]
+        if len(group) == 1:
+            GI_classes.append(group)
+        else:
+            # bucket by bucket, so that only the certificates of one bucket are in memory
+            certificates = {}
+            todo = []
+            for idx in group:
+                if cache is not None:
+                    digest = cache.certificate(summaries[idx].key)
+                    if digest is not None:
+                        certificates[idx] = digest
+                        continue
+                todo.append(idx)
+
+            jobs = [(filename, summaries[idx].offset) for idx in todo]
+            for idx, certificate in zip(todo, run_graph_jobs(certificate_at, jobs, workers, todo)):
+                if cache is not None:
+                    summary = summaries[idx]
+                    certificate = cache.store_certificate(summary.key, summary.n, summary.m, certificate)
+                certificates[idx] = certificate
+            GI_classes.extend(typify_group_by_certificate(group, certificates))
+
+    if cache is not None:
+        cache.commit()
+
+    GI_classes.sort()
+    return GI_classes
 
 
-# tier 1
-def typify_group(group, list_of_graphs):
+# tier 0
+def GI_files(filenames, workers=None, cache_file=None, stats=False):
     """
+    Run GI() on every file, one file per worker process.
     Params:
-        - group: a list of graph_idx that potentially is isomorphic
+        - cache_file: optional filename of a ResultCache, which every worker opens for itself
+        - stats: see GI()
     Return:
-        - types: a nested list, of which each element is a list of graph_idx that
-                 are in the same equivalent class
+        - a list of the results of GI(), in the order of filenames
     """
-    types = []
-    typified = []
-    for i in range(0, len(group)-1):
-        if group[i] not in typified:
-            matches = []
-            for j in range(i+1, len(group)):
-                if group[j] not in typified:
-                    if is_iso(list_of_graphs, [group[i], group[j]]):
-                        matches.append(group[j])
-                    else:
-                        pass
-            typified.append(group[i])
-            typified.extend(matches)
-            types.append([group[i]] + matches)
+    return run_jobs(GI_cached, [(filename, cache_file, stats) for filename in filenames], workers)
 
-    return types
 
+# tier 1: runs in a worker process
+def GI_cached(filename, cache_file, stats=False):
+    """
+    GI() with a ResultCache opened from <cache_file>, if it is not None.
+    """
+    if cache_file is None:
+        return GI(filename, 1, None, stats)
+    with ResultCache(cache_file) as cache:
+        return GI(filename, 1, cache, stats)
 
-# tier 1
-def is_iso(list_of_g, idx_list):
-    p = idx_list[0]
-    q = idx_list[1]
 
-    v = extract_vertices(list_of_g, [p, q])
 
-    # the last param is True if you want to stop at finding the first iso
-    count = count_isomorphism([], [], v, True)
 
-    if count != 0:
-        return True
-    else:
-        return False
+# tier 1
+def typify_group_by_certificate(group, certificates):
+    """
+    Params:
+        - group: a list of graph_idx that potentially is isomorphic
+        - certificates: {graph_idx: canonical certificate}, see canonical_form.csr_certificate()
+    Return:
+        - types: a nested list, of which each element is a list of graph_idx that
+                 are in the same equivalent class
+    Instead of a pairwise isomorphism search (utilities.count_isomorphism()), every graph gets a canonical
+    certificate once, and graphs are typified by hashing their certificates.
+    """
+    # {certificate: [list_of_graph_idx_with_this_certificate]}
+    types = {}
+    for idx in group:
+        certificate = certificates[idx]
+        if certificate not in types:
+            types[certificate] = [idx]
+        else:
+            types[certificate].append(idx)
+
+    return list(types.values())
 
 
 # tier 1
@@ -264,11 +589,11 @@ def typify_mappings(mappings):
 
 
 
-def GI_problem(filename):
+def GI_problem(filename, cache=None):
     """
     Encapsulate GI function together with printing results
     """
-    GI_classes = GI(filename)
+    GI_classes = GI(filename, 1, cache)
     print("========== file: {} ==========".format(filename))
     # ------------ formatting output of GI ------------
     print("Sets of isomorphic graphs:")
@@ -277,11 +602,17 @@ def GI_problem(filename):
 
 
 
-def AUT_problem(filename):
+def AUT_problem(filename, cache=None):
     """
     Encapsulate AUT function together with printing results
     """
-    value = AUT(filename)
+    print_AUT_result(filename, AUT(filename, False, 1, cache))
+
+
+def print_AUT_result(filename, value):
+    """
+    Print the result of AUT(filename) as project manual demanded.
+    """
     if isinstance(value, list):
         # ------------ formatting output of AUT, when AUT reading .grl ------------
         print("========== file: {} ==========".format(filename))
@@ -296,46 +627,57 @@ def AUT_problem(filename):
 
 # ================== body of functions ==================
 
-path = 'coach_wk5/'
+if __name__ == '__main__':
+    path = 'coach_wk5/'
 
-# filename = 'torus24.grl'
-# filename = 'trees36.grl'
-# filename = 'torus144.grl'
-# filename = 'cubes5.grl'
-# filename = 'cubes7.grl'
-# filename = 'cubes9.grl'
-# filename = 'trees90.grl'
+    # filename = 'torus24.grl'
+    # filename = 'trees36.grl'
+    # filename = 'torus144.grl'
+    # filename = 'cubes5.grl'
+    # filename = 'cubes7.grl'
+    # filename = 'cubes9.grl'
+    # filename = 'trees90.grl'
 
 
-filename = 'products72.grl'     # mentioned by the manual--AUT
-# filename = 'torus72.grl'     # mentioned by the manual--AUT
+    filename = 'products72.grl'     # mentioned by the manual--AUT
+    # filename = 'torus72.grl'     # mentioned by the manual--AUT
 
-# filename = 'bigtrees3.grl'    # mentioned by the manual--GI
-# filename = 'cubes6.grl'    # mentioned by the manual--GI
+    # filename = 'bigtrees3.grl'    # mentioned by the manual--GI
+    # filename = 'cubes6.grl'    # mentioned by the manual--GI
 
 
-# =============== reading files from directory ===============
-# files = get_files('GI')
-files = get_files('AUT')
-print(files)         # get a list of .gr/.grl files under GI directory
+    # =============== reading files from directory ===============
+    # files = get_files('GI')
+    files = get_files('AUT')
+    print(files)         # get a list of .gr/.grl files under GI directory
 
+    # results of graphs seen in earlier runs are taken from here, unused for 30 days they are evicted
+    cache = ResultCache('results_cache.sqlite', max_age=30 * 24 * 3600)
 
-# =============== GI ===============
-# for f in files:
-#     start = datetime.now()
-#     GI_problem('GI/' + f)
-#     end = datetime.now()
-#     print("It took {} to compute".format(end - start))
 
+    # =============== GI ===============
+    # for f in files:
+    #     start = datetime.now()
+    #     GI_problem('GI/' + f, cache)
+    #     end = datetime.now()
+    #     print("It took {} to compute".format(end - start))
 
 
-# =============== AUT ===============
-for f in files:
-    start = datetime.now()
-    AUT_problem('AUT/' + f)
-    end = datetime.now()
-    print("It took {} to compute".format(end - start))
 
+    # =============== AUT ===============
+    for f in files:
+        start = datetime.now()
+        AUT_problem('AUT/' + f, cache)
+        end = datetime.now()
+        print("It took {} to compute".format(end - start))
 
+    cache.close()
 
 
+    # =============== AUT, all files in parallel, one worker per core ===============
+    # start = datetime.now()
+    # results = AUT_files(['AUT/' + f for f in files], cache_file='results_cache.sqlite')
+    # for i in range(len(files)):
+    #     print_AUT_result('AUT/' + files[i], results[i])
+    # end = datetime.now()
+    # print("It took {} to compute".format(end - start))
@@ -0,0 +1,405 @@
+import heapq
+import random
+from array import array
+from math import factorial
+from csr_graph import CSRGraph
+from trees import RootedForest
+
+# Generators for classic graph families with a known number of automorphisms, for scaling tests.
+#
+# Every generator returns a GeneratedGraph: the number of vertices, an edge list on the vertex ids 0...n-1,
+# and |Aut| where a closed form exists. They are written to .gr/.grl files with write_grl(), which AUT()/GI()
+# read, or turned into a CSRGraph with to_csr(), which AUT_single_readcsr() takes directly.
+#
+# |Aut| of Cartesian products and disjoint unions is derived from their parts:
+#   - a connected graph has a unique factorization into prime graphs w.r.t. the Cartesian product
+#     (Sabidussi-Vizing), and if it has k_i factors isomorphic to the prime P_i, |Aut| = prod |Aut(P_i)|^k_i * k_i!
+#   - a graph with k_i components isomorphic to C_i has |Aut| = prod |Aut(C_i)|^k_i * k_i!
+# So every connected graph carries its prime factors, as (name, |Aut|) with equal names for isomorphic primes.
+# Graphs without a known factorization (e.g. random trees) have factors None, and so do their products.
+# The |Aut| of a random tree is computed with trees.RootedForest, which needs no search.
+#
+# The families of the course instances (threepaths, torus, products, trees, cubes, bigtrees) are at the end.
+
+
+class GeneratedGraph():
+
+    def __init__(self, name, n, edges, num_auto, factors=None, connected=True):
+        """
+        Params:
+            - name: a short description, e.g. 'C5' or 'P3xC5'
+            - n: the number of vertices, the vertex ids are 0...n-1
+            - edges: a list of (u, v) with u != v, every edge once
+            - num_auto: |Aut|, or None if it has no closed form
+            - factors: for a connected graph, the sorted list of its prime factors as (name, |Aut|), or None
+            - connected: False if the graph may be disconnected
+        """
+        self.name = name
+        self.n = n
+        self.edges = edges
+        self.num_auto = num_auto
+        self.factors = factors
+        self.connected = connected
+
+    @property
+    def m(self):
+        return len(self.edges)
+
+    def __repr__(self):
+        return 'GeneratedGraph({}, #vertices={}, #edges={}, |Aut|={})'.format(self.name, self.n, self.m,
+                                                                              count_text(self.num_auto))
+
+
+# ================ basic families ================
+
+# tier 1
+def path(n):
+    """
+    The path P_n on n vertices, |Aut| = 2 (1 for n = 1).
+    """
+    edges = [(i, i + 1) for i in range(n - 1)]
+    if n == 1:
+        return GeneratedGraph('P1', 1, edges, 1, [])
+    if n == 2:
+        return GeneratedGraph('P2', 2, edges, 2, [('K2', 2)])
+    return GeneratedGraph('P{}'.format(n), n, edges, 2, [('P{}'.format(n), 2)])
+
+
+# tier 1
+def cycle(n):
+    """
+    The cycle C_n on n >= 3 vertices, |Aut| = 2n.
+    """
+    if n < 3:
+        raise ValueError('a cycle has at least 3 vertices, got {}'.format(n))
+    edges = [(i, (i + 1) % n) for i in range(n)]
+    if n == 3:
+        factors = [('K3', 6)]
+    elif n == 4:
+        # C4 = K2 x K2
+        factors = [('K2', 2), ('K2', 2)]
+    else:
+        factors = [('C{}'.format(n), 2 * n)]
+    return GeneratedGraph('C{}'.format(n), n, edges, 2 * n, factors)
+
+
+# tier 1
+def complete(n):
+    """
+    The complete graph K_n, |Aut| = n!.
+    """
+    edges = [(i, j) for i in range(n) for j in range(i + 1, n)]
+    factors = [] if n == 1 else [('K{}'.format(n), factorial(n))]
+    return GeneratedGraph('K{}'.format(n), n, edges, factorial(n), factors)
+
+
+# tier 1
+def star(k):
+    """
+    The star K_1,k with k leaves, |Aut| = k!.
+    """
+    if k <= 2:
+        g = path(k + 1)
+        g.name = 'S{}'.format(k)
+        return g
+    edges = [(0, i) for i in range(1, k + 1)]
+    return GeneratedGraph('S{}'.format(k), k + 1, edges, factorial(k), [('S{}'.format(k), factorial(k))])
+
+
+# tier 1
+def spider(legs, length):
+    """
+    A tree of <legs> >= 3 paths of <length> vertices, all attached to one center vertex 0, |Aut| = legs!.
+    """
+    if length == 1:
+        return star(legs)
+    edges = []
+    for leg in range(legs):
+        first = 1 + leg * length
+        edges.append((0, first))
+        for i in range(first, first + length - 1):
+            edges.append((i, i + 1))
+    name = 'spider{}x{}'.format(legs, length)
+    return GeneratedGraph(name, legs * length + 1, edges, factorial(legs), [(name, factorial(legs))])
+
+
+# tier 1
+def hypercube(d):
+    """
+    The hypercube Q_d on 2^d vertices, u ~ v iff they differ in one bit, |Aut| = 2^d * d!.
+    """
+    edges = []
+    for v in range(2 ** d):
+        for i in range(d):
+            u = v ^ (1 << i)
+            if v < u:
+                edges.append((v, u))
+    return GeneratedGraph('Q{}'.format(d), 2 ** d, edges, 2 ** d * factorial(d), [('K2', 2)] * d)
+
+
+# tier 1
+def petersen():
+    """
+    The Petersen graph, |Aut| = 120.
+    """
+    edges = [(i, (i + 1) % 5) for i in range(5)] + [(i, i + 5) for i in range(5)] + \
+            [(5 + i, 5 + (i + 2) % 5) for i in range(5)]
+    return GeneratedGraph('Petersen', 10, edges, 120, [('Petersen', 120)])
+
+
+# tier 1
+def random_tree(n, seed=0):
+    """
+    A uniformly random labelled tree on n vertices, from a random Pruefer sequence.
+    Its |Aut| has no closed form, it is computed by trees.RootedForest, and its factors are None.
+    """
+    if n <= 2:
+        return path(n)
+    rng = random.Random(seed)
+    sequence = [rng.randrange(n) for _ in range(n - 2)]
+    degree = [1] * n
+    for v in sequence:
+        degree[v] += 1
+    leaves = [v for v in range(n) if degree[v] == 1]
+    heapq.heapify(leaves)
+    edges = []
+    for v in sequence:
+        leaf = heapq.heappop(leaves)
+        edges.append((leaf, v))
+        degree[v] -= 1
+        if degree[v] == 1:
+            heapq.heappush(leaves, v)
+    edges.append((heapq.heappop(leaves), heapq.heappop(leaves)))
+    g = GeneratedGraph('tree{}_{}'.format(n, seed), n, edges, None)
+    g.num_auto = RootedForest(to_csr(g)).num_auto
+    return g
+
+
+# tier 1
+def grid(a, b):
+    """
+    The a x b grid P_a x P_b, |Aut| = 8 if a == b >= 2, 4 if a != b and both >= 2, 2 if one of them is 1 (and the
+    other one is at least 2).
+    """
+    g = cartesian_product(path(a), path(b))
+    g.name = 'grid{}x{}'.format(a, b)
+    return g
+
+
+# ================ operations ================
+
+# tier 1
+def cartesian_product(g, h):
+    """
+    The Cartesian product g x h, vertex (a, b) gets id a * h.n + b.
+    (a, b) ~ (c, d) iff a == c and b ~ d in h, or b == d and a ~ c in g.
+    """
+    edges = []
+    for a, c in g.edges:
+        for b in range(h.n):
+            edges.append((a * h.n + b, c * h.n + b))
+    for b, d in h.edges:
+        for a in range(g.n):
+            edges.append((a * h.n + b, a * h.n + d))
+
+    connected = g.connected and h.connected
+    factors = None
+    num_auto = None
+    if connected and g.factors is not None and h.factors is not None:
+        factors = sorted(g.factors + h.factors)
+        num_auto = count_by_class(factors)
+    return GeneratedGraph('{}x{}'.format(g.name, h.name), g.n * h.n, edges, num_auto, factors, connected)
+
+
+# tier 1
+def disjoint_union(graphs):
+    """
+    The disjoint union of the graphs, the ids of graphs[k] are shifted by the number of vertices before it.
+    |Aut| is only known if every part is connected and has known factors.
+    """
+    edges = []
+    shift = 0
+    for g in graphs:
+        edges.extend((u + shift, v + shift) for u, v in g.edges)
+        shift += g.n
+
+    num_auto = None
+    if all(g.connected and g.factors is not None for g in graphs):
+        num_auto = count_by_class([(tuple(g.factors), g.num_auto) for g in graphs])
+    name = '+'.join(g.name for g in graphs)
+    return GeneratedGraph(name, shift, edges, num_auto, None, len(graphs) == 1)
+
+
+# tier 1
+def relabel(g, seed=0):
+    """
+    The same graph with the vertex ids randomly permuted, so that the ids carry no information.
+    """
+    rng = random.Random(seed)
+    perm = list(range(g.n))
+    rng.shuffle(perm)
+    edges = [(perm[u], perm[v]) for u, v in g.edges]
+    rng.shuffle(edges)
+    return GeneratedGraph(g.name, g.n, edges, g.num_auto, g.factors, g.connected)
+
+
+# tier 1
+def complement_graph(g):
+    """
+    The complement of g, which has the same automorphisms. It may be disconnected, and its factors are unknown.
+    """
+    adjacent = set()
+    for u, v in g.edges:
+        adjacent.add((u, v))
+        adjacent.add((v, u))
+    edges = [(u, v) for u in range(g.n) for v in range(u + 1, g.n) if (u, v) not in adjacent]
+    return GeneratedGraph('co-' + g.name, g.n, edges, g.num_auto, None, False)
+
+
+# tier 2
+def count_by_class(parts):
+    """
+    Params:
+        - parts: a list of (class, |Aut|) where parts of the same class are isomorphic
+    Return:
+        - prod |Aut|^k * k! over the classes, where k is the number of parts in the class
+    """
+    sizes = {}
+    for cls, num_auto in parts:
+        k, _ = sizes.get(cls, (0, num_auto))
+        sizes[cls] = (k + 1, num_auto)
+    total = 1
+    for k, num_auto in sizes.values():
+        total *= num_auto ** k * factorial(k)
+    return total
+
+
+# ================ course families ================
+
+# tier 0
+def threepaths(n):
+    """
+    A tree of three paths of n vertices each, attached to a center, as in threepaths<n>.gr.
+    """
+    return spider(3, n)
+
+
+# tier 0
+def torus_family(n, seed=0):
+    """
+    All tori C_a x C_b (3 <= a <= b) with n vertices, every one twice under different labels, shuffled,
+    as in torus<n>.grl.
+    """
+    graphs = []
+    for a in range(3, n + 1):
+        if n % a == 0 and a <= n // a:
+            torus = cartesian_product(cycle(a), cycle(n // a))
+            graphs.append(relabel(torus, seed + 2 * len(graphs)))
+            graphs.append(relabel(torus, seed + 2 * len(graphs) + 1))
+    random.Random(seed).shuffle(graphs)
+    return graphs
+
+
+# tier 0
+def products_family(n, seed=0):
+    """
+    Cartesian products g x h with n vertices of paths, cycles and complete graphs, relabelled and shuffled,
+    as in products<n>.grl. Different pairs may give isomorphic products, e.g. C4 x P3 and P2 x P2 x P3.
+    """
+    graphs = []
+    for a in range(2, n // 2 + 1):
+        if n % a != 0 or a > n // a:
+            continue
+        b = n // a
+        for g in [path(a), cycle(a) if a >= 3 else None, complete(a)]:
+            for h in [path(b), cycle(b) if b >= 3 else None, complete(b)]:
+                if g is not None and h is not None:
+                    graphs.append(relabel(cartesian_product(g, h), seed + len(graphs)))
+    random.Random(seed).shuffle(graphs)
+    return graphs
+
+
+# tier 0
+def cubes_family(d, seed=0):
+    """
+    Graphs with 2^d vertices, d >= 2: Q_d itself and Q_(d-2) x C4 (both isomorphic to Q_d, so d-regular),
+    for d >= 3 the 3-regular prism K2 x C_(2^(d-1)) (for d = 2 it would be Q_2 again) and, for d >= 4,
+    the 4-regular torus C4 x C_(2^(d-2)), relabelled and shuffled, as in cubes<d>.grl.
+    """
+    if d < 2:
+        raise ValueError('cubes_family needs d >= 2, got {}'.format(d))
+    graphs = [relabel(hypercube(d), seed),
+              relabel(cartesian_product(hypercube(d - 2), cycle(4)), seed + 1)]
+    if d >= 3:
+        graphs.append(relabel(cartesian_product(path(2), cycle(2 ** (d - 1))), seed + 2))
+    if d >= 4:
+        graphs.append(relabel(cartesian_product(cycle(4), cycle(2 ** (d - 2))), seed + 3))
+    random.Random(seed).shuffle(graphs)
+    return graphs
+
+
+# tier 0
+def trees_family(n, count, seed=0):
+    """
+    <count> random trees on n vertices, half of them relabelled copies of others,
+    as in trees<n>.grl and (for large n) bigtrees<k>.grl.
+    """
+    rng = random.Random(seed)
+    originals = [random_tree(n, rng.randrange(2 ** 32)) for _ in range((count + 1) // 2)]
+    graphs = list(originals)
+    while len(graphs) < count:
+        graphs.append(relabel(rng.choice(originals), rng.randrange(2 ** 32)))
+    rng.shuffle(graphs)
+    return graphs
+
+
+# ================ output ================
+
+# tier 0
+def write_grl(filename, graphs):
+    """
+    Write a list of GeneratedGraph in the .gr/.grl text format that graph_io.py reads,
+    a .gr file is a .grl file with one graph.
+    """
+    with open(filename, 'w') as f:
+        for k in range(len(graphs)):
+            g = graphs[k]
+            f.write('# {}, |Aut| = {}\n'.format(g.name, count_text(g.num_auto)))
+            f.write('# Number of vertices:\n{}\n# Edge list:\n'.format(g.n))
+            f.write(''.join('{},{}\n'.format(u, v) for u, v in g.edges))
+            if k + 1 < len(graphs):
+                f.write('--- Next graph:\n')
+
+
+# tier 1
+def count_text(num):
+    """
+    Return |Aut| as text: in decimal, or in hex (with 0x) if it has more decimal digits than Python converts
+    (4300 by default, e.g. for star(3000) or complete(1700)).
+    """
+    try:
+        return str(num)
+    except ValueError:
+        return hex(num)
+
+
+# tier 0
+def to_csr(g, index=0):
+    """
+    Return g as a CSRGraph, vertex id i gets label i and graph_idx <index>.
+    """
+    degree = [0] * (g.n + 1)
+    for u, v in g.edges:
+        degree[u + 1] += 1
+        degree[v + 1] += 1
+    offsets = array('i', [0] * (g.n + 1))
+    for i in range(g.n):
+        offsets[i + 1] = offsets[i] + degree[i + 1]
+    nbs = array('i', [0] * offsets[g.n])
+    fill = list(offsets[:g.n])
+    for u, v in g.edges:
+        nbs[fill[u]] = v
+        fill[u] += 1
+        nbs[fill[v]] = u
+        fill[v] += 1
+    return CSRGraph(offsets, nbs, array('i', [index]) * g.n, array('i', range(g.n)))
@@ -0,0 +1,198 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from csr_graph import CSRGraph
+from grl_stream import iter_grl, summarize_graphs
+
+# A binary container for (lists of) graphs, the .grb format, which is loaded by memory-mapping the file.
+# All numbers are little-endian.
+#
+#   header:  magic b'GRB1' | version (uint32) | number of graphs k (uint64) | byte offset of the index (uint64)
+#   data:    for every graph, its CSR arrays as int32: offsets (n+1 values), then nbs (offsets[n] values)
+#   index:   for every graph, (byte offset of its data, n, len(nbs)) as three uint64
+#
+# The data of every graph is 4-byte aligned, so the loader hands out the CSR arrays as memoryviews
+# on the mapped file, without copying or parsing anything. Vertex i of a graph has label i, as in graph_io.
+
+MAGIC = b'GRB1'
+VERSION = 1
+HEADER = struct.Struct('<4sIQQ')
+INDEX_ENTRY = struct.Struct('<QQQ')
+
+
+class GraphFile():
+
+    def __init__(self, filename):
+        """
+        Memory-map the .grb file <filename>, only the header and the index are read.
+        The CSRGraphs returned by graph(i) are views on the mapping, they stay valid until close().
+        """
+        self.filename = filename
+        self.file = open(filename, 'rb')
+        self.stamp = file_stamp(self.file.fileno())
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+
+        magic, version, k, index_offset = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a .grb file of version {}'.format(filename, VERSION))
+        # index[i] = (data offset, n, nnz) of graph i
+        self.index = []
+        for i in range(k):
+            self.index.append(INDEX_ENTRY.unpack_from(self.mmap, index_offset + i * INDEX_ENTRY.size))
+
+    def __len__(self):
+        return len(self.index)
+
+    def graph(self, i):
+        """
+        Return graph i as a CSRGraph whose offsets and nbs are zero-copy int32 views on the file.
+        """
+        start, n, nnz = self.index[i]
+        offsets = int32_view(self.view, start, n + 1)
+        nbs = int32_view(self.view, start + 4 * (n + 1), nnz)
+        return CSRGraph(offsets, nbs, array('i', [i]) * n, range(n))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.graph(i)
+
+    def close(self):
+        """
+        Release the mapping, every CSRGraph handed out must be gone by then.
+        """
+        self.view.release()
+        self.mmap.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# graph files opened by open_graph_file(), per process: {absolute path: GraphFile}
+open_files = {}
+
+
+# tier 0
+def open_graph_file(filename):
+    """
+    Return a GraphFile for <filename>, mapping every file only once per process.
+    If the file was rewritten since it was mapped (another inode, mtime or size), the old mapping is dropped
+    and the new file is mapped.
+    """
+    path = os.path.abspath(filename)
+    if path in open_files and open_files[path].stamp != file_stamp(path):
+        drop_graph_file(path)
+    if path not in open_files:
+        open_files[path] = GraphFile(filename)
+    return open_files[path]
+
+
+# tier 0
+def close_graph_files():
+    """
+    Drop every mapping of open_graph_file(). A mapping that still has CSRGraphs in use is released by the garbage
+    collector once they are gone.
+    """
+    for path in list(open_files):
+        drop_graph_file(path)
+
+
+# tier 0
+def read_grb_graph(filename, index):
+    """
+    The .grb counterpart of grl_stream.read_grl_graph(), graphs are addressed by index instead of byte offset.
+    """
+    return open_graph_file(filename).graph(index)
+
+
+# tier 0
+def summarize_grb(filename, cache=None):
+    """
+    The .grb counterpart of grl_stream.summarize_grl(), the offset of every summary is the graph index.
+    """
+    graph_file = open_graph_file(filename)
+    return summarize_graphs(((i, graph_file.graph(i)) for i in range(len(graph_file))), graph_file.graph, cache)
+
+
+# tier 0
+def convert_to_grb(src, dst):
+    """
+    Convert the .gr/.grl file <src> to the .grb file <dst>, streaming graph by graph.
+    The file is written next to dst and then renamed onto it, so a mapping of an old dst keeps its data.
+    Return:
+        - the number of graphs written
+    """
+    index = []
+    tmp = dst + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        for offset, csr in iter_grl(src):
+            index.append((f.tell(), csr.n, len(csr.nbs)))
+            f.write(int32_bytes(csr.offsets))
+            f.write(int32_bytes(csr.nbs))
+
+        index_offset = f.tell()
+        for entry in index:
+            f.write(INDEX_ENTRY.pack(*entry))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, len(index), index_offset))
+    os.replace(tmp, dst)
+    drop_graph_file(os.path.abspath(dst))
+    return len(index)
+
+
+# tier 1
+def drop_graph_file(path):
+    """
+    (Mostly for internal use.)
+    Remove the GraphFile of the absolute path <path> from open_files, if any, and close it unless some of its
+    CSRGraphs are still in use.
+    """
+    graph_file = open_files.pop(path, None)
+    if graph_file is None:
+        return
+    try:
+        graph_file.close()
+    except BufferError:
+        # views on the mapping are still exported, it is closed when they are gone
+        pass
+
+
+# tier 1
+def file_stamp(file):
+    """
+    Return (inode, mtime in ns, size) of a path or file descriptor, which changes when the file is rewritten.
+    """
+    st = os.stat(file)
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+# tier 1
+def int32_bytes(values):
+    """
+    Return the values as little-endian int32 bytes.
+    """
+    a = array('i', values)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a.tobytes()
+
+
+# tier 1
+def int32_view(view, start, length):
+    """
+    Return <length> little-endian int32 values starting at byte <start> of <view>,
+    as a memoryview without copy (or as a byte-swapped array copy on big-endian machines).
+    """
+    raw = view[start:start + 4 * length]
+    if sys.byteorder == 'little':
+        return raw.cast('i')
+    a = array('i', raw.tobytes())
+    a.byteswap()
+    return a
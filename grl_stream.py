@@ -0,0 +1,194 @@
+from array import array
+from functools import partial
+from csr_graph import CSRGraph, sparse_side
+from invariants import iter_invariants, invariant_digest
+from partition_refinement import Partition, refine
+from canonical_form import trace_invariant
+
+# Streaming access to .gr/.grl files, without building Graph, Vertex and Edge objects.
+#
+# The file format is the one of graph_io.py: comment lines start with '#', every graph is the number of
+# vertices on a line of its own followed by one "u,v" (or "u,v:weight") line per edge, and graphs in a .grl
+# file are separated by a line starting with '-'. Vertex i of a graph gets label i, as in graph_io.
+#
+# iter_grl() parses graph by graph directly into CSRGraphs, and remembers the byte offset where every graph
+# starts, so that a single graph can be read again later with read_grl_graph(). summarize_grl() keeps only a
+# GraphSummary per graph, which is all that is needed to bucket graphs for GI.
+#
+# The fingerprint of a summary is computed in two passes, see summarize_graphs(): the cheap NumPy invariants of
+# invariants.py for every graph (in chunks of graphs), and the refinement fingerprint only for the graphs that
+# share their invariants with another graph of the file, which are read again by offset.
+
+
+class GraphSummary():
+
+    def __init__(self, index, offset, n, m, fingerprint, key=None):
+        """
+        Params:
+            - index: the position of the graph in the file, starting from 0
+            - offset: the byte offset in the file where the graph starts, see read_grl_graph()
+            - n, m: the number of vertices and edges
+            - fingerprint: a hashable isomorphism invariant of the graph, see summarize_graphs()
+            - key: the hash of the edge set of the graph if it was summarized with a cache, see result_cache.py
+        """
+        self.index = index
+        self.offset = offset
+        self.n = n
+        self.m = m
+        self.fingerprint = fingerprint
+        self.key = key
+
+    def __repr__(self):
+        return 'GraphSummary(index={}, offset={}, #vertices={}, #edges={})'.format(self.index, self.offset,
+                                                                                 self.n, self.m)
+
+
+# tier 0
+def iter_grl(filename):
+    """
+    A generator over the graphs in a .gr or .grl file, only one graph is in memory at a time.
+    Yield:
+        - (offset, csr) for every graph in the file, in order,
+          where csr is a CSRGraph with graph_idx equal to the position of the graph in the file
+    """
+    with open(filename, 'rb') as f:
+        index = 0
+        while True:
+            offset = f.tell()
+            csr, more = read_csr(f, index)
+            if csr is None:
+                return
+            yield offset, csr
+            if not more:
+                return
+            index += 1
+
+
+# tier 0
+def read_grl_graph(filename, offset, index=0):
+    """
+    Read the single graph that starts at byte <offset> of the file, see iter_grl().
+    Params:
+        - index: the graph_idx given to its vertices
+    Return:
+        - a CSRGraph
+    """
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        csr, _ = read_csr(f, index)
+    return csr
+
+
+# tier 0
+def summarize_grl(filename, cache=None):
+    """
+    Stream over the graphs in the file and keep only a GraphSummary of every graph, see summarize_graphs().
+    Params:
+        - cache: optional result_cache.ResultCache, the refinement fingerprints are looked up in it instead of computed
+    Return:
+        - a list of GraphSummary, in the order of the file
+    """
+    return summarize_graphs(iter_grl(filename), partial(read_grl_graph, filename), cache)
+
+
+# tier 1
+def summarize_graphs(graphs, read_graph, cache=None):
+    """
+    Params:
+        - graphs: an iterable over (offset, csr) for every graph of a file, in order
+        - read_graph: a function that returns the CSRGraph of the graph at an offset again
+        - cache: see summarize_grl(), with a cache every summary has a key
+    Return:
+        - a list of GraphSummary, where the fingerprint is (invariant digest, refinement fingerprint),
+          see invariants.invariant_digest() and refinement_fingerprint(). The refinement fingerprint is only
+          computed for graphs that share their invariant digest with another graph, and None otherwise.
+    """
+    summaries = []
+    digests = []
+    for offset, csr, row in iter_invariants(graphs):
+        key = cache.key(csr) if cache is not None else None
+        summaries.append(GraphSummary(len(summaries), offset, csr.n, csr.m, None, key))
+        digests.append(invariant_digest(row))
+
+    # {invariant digest: number of graphs with that digest}
+    counts = {}
+    for digest in digests:
+        if digest not in counts:
+            counts[digest] = 1
+        else:
+            counts[digest] += 1
+
+    for summary, digest in zip(summaries, digests):
+        fingerprint = None
+        if counts[digest] > 1:
+            csr = read_graph(summary.offset)
+            if cache is None:
+                fingerprint = refinement_fingerprint(csr)
+            else:
+                _, fingerprint = cache.fingerprint_of(csr, summary.key)
+        summary.fingerprint = (digest, fingerprint)
+    return summaries
+
+
+# tier 1
+def refinement_fingerprint(csr):
+    """
+    Refine the degree coloring of the graph, and return (n, m, number of cells, trace invariant).
+    Isomorphic graphs have equal fingerprints, because the refinement only depends on cell positions.
+    A dense graph is refined as its complement, see csr_graph.sparse_side().
+    """
+    sparse, _ = sparse_side(csr)
+    colors = [sparse.degree(v) for v in range(csr.n)]
+    part = Partition(csr.n, colors)
+    trace = []
+    refine(sparse, part, None, trace)
+    return csr.n, csr.m, part.num_cells, trace_invariant(-1, trace)
+
+
+# tier 1
+def read_csr(f, index):
+    """
+    Parse one graph from the binary file object f, starting at its current position, like graph_io.read_graph().
+    Return:
+        - csr: a CSRGraph, or None if there is no graph left
+        - more: True if the graph ended with a '-' line, i.e. another graph follows
+    """
+    # the number of vertices is the first line that is an int, other lines are comments or options
+    n = None
+    while n is None:
+        line = f.readline()
+        if len(line) == 0:
+            return None, False
+        if line[:1] == b'#':
+            continue
+        try:
+            n = int(line)
+        except ValueError:
+            pass
+
+    adjacency = [[] for _ in range(n)]
+    more = False
+    while True:
+        line = f.readline()
+        if line[:1] == b'#':
+            continue
+        comma = line.find(b',')
+        if comma < 0:
+            more = line[:1] == b'-'
+            break
+        colon = line.find(b':')
+        u = int(line[:comma])
+        if colon < 0:
+            v = int(line[comma + 1:])
+        else:
+            v = int(line[comma + 1:colon])
+        # a self-loop u,u is listed twice in adjacency[u], so that m = len(nbs) // 2 counts it once
+        adjacency[u].append(v)
+        adjacency[v].append(u)
+
+    offsets = array('i', [0])
+    nbs = array('i')
+    for nb in adjacency:
+        nbs.extend(nb)
+        offsets.append(len(nbs))
+    return CSRGraph(offsets, nbs, array('i', [index] * n), array('i', range(n))), more
@@ -0,0 +1,205 @@
+import hashlib
+import numpy as np
+
+# Cheap graph invariants for all the graphs of a .grl list at once, to bucket them before any refinement.
+#
+# Every graph gets one int64 fingerprint row:
+#     n, m, number of connected components, number of triangles, sorted degree sequence
+# Isomorphic graphs have equal rows, so only graphs with equal rows can be isomorphic, and color refinement and
+# search only have to run within the buckets of equal rows, see grl_stream.summarize_graphs() (for GI() and AUT())
+# and final_AUT.GI_readlistgraph().
+#
+# The graphs are put into one disjoint union of flat NumPy arrays (vertex -> graph, edge endpoints), and every
+# invariant is a handful of array operations over the whole union, in O((n + m) log n) except for the triangles:
+#   - degrees:    differences of the CSR offsets, sorted per graph with one lexsort
+#   - components: min-label propagation along the edges with pointer jumping, until no label changes
+#   - triangles:  every edge is oriented from the endpoint of smaller (degree, id) to the other one, and every pair
+#                 of out-edges (v, a), (v, b) of a vertex is a triangle iff (a, b) is an out-edge, in O(m^1.5).
+#                 Graphs with more than TRIANGLE_LIMIT edges get -1 (which only depends on m, so it never
+#                 separates isomorphic graphs).
+# The union is built in chunks of at most CHUNK_SIZE vertices and edge entries, see iter_invariants().
+
+TRIANGLE_LIMIT = 1 << 16
+
+# the pairs of out-edges of one batch of the triangle count take at most this many entries
+WEDGE_BATCH = 1 << 22
+
+# the graphs go through invariant_rows() in chunks of at most this many vertices and edge entries
+CHUNK_SIZE = 1 << 20
+
+
+# tier 0
+def invariant_buckets(csrs):
+    """
+    Params:
+        - csrs: a list of CSRGraph, one per graph
+    Return:
+        - a list of buckets, lists of indices into csrs with equal fingerprints, see invariant_rows(),
+          ordered by their smallest index
+    """
+    buckets = {}
+    for i, csr, row in iter_invariants(enumerate(csrs)):
+        digest = invariant_digest(row)
+        if digest in buckets:
+            buckets[digest].append(i)
+        else:
+            buckets[digest] = [i]
+    return sorted(buckets.values())
+
+
+# tier 0
+def iter_invariants(items):
+    """
+    A generator over the fingerprint rows of a stream of graphs, only one chunk of graphs (see CHUNK_SIZE)
+    is held at a time.
+    Params:
+        - items: an iterable over (item, csr), e.g. (offset, csr) from grl_stream.iter_grl()
+    Yield:
+        - (item, csr, row) for every graph, in order, see invariant_rows()
+    """
+    chunk = []
+    size = 0
+    for item, csr in items:
+        chunk.append((item, csr))
+        size += csr.n + len(csr.nbs)
+        if size >= CHUNK_SIZE:
+            for entry in zip_rows(chunk):
+                yield entry
+            chunk = []
+            size = 0
+    for entry in zip_rows(chunk):
+        yield entry
+
+
+# tier 1
+def zip_rows(chunk):
+    """
+    (Mostly for internal use.)
+    Return [(item, csr, row)] for a chunk of (item, csr).
+    """
+    if len(chunk) == 0:
+        return []
+    rows = invariant_rows([csr for _, csr in chunk])
+    return [(item, csr, row) for (item, csr), row in zip(chunk, rows)]
+
+
+# tier 1
+def invariant_rows(csrs):
+    """
+    Return:
+        - the fingerprint row of every graph, a 1-D int64 array of length 4 + n, see the module description
+    """
+    k = len(csrs)
+    sizes = np.array([csr.n for csr in csrs], dtype=np.int64)
+    degrees, graph_of, src, dst = union_arrays(csrs)
+
+    # all rows in one flat array, row i starts at starts[i]
+    starts = np.concatenate(([0], np.cumsum(sizes + 4)[:-1])).astype(np.int64)
+    flat = np.empty(int((sizes + 4).sum()), dtype=np.int64)
+    flat[starts] = sizes
+    flat[starts + 1] = np.bincount(graph_of, weights=degrees, minlength=k).astype(np.int64) // 2
+    flat[starts + 2] = count_components(graph_of, src, dst, k)
+    flat[starts + 3] = count_triangles(degrees, graph_of, src, dst, k)
+
+    # sorted degree sequence: sort by (graph, degree), the position within the graph gives the column
+    order = np.lexsort((degrees, graph_of))
+    vertex_starts = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+    position = np.arange(len(order)) - vertex_starts[graph_of[order]]
+    flat[starts[graph_of[order]] + 4 + position] = degrees[order]
+    return np.split(flat, starts[1:])
+
+
+# tier 1
+def invariant_digest(row):
+    """
+    Return a hex digest of a fingerprint row from invariant_rows().
+    """
+    return hashlib.sha256(np.ascontiguousarray(row, dtype=np.int64).tobytes()).hexdigest()
+
+
+# tier 2
+def union_arrays(csrs):
+    """
+    Return:
+        - degrees: the degree of every vertex of the union, where the vertices of csrs[i] follow those of csrs[i-1]
+        - graph_of: the index of the graph of every vertex
+        - src, dst: the endpoints of every (directed) edge of the union, as vertex ids of the union
+    """
+    degrees = []
+    graph_of = []
+    src = []
+    dst = []
+    base = 0
+    for i, csr in enumerate(csrs):
+        degree = np.diff(np.asarray(csr.offsets, dtype=np.int64))
+        degrees.append(degree)
+        graph_of.append(np.full(csr.n, i, dtype=np.int64))
+        src.append(np.repeat(np.arange(csr.n, dtype=np.int64), degree) + base)
+        dst.append(np.asarray(csr.nbs, dtype=np.int64) + base)
+        base += csr.n
+    empty = np.zeros(0, dtype=np.int64)
+    return (np.concatenate(degrees + [empty]), np.concatenate(graph_of + [empty]),
+            np.concatenate(src + [empty]), np.concatenate(dst + [empty]))
+
+
+# tier 2
+def count_components(graph_of, src, dst, k):
+    """
+    Return:
+        - the number of connected components of each of the k graphs
+    Every vertex starts with its own id as label, takes the smallest label among its neighbours and then the label
+    of its label, until nothing changes: every label ends as the smallest id of its component.
+    """
+    label = np.arange(len(graph_of), dtype=np.int64)
+    while True:
+        new = label.copy()
+        np.minimum.at(new, src, label[dst])
+        new = new[new]
+        if np.array_equal(new, label):
+            break
+        label = new
+    roots = label == np.arange(len(label))
+    return np.bincount(graph_of[roots], minlength=k)
+
+
+# tier 2
+def count_triangles(degrees, graph_of, src, dst, k):
+    """
+    Return:
+        - the number of triangles of each of the k graphs with at most TRIANGLE_LIMIT edges, -1 for the others
+    Self-loops are left out and multiple edges are counted once, see the module description.
+    """
+    N = len(graph_of)
+    m = np.bincount(graph_of, weights=degrees, minlength=k).astype(np.int64) // 2
+    too_large = m > TRIANGLE_LIMIT
+    triangles = np.where(too_large, -1, 0).astype(np.int64)
+
+    # orient every edge from the endpoint of smaller (degree, id) to the other one
+    rank = np.empty(N, dtype=np.int64)
+    rank[np.lexsort((np.arange(N), degrees))] = np.arange(N)
+    keep = (rank[src] < rank[dst]) & ~too_large[graph_of[src]]
+    # the sorted out-edges (tail, head), as keys tail * N + head
+    keys = np.unique(src[keep] * N + dst[keep])
+    tail = keys // N
+    head = keys % N
+    out_degree = np.bincount(tail, minlength=N)
+    first_out = np.concatenate(([0], np.cumsum(out_degree)[:-1])).astype(np.int64)
+
+    # every out-edge e = (v, a) is paired with the out_degree[v] out-edges (v, b), in batches of edges
+    pairs = out_degree[tail]
+    ends = np.cumsum(pairs)
+    lo = 0
+    while lo < len(keys):
+        # as many edges as fit into one batch of pairs, at least one
+        done = ends[lo - 1] if lo > 0 else 0
+        hi = max(lo + 1, int(np.searchsorted(ends, done + WEDGE_BATCH, 'right')))
+        counts = pairs[lo:hi]
+        edge = np.repeat(np.arange(lo, hi), counts)
+        within = np.arange(len(edge)) - np.repeat(np.cumsum(counts) - counts, counts)
+        other = first_out[tail[edge]] + within
+        wanted = head[edge] * N + head[other]
+        found = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+        closed = keys[found] == wanted
+        triangles += np.bincount(graph_of[tail[edge[closed]]], minlength=k)
+        lo = hi
+    return triangles
@@ -0,0 +1,65 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from os import cpu_count
+
+# Running independent jobs (isomorphism classes, buckets of graphs, files) in a pool of worker processes.
+# The results always come back in the order of the jobs, so the output does not depend on the
+# number of workers or on which worker finishes first.
+#
+# The function of a job is sent to the workers by name, so it has to be defined at the top level of a module,
+# and its arguments have to be picklable (e.g. a CSRGraph, not a Graph object full of references).
+# A module that starts a pool from its script part must keep that part under if __name__ == '__main__',
+# otherwise the workers would run it again on platforms that spawn instead of fork.
+#
+# run_threads() runs jobs in threads of this process instead, e.g. many queries against one loaded graph, without
+# pickling it for every worker. Refinement and search never write to the graph (a CSRGraph, or the Graph and Vertex
+# objects, which are copied into per-run SimpleVertex records, see utilities.copy_vertices()), and the search
+# counters are per thread, see search_stats.py. Pure Python work holds the GIL, so threads give concurrency
+# (e.g. next to I/O or a server), not a speed-up of the search itself: use run_jobs() for that.
+
+
+# tier 0
+def num_workers(workers=None):
+    """
+    Return the number of worker processes to use: <workers>, or the number of cores if it is None.
+    """
+    if workers is None:
+        workers = cpu_count() or 1
+    return max(1, workers)
+
+
+# tier 0
+def run_jobs(function, jobs, workers=1):
+    """
+    Params:
+        - function: a top level function
+        - jobs: a list of argument tuples, one per call of function
+        - workers: the number of worker processes, None for one per core, 1 to run everything in this process
+    Return:
+        - a list of the return values, results[i] = function(*jobs[i])
+    """
+    workers = min(num_workers(workers), len(jobs))
+    if workers <= 1:
+        return [function(*args) for args in jobs]
+
+    # a few chunks per worker: large enough to keep the pickling overhead low for many small jobs,
+    # small enough to balance the load when some jobs are much larger than others
+    chunksize = max(1, len(jobs) // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, *zip(*jobs), chunksize=chunksize))
+
+
+# tier 0
+def run_threads(function, jobs, workers=None):
+    """
+    Params:
+        - function: any callable, the jobs may share (read-only) arguments, e.g. the same CSRGraph
+        - jobs: a list of argument tuples, one per call of function
+        - workers: the number of threads, None for one per core
+    Return:
+        - a list of the return values, results[i] = function(*jobs[i])
+    """
+    workers = min(num_workers(workers), len(jobs))
+    if workers <= 1:
+        return [function(*args) for args in jobs]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, *zip(*jobs)))
@@ -0,0 +1,273 @@
+from array import array
+from collections import deque
+import search_stats
+
+# Hopcroft-style ("process the smaller half") partition refinement on a CSRGraph.
+#
+# The partition is an *ordered* partition: the vertex ids are kept in one array <elements>,
+# and every cell is a contiguous segment elements[start:end]. A cell is identified by its start index,
+# which only depends on the sizes of the cells before it, not on vertex labels.
+# This makes the refinement result, and the trace it produces, comparable across graphs.
+
+
+class Partition():
+
+    def __init__(self, n, colors=None):
+        """
+        Params:
+            - n: the number of vertices, vertex ids are 0...n-1
+            - colors: optional list of initial colors (any sortable values) indexed by vertex id,
+                      the cells are ordered by color value. If None, the unit partition is made.
+        """
+        self.n = n
+        if colors is None:
+            order = list(range(n))
+        else:
+            order = sorted(range(n), key=lambda v: colors[v])
+
+        # elements[i] is the vertex at position i
+        self.elements = array('i', order)
+        # pos[v] is the position of vertex v in elements
+        self.pos = array('i', [0] * n)
+        # cell[v] is the start index of the cell containing v
+        self.cell = array('i', [0] * n)
+        # cell_end[s] is the end index (exclusive) of the cell starting at s, only valid at cell starts
+        self.cell_end = array('i', [0] * (n + 1))
+        # scratch counters used by refine(), always all zero in between calls
+        self.count = array('i', [0] * n)
+        # a list of (parent_start, fragment_start, fragment_end) for every split, used by undo()
+        self.trail = []
+        self.num_cells = 0
+
+        start = 0
+        for i in range(n):
+            v = order[i]
+            self.pos[v] = i
+            if i > 0 and colors is not None and colors[v] != colors[order[i - 1]]:
+                self.cell_end[start] = i
+                self.num_cells += 1
+                start = i
+            self.cell[v] = start
+        if n > 0:
+            self.cell_end[start] = n
+            self.num_cells += 1
+
+    def cells(self):
+        """
+        Return the start indices of all cells, in order.
+        """
+        starts = []
+        s = 0
+        while s < self.n:
+            starts.append(s)
+            s = self.cell_end[s]
+        return starts
+
+    def cell_size(self, s):
+        return self.cell_end[s] - s
+
+    def cell_vertices(self, s):
+        return self.elements[s:self.cell_end[s]]
+
+    def is_discrete(self):
+        return self.num_cells == self.n
+
+    def colors(self):
+        """
+        Return a list indexed by vertex id, the color of a vertex is the start index of its cell.
+        """
+        return list(self.cell)
+
+    def mark(self):
+        """
+        Return a marker of the current state, so that undo(marker) can restore it.
+        """
+        return len(self.trail)
+
+    def undo(self, marker):
+        """
+        Merge back every split made after mark() returned <marker>, in reverse order.
+        The vertices keep their current positions, only the cell boundaries are restored.
+        """
+        trail = self.trail
+        while len(trail) > marker:
+            parent, start, end = trail.pop()
+            for i in range(start, end):
+                self.cell[self.elements[i]] = parent
+            self.cell_end[parent] = end
+            self.num_cells -= 1
+
+    def split_off(self, s, start):
+        """
+        (Mostly for internal use.)
+        Split the cell starting at s into [s, start) and [start, cell_end[s]).
+        """
+        end = self.cell_end[s]
+        for i in range(start, end):
+            self.cell[self.elements[i]] = start
+        self.cell_end[start] = end
+        self.cell_end[s] = start
+        self.trail.append((s, start, end))
+        self.num_cells += 1
+
+    def individualize(self, v):
+        """
+        Split v off from its cell as a singleton cell, which is placed at the end of the old cell.
+        Return:
+            - the start index of the new singleton cell (equal to the old cell if it was a singleton already)
+        """
+        s = self.cell[v]
+        end = self.cell_end[s]
+        if end - s == 1:
+            return s
+        self.swap(self.pos[v], end - 1)
+        self.split_off(s, end - 1)
+        return end - 1
+
+    def swap(self, i, j):
+        elements = self.elements
+        a = elements[i]
+        b = elements[j]
+        elements[i] = b
+        elements[j] = a
+        self.pos[b] = i
+        self.pos[a] = j
+
+    def copy(self):
+        other = Partition(0)
+        other.n = self.n
+        other.elements = array('i', self.elements)
+        other.pos = array('i', self.pos)
+        other.cell = array('i', self.cell)
+        other.cell_end = array('i', self.cell_end)
+        other.count = array('i', [0] * self.n)
+        other.trail = list(self.trail)
+        other.num_cells = self.num_cells
+        return other
+
+
+# tier 0
+def refine(csr, part, queue=None, trace=None):
+    """
+    Refine <part> to the coarsest equitable partition finer than it, in place.
+    Only the neighbours of the popped cell are visited, counting takes O(deg) per popped cell,
+    and a split costs time proportional to the vertices that are moved out of the old cell.
+    Whenever a cell that is not in the queue is split, all fragments but the largest one are queued,
+    which gives O((n+m) log n) in total.
+    Params:
+        - csr: a CSRGraph
+        - part: a Partition on the vertex ids of csr
+        - queue: a list of cell start indices to refine with, default every cell
+        - trace: optional list, to which one tuple (popped_cell, split_cell, fragment_sizes, fragment_counts)
+                 is appended per split. It is an isomorphism invariant of the refinement process.
+    Return:
+        - part
+    """
+    offsets = csr.offsets
+    nbs = csr.nbs
+    elements = part.elements
+    cell = part.cell
+    cell_end = part.cell_end
+    count = part.count
+
+    if queue is None:
+        queue = part.cells()
+    in_queue = bytearray(part.n + 1)
+    for s in queue:
+        in_queue[s] = 1
+    queue = deque(queue)
+    rounds = 0
+    splits = 0
+
+    while len(queue) > 0:
+        C = queue.popleft()
+        in_queue[C] = 0
+        rounds += 1
+
+        # ===== [1] count the neighbours in C of every vertex adjacent to C =====
+        touched = []
+        for i in range(C, cell_end[C]):
+            v = elements[i]
+            for j in range(offsets[v], offsets[v + 1]):
+                u = nbs[j]
+                if count[u] == 0:
+                    touched.append(u)
+                count[u] += 1
+
+        # ===== [2] group the touched vertices by the cell they are in =====
+        by_cell = {}
+        for u in touched:
+            s = cell[u]
+            if s in by_cell:
+                by_cell[s].append(u)
+            else:
+                by_cell[s] = [u]
+
+        # ===== [3] split every touched cell according to the counts =====
+        # the cells are handled in position order, so the result does not depend on vertex labels
+        for s in sorted(by_cell):
+            group = by_cell[s]
+            end = cell_end[s]
+            size = end - s
+            if len(group) == size:
+                c = count[group[0]]
+                same = True
+                for u in group:
+                    if count[u] != c:
+                        same = False
+                        break
+                if same:
+                    continue
+
+            # move the touched vertices to the end of the cell, sorted by count
+            group.sort(key=lambda u: count[u])
+            tail = end - len(group)
+            for k in range(len(group)):
+                part.swap(part.pos[group[k]], tail + k)
+
+            # fragment boundaries: the untouched part (count 0) first, then one fragment per count value
+            starts = []
+            if tail > s:
+                starts.append(s)
+            for k in range(len(group)):
+                if k == 0 or count[group[k]] != count[group[k - 1]]:
+                    starts.append(tail + k)
+
+            # split off from the end, so that every fragment is cut from the remaining parent cell
+            for k in range(len(starts) - 1, 0, -1):
+                part.split_off(s, starts[k])
+            splits += len(starts) - 1
+
+            sizes = []
+            for k in range(len(starts)):
+                sizes.append(cell_end[starts[k]] - starts[k])
+
+            if trace is not None:
+                counts = []
+                for f in starts:
+                    counts.append(count[elements[f]])
+                trace.append((C, s, tuple(sizes), tuple(counts)))
+
+            # ===== [4] update queue: all new fragments, or all but the largest one =====
+            if in_queue[s]:
+                for f in starts[1:]:
+                    queue.append(f)
+                    in_queue[f] = 1
+            else:
+                largest = 0
+                for k in range(1, len(starts)):
+                    if sizes[k] > sizes[largest]:
+                        largest = k
+                for k in range(len(starts)):
+                    if k != largest:
+                        queue.append(starts[k])
+                        in_queue[starts[k]] = 1
+
+        for u in touched:
+            count[u] = 0
+
+    stats = search_stats.current()
+    if stats is not None:
+        stats.refinement_rounds += rounds
+        stats.refinement_splits += splits
+    return part
@@ -0,0 +1,217 @@
+import numpy as np
+
+import permv2
+
+# An array-backed permutation class with the same interface as permv2.permutation
+# (P*Q applies Q first, -P is the inverse, P**i, P[i], P==Q, P.cycles(), P.istrivial()).
+# The mapping P.P is a NumPy integer array, so composition and inversion are single fancy-indexing operations.
+#
+# It is a subclass of permv2.permutation, so it can be mixed with permv2 objects:
+# Python tries the reflected operator of the subclass first, so both permv2*permnp and permnp*permv2
+# give a permnp permutation. basicpermutationgroup and utilities.order_computing accept it as it is.
+#
+# The results of operations are known to be valid, so they skip the validity check and the copy
+# that a constructor call with mapping=... does.
+
+testvalidity = True
+# Check whether permutations given by mapping=... are bijections on 0...n-1, as in permv2.
+
+
+class permutation(permv2.permutation):
+
+    def __init__(self, n, cycles=None, mapping=None):
+        """
+        Same as permv2.permutation: permutation(n), permutation(n, mapping=[...]) or permutation(n, cycles=[[...], ...]).
+        The mapping may be a list or a NumPy array, it is always copied.
+        """
+        self.n = n
+        if mapping is not None:
+            P = np.array(mapping, dtype=np.intp)
+            if testvalidity:
+                assert len(P) == n
+                assert n == 0 or (P.min() >= 0 and P.max() < n)
+                assert (np.bincount(P, minlength=n) == 1).all()
+            self.P = P
+        elif cycles is not None:
+            P = np.arange(n, dtype=np.intp)
+            for cycle in cycles:
+                cycle = np.asarray(cycle, dtype=np.intp)
+                assert (P[cycle] == cycle).all()
+                P[cycle] = np.roll(cycle, -1)
+            self.P = P
+        else:
+            self.P = np.arange(n, dtype=np.intp)
+
+    @classmethod
+    def from_array(cls, P):
+        """
+        Wrap the NumPy array <P> without validity check or copy, it must not be modified afterwards.
+        """
+        result = cls.__new__(cls)
+        result.n = len(P)
+        result.P = P
+        return result
+
+    def cycles(self):
+        """
+        Returns the cycles of the permutation, as a list of lists of ints.
+        """
+        P = self.P.tolist()
+        C = []
+        incyc = [0] * self.n
+        for i in np.flatnonzero(self.P != np.arange(self.n)).tolist():
+            if not incyc[i]:
+                newcycle = [i]
+                incyc[i] = 1
+                nxt = P[i]
+                while nxt != i:
+                    newcycle.append(nxt)
+                    incyc[nxt] = 1
+                    nxt = P[nxt]
+                C.append(newcycle)
+        return C
+
+    def __getitem__(self, key):
+        return int(self.P[key])
+
+    def __neg__(self):
+        Q = np.empty_like(self.P)
+        Q[self.P] = np.arange(self.n, dtype=np.intp)
+        return permutation.from_array(Q)
+
+    def __mul__(self, other):
+        """
+        Returns self*other, <other> is applied first. <other> may also be a permv2.permutation.
+        """
+        if self.n != other.n:
+            raise ValueError('permutations on different ground sets')
+        return permutation.from_array(self.P[as_array(other)])
+
+    def __rmul__(self, other):
+        """
+        Returns other*self, for a permv2.permutation <other>.
+        """
+        if self.n != other.n:
+            raise ValueError('permutations on different ground sets')
+        return permutation.from_array(as_array(other)[self.P])
+
+    def __pow__(self, i):
+        if i < 0:
+            return (-self) ** (-i)
+        Q = np.arange(self.n, dtype=np.intp)
+        P = self.P
+        while i != 0:
+            if i % 2 == 1:
+                Q = P[Q]
+            i = i // 2
+            if i != 0:
+                P = P[P]
+        return permutation.from_array(Q)
+
+    def istrivial(self):
+        return bool((self.P == np.arange(self.n)).all())
+
+    def __eq__(self, other):
+        if not hasattr(other, 'P'):
+            return False
+        return self.n == other.n and bool((self.P == as_array(other)).all())
+
+    __hash__ = None
+
+
+# tier 1
+def as_array(perm):
+    """
+    Return the mapping of a permv2 or permnp permutation as a NumPy array, without copying if possible.
+    """
+    if isinstance(perm.P, np.ndarray):
+        return perm.P
+    return np.array(perm.P, dtype=np.intp)
+
+
+# tier 0
+def from_permv2(perm):
+    """
+    Convert a permv2.permutation (or any object with .n and .P) into a permnp permutation.
+    """
+    return permutation.from_array(np.array(perm.P, dtype=np.intp))
+
+
+# tier 0
+def to_permv2(perm):
+    """
+    Convert a permnp permutation back into a permv2.permutation.
+    """
+    return permv2.permutation(perm.n, mapping=perm.P.tolist())
+
+
+# tier 0
+def stack(perms):
+    """
+    Return the mappings of a list of permutations as one k x n array, row i is perms[i].
+    """
+    return np.stack([as_array(p) for p in perms])
+
+
+# tier 0
+def unstack(mappings):
+    """
+    Return the rows of a k x n array of mappings as a list of permnp permutations.
+    """
+    return [permutation.from_array(row) for row in mappings]
+
+
+# tier 0
+def multiply_left(P, perms):
+    """
+    Batch version of P*Q: return [P*Q for Q in perms], computed with one fancy-indexing operation.
+    """
+    if len(perms) == 0:
+        return []
+    return unstack(as_array(P)[stack(perms)])
+
+
+# tier 0
+def multiply_right(perms, P):
+    """
+    Batch version of Q*P: return [Q*P for Q in perms], computed with one fancy-indexing operation.
+    """
+    if len(perms) == 0:
+        return []
+    return unstack(stack(perms)[:, as_array(P)])
+
+
+# tier 0
+def conjugate_all(P, perms):
+    """
+    Return [P*Q*P^-1 for Q in perms], i.e. the generators relabeled by P.
+    """
+    if len(perms) == 0:
+        return []
+    p = as_array(P)
+    inv = np.empty_like(p)
+    inv[p] = np.arange(len(p), dtype=np.intp)
+    return unstack(p[stack(perms)[:, inv]])
+
+
+# tier 0
+def inverse_all(perms):
+    """
+    Return [-Q for Q in perms].
+    """
+    if len(perms) == 0:
+        return []
+    mappings = stack(perms)
+    k, n = mappings.shape
+    inv = np.empty_like(mappings)
+    rows = np.repeat(np.arange(k), n).reshape(k, n)
+    inv[rows, mappings] = np.arange(n, dtype=np.intp)
+    return unstack(inv)
+
+
+# tier 0
+def images(perms, el):
+    """
+    Return an array with the image of <el> under every permutation in perms.
+    """
+    return stack(perms)[:, el]
@@ -0,0 +1,250 @@
+from random import Random
+import search_stats
+
+# A permutation group given by a stabilizer chain: a base b_0, ..., b_{k-1}, and for every level i
+# the strong generators S_i that fix b_0, ..., b_{i-1} pointwise, together with the orbit of b_i under <S_i>
+# and a transversal (for every point p in the orbit, an element of <S_i> that maps b_i to p).
+# The chain is built with random Schreier-Sims, and then completed with a deterministic Schreier-Sims check,
+# so the result is always correct; the random phase only makes it fast.
+#
+# The group is given by permutation objects from permv2.py (or any class supporting P[i] and P.n),
+# internally every element is kept as a plain mapping list, so that products are single list comprehensions.
+# Convention, as in permv2: P*Q means apply Q first, then P.
+
+
+class PermutationGroup():
+
+    def __init__(self, generators, n=None, seed=0, sifts_to_stop=20):
+        """
+        Params:
+            - generators: a list of permutations, generating the group
+            - n: the size of the ground set, only needed if generators is empty
+            - seed: seed for the random Schreier-Sims phase
+            - sifts_to_stop: the random phase stops after this many consecutive random elements sift to identity
+        """
+        if n is None:
+            n = generators[0].n
+        self.n = n
+        self.identity = list(range(n))
+        self.generators = []
+        for g in generators:
+            mapping = to_mapping(g)
+            if mapping != self.identity:
+                self.generators.append(mapping)
+
+        self.base = []
+        # strong_generators[i]: a list of mappings fixing base[:i] pointwise
+        self.strong_generators = []
+        # transversals[i]: a dict {point_in_orbit_of_base[i]: mapping_of_base[i]_to_point}
+        self.transversals = []
+
+        if len(self.generators) > 0:
+            self.random_schreier_sims(Random(seed), sifts_to_stop)
+            self.schreier_sims_check(len(self.base) - 1)
+
+    def order(self):
+        """
+        Return the order of the group, the product of the basic orbit lengths.
+        """
+        result = 1
+        for transversal in self.transversals:
+            result *= len(transversal)
+        return result
+
+    def contains(self, perm):
+        """
+        Return True iff the permutation <perm> is an element of the group.
+        """
+        residue, level = self.sift(to_mapping(perm), 0)
+        return level == len(self.base) and residue == self.identity
+
+    def add_generator(self, perm):
+        """
+        Extend the group with the permutation <perm>, keeping the stabilizer chain complete.
+        Return:
+            - True if the group became larger
+        """
+        mapping = to_mapping(perm)
+        residue, level = self.sift(mapping, 0)
+        if level == len(self.base) and residue == self.identity:
+            return False
+        self.generators.append(mapping)
+        level = self.add_strong_generator(residue, level)
+        self.schreier_sims_check(level)
+        return True
+
+    def orbit(self, level=0):
+        """
+        Return the basic orbit of base[level], as a list.
+        """
+        return list(self.transversals[level].keys())
+
+    def sift(self, mapping, level):
+        """
+        (Mostly for internal use.)
+        Sift <mapping> through the stabilizer chain, starting from <level>.
+        Return:
+            - residue: the mapping that is left
+            - level: the first level where sifting failed, or len(base) if every level succeeded
+        """
+        stats = search_stats.current()
+        if stats is not None:
+            stats.sifts += 1
+        for i in range(level, len(self.base)):
+            point = mapping[self.base[i]]
+            if point not in self.transversals[i]:
+                return mapping, i
+            mapping = compose(inverse(self.transversals[i][point]), mapping)
+        return mapping, len(self.base)
+
+    def add_strong_generator(self, residue, level, first_level=0):
+        """
+        (Mostly for internal use.)
+        Add a non-trivial <residue> that fixes base[:level] pointwise as strong generator of levels
+        first_level...level, extending the base if residue fixes the whole base.
+        first_level can be larger than 0 if residue is known to be in <strong_generators[first_level - 1]>.
+        Return:
+            - the deepest level that was changed
+        """
+        if level == len(self.base):
+            # residue fixes every base point, add a point moved by it
+            point = 0
+            while residue[point] == point:
+                point += 1
+            self.base.append(point)
+            self.strong_generators.append([])
+            self.transversals.append({point: self.identity})
+        for i in range(first_level, level + 1):
+            self.strong_generators[i].append(residue)
+            self.extend_transversal(i)
+        return level
+
+    def extend_transversal(self, level):
+        """
+        (Mostly for internal use.)
+        Breadth first search over the orbit of base[level] under strong_generators[level],
+        keeping the transversal elements that are already there.
+        """
+        transversal = self.transversals[level]
+        todo = list(transversal.keys())
+        ind = 0
+        while ind < len(todo):
+            point = todo[ind]
+            for s in self.strong_generators[level]:
+                image = s[point]
+                if image not in transversal:
+                    transversal[image] = compose(s, transversal[point])
+                    todo.append(image)
+            ind += 1
+
+    def random_schreier_sims(self, rng, sifts_to_stop):
+        """
+        (Mostly for internal use.)
+        Sift the generators and then random group elements (product replacement) into the chain,
+        until <sifts_to_stop> consecutive ones sift to the identity.
+        """
+        for g in self.generators:
+            self.sift_in(g)
+
+        # product replacement: a pool of at least 10 elements, plus an accumulator
+        pool = list(self.generators)
+        while len(pool) < 10:
+            pool.extend(self.generators)
+        accumulator = self.identity
+        for _ in range(50):
+            accumulator = random_step(rng, pool, accumulator)
+
+        consecutive = 0
+        while consecutive < sifts_to_stop:
+            accumulator = random_step(rng, pool, accumulator)
+            if self.sift_in(accumulator):
+                consecutive = 0
+            else:
+                consecutive += 1
+
+    def sift_in(self, mapping):
+        """
+        (Mostly for internal use.)
+        Sift <mapping>, and add its residue as strong generator if it is not trivial.
+        Return:
+            - True if the chain was changed
+        """
+        residue, level = self.sift(mapping, 0)
+        if level == len(self.base) and residue == self.identity:
+            return False
+        self.add_strong_generator(residue, level)
+        return True
+
+    def schreier_sims_check(self, start_level):
+        """
+        (Mostly for internal use.)
+        Deterministic verification of the levels start_level, ..., 0 (the deeper ones must be complete already):
+        every Schreier generator of a level must sift to the identity through the levels below it.
+        Whenever one does not, its residue is added as a strong generator,
+        and the check restarts from the deepest level that changed.
+        """
+        i = start_level
+        while i >= 0:
+            complete = True
+            transversal = self.transversals[i]
+            for point in list(transversal.keys()):
+                for s in list(self.strong_generators[i]):
+                    # u_{s(point)}^-1 * s * u_point fixes base[i]
+                    product = compose(s, transversal[point])
+                    if product == transversal[s[point]]:
+                        continue
+                    schreier_generator = compose(inverse(transversal[s[point]]), product)
+                    stats = search_stats.current()
+                    if stats is not None:
+                        stats.schreier_generators += 1
+                    residue, level = self.sift(schreier_generator, i + 1)
+                    if level == len(self.base) and residue == self.identity:
+                        continue
+                    # the Schreier generator is in <strong_generators[i]> already
+                    i = self.add_strong_generator(residue, level, i + 1)
+                    complete = False
+                    break
+                if not complete:
+                    break
+            if complete:
+                i -= 1
+
+
+# tier 1
+def to_mapping(perm):
+    """
+    Return the mapping of a permutation object as a plain list.
+    """
+    return [perm[i] for i in range(perm.n)]
+
+
+# tier 1
+def compose(p, q):
+    """
+    Return the mapping of p*q, i.e. apply q first, then p.
+    """
+    return [p[x] for x in q]
+
+
+# tier 1
+def inverse(p):
+    result = [0] * len(p)
+    for i in range(len(p)):
+        result[p[i]] = i
+    return result
+
+
+# tier 1
+def random_step(rng, pool, accumulator):
+    """
+    One step of the product replacement algorithm, returns the new accumulator.
+    """
+    i = rng.randrange(len(pool))
+    j = rng.randrange(len(pool) - 1)
+    if j >= i:
+        j += 1
+    if rng.random() < 0.5:
+        pool[i] = compose(pool[i], pool[j])
+    else:
+        pool[i] = compose(pool[i], inverse(pool[j]))
+    return compose(accumulator, pool[i])
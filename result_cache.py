@@ -0,0 +1,277 @@
+import hashlib
+import json
+import sqlite3
+import time
+from array import array
+from grl_stream import refinement_fingerprint
+
+# A persistent cache of per-graph results in an SQLite file, so that re-runs over an unchanged corpus
+# skip refinement and search. A graph is identified by a hash of its edge set (graph_key()), so a graph
+# is found again even if it moved to another file or another position in the same file.
+# For every graph the cache can hold:
+#   - fingerprint: the refinement fingerprint used to bucket graphs for GI, see grl_stream.refinement_fingerprint()
+#   - certificate: a digest of its canonical certificate, see canonical_form.py
+#   - num_auto and generators: the automorphism count and a generating set of Aut(G), where every generator
+#     is stored as the points it moves, so the Theta(n) small generators of e.g. a tree take O(n) in total
+# Entries are evicted by age (since they were last used) and by total size, least recently used first.
+# Several processes may share the file: every store is written in a short transaction of its own, and the access
+# times of lookups are only written by commit(), so no transaction is ever held open during refinement or search.
+# The file records the VERSION of the results it holds: entries of another version are dropped on open,
+# since fingerprints or certificates computed differently would not match.
+
+# bump whenever fingerprints, certificates, generators or their encoding change
+VERSION = 6
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS graphs (
+    key TEXT PRIMARY KEY,
+    n INTEGER NOT NULL,
+    m INTEGER NOT NULL,
+    fingerprint TEXT,
+    certificate TEXT,
+    num_auto TEXT,
+    generators BLOB,
+    accessed REAL NOT NULL
+)
+'''
+
+# an estimate of the bytes an entry takes, used for eviction by size
+ENTRY_SIZE = '''(length(key) + ifnull(length(fingerprint), 0) + ifnull(length(certificate), 0)
+                 + ifnull(length(num_auto), 0) + ifnull(length(generators), 0) + 32)'''
+
+
+class ResultCache():
+
+    def __init__(self, filename, max_bytes=None, max_age=None):
+        """
+        Open (or create) the cache in the SQLite file <filename>.
+        Params:
+            - max_bytes: evict least recently used entries until the entries take at most this many bytes
+            - max_age: evict entries that were not used for this many seconds
+        Eviction happens in evict(), which close() calls.
+        """
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        # several worker processes may share the file, wait for each other's (short) writes
+        self.connection = sqlite3.connect(filename, timeout=60)
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != VERSION:
+            self.connection.execute('DROP TABLE IF EXISTS graphs')
+            self.connection.execute('PRAGMA user_version = {}'.format(VERSION))
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+        # {key: time of the last lookup} of the entries used since the last commit()
+        self.accessed = {}
+
+    def lookup(self, key, field):
+        """
+        (Mostly for internal use.)
+        Return the value of <field> for the graph with <key>, or None if it is not cached.
+        The access time of the entry is written by the next commit().
+        """
+        row = self.connection.execute('SELECT {} FROM graphs WHERE key = ?'.format(field), (key,)).fetchone()
+        if row is None or row[0] is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.accessed[key] = time.time()
+        return row[0]
+
+    def store(self, key, n, m, values):
+        """
+        (Mostly for internal use.)
+        Set the fields of the graph with <key> to values, {field: value}, creating the entry if needed,
+        and commit right away.
+        """
+        now = time.time()
+        fields = list(values)
+        with self.connection:
+            self.connection.execute('INSERT OR IGNORE INTO graphs (key, n, m, accessed) VALUES (?, ?, ?, ?)',
+                                    (key, n, m, now))
+            self.connection.execute('UPDATE graphs SET {}, accessed = ? WHERE key = ?'.format(
+                                    ', '.join('{} = ?'.format(field) for field in fields)),
+                                    [values[field] for field in fields] + [now, key])
+        self.accessed.pop(key, None)
+
+    def key(self, csr):
+        """
+        Return the key of the graph given by a CSRGraph, see graph_key().
+        """
+        return graph_key(csr)
+
+    def fingerprint_of(self, csr, key=None):
+        """
+        Return (graph_key(csr), the refinement fingerprint of csr), computing and storing the fingerprint
+        if it is not cached yet. The fingerprint is returned as a string, so that cached and computed
+        fingerprints compare equal.
+        Params:
+            - key: graph_key(csr), if it is known already
+        """
+        if key is None:
+            key = graph_key(csr)
+        fingerprint = self.lookup(key, 'fingerprint')
+        if fingerprint is None:
+            fingerprint = json.dumps(refinement_fingerprint(csr))
+            self.store(key, csr.n, csr.m, {'fingerprint': fingerprint})
+        return key, fingerprint
+
+    def certificate(self, key):
+        """
+        Return the certificate digest of the graph with <key>, or None.
+        """
+        return self.lookup(key, 'certificate')
+
+    def store_certificate(self, key, n, m, certificate):
+        """
+        Store the digest of the canonical <certificate> of a graph, and return the digest.
+        """
+        digest = certificate_digest(certificate)
+        self.store(key, n, m, {'certificate': digest})
+        return digest
+
+    def automorphisms(self, key):
+        """
+        Return (num_auto, generators) of the graph with <key>, or None.
+        The generators are lists of (label, image) pairs of their moved points,
+        see final_AUT.AUT_generators_readcsr().
+        """
+        num_auto = self.lookup(key, 'num_auto')
+        if num_auto is None:
+            return None
+        row = self.connection.execute('SELECT generators FROM graphs WHERE key = ?', (key,)).fetchone()
+        return decode_count(num_auto), unpack_generators(row[0])
+
+    def store_automorphisms(self, key, n, m, num_auto, generators):
+        """
+        Store the automorphism count and a generating set (lists of (label, image) pairs) of a graph.
+        """
+        self.store(key, n, m, {'num_auto': encode_count(num_auto), 'generators': pack_generators(generators)})
+
+    def evict(self):
+        """
+        Delete the entries that are too old, then the least recently used ones until the size fits.
+        Return:
+            - the number of deleted entries
+        """
+        deleted = 0
+        if self.max_age is not None:
+            cursor = self.connection.execute('DELETE FROM graphs WHERE accessed < ?', (time.time() - self.max_age,))
+            deleted += cursor.rowcount
+        if self.max_bytes is not None:
+            total = self.connection.execute('SELECT ifnull(sum({}), 0) FROM graphs'.format(ENTRY_SIZE)).fetchone()[0]
+            if total > self.max_bytes:
+                rows = self.connection.execute('SELECT key, {} FROM graphs ORDER BY accessed'.format(ENTRY_SIZE))
+                to_delete = []
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    to_delete.append((key,))
+                    total -= size
+                self.connection.executemany('DELETE FROM graphs WHERE key = ?', to_delete)
+                deleted += len(to_delete)
+        self.connection.commit()
+        return deleted
+
+    def __len__(self):
+        return self.connection.execute('SELECT count(*) FROM graphs').fetchone()[0]
+
+    def commit(self):
+        """
+        Write the access times of the entries looked up since the last commit, in one short transaction.
+        """
+        if len(self.accessed) > 0:
+            with self.connection:
+                self.connection.executemany('UPDATE graphs SET accessed = ? WHERE key = ?',
+                                            [(accessed, key) for key, accessed in self.accessed.items()])
+            self.accessed = {}
+        self.connection.commit()
+
+    def close(self):
+        self.commit()
+        self.evict()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# tier 0
+def graph_key(csr):
+    """
+    Return a hex digest of the edge set of the graph given by a CSRGraph (with vertex ids as labels).
+    Two graphs get the same key iff they have the same number of vertices and the same labeled edges.
+    """
+    edges = array('q')
+    n = csr.n
+    for v in range(n):
+        for j in range(csr.offsets[v], csr.offsets[v + 1]):
+            u = csr.nbs[j]
+            if v <= u:
+                edges.append(v * n + u)
+    edges = array('q', sorted(edges))
+    h = hashlib.sha256()
+    h.update(str(n).encode())
+    h.update(edges.tobytes())
+    return h.hexdigest()
+
+
+# tier 0
+def certificate_digest(certificate):
+    """
+    Return a hex digest of a canonical certificate, which is equal for two graphs iff they are isomorphic
+    (up to the negligible chance of a SHA-256 collision).
+    """
+    return hashlib.sha256(repr(certificate).encode()).hexdigest()
+
+
+# tier 1
+def encode_count(num):
+    """
+    Return the non-negative int <num> as a hex string. Unlike str(), this works for any number of digits
+    (Python refuses to convert ints of more than 4300 decimal digits, e.g. |Aut| of a large star).
+    """
+    return format(num, 'x')
+
+
+# tier 1
+def decode_count(text):
+    """
+    Return the int of a string from encode_count().
+    """
+    return int(text, 16)
+
+
+# tier 1
+def pack_generators(generators):
+    """
+    Pack a list of generators, lists of (point, image) pairs, into int32 bytes:
+    per generator the number of pairs, followed by the pairs.
+    """
+    packed = array('i')
+    for pairs in generators:
+        packed.append(len(pairs))
+        for point, image in pairs:
+            packed.append(point)
+            packed.append(image)
+    return packed.tobytes()
+
+
+# tier 1
+def unpack_generators(packed):
+    """
+    Unpack the bytes of pack_generators() into a list of lists of (point, image) pairs.
+    """
+    values = array('i')
+    values.frombytes(packed)
+    generators = []
+    i = 0
+    while i < len(values):
+        k = values[i]
+        generators.append(list(zip(values[i + 1:i + 1 + 2 * k:2], values[i + 2:i + 2 + 2 * k:2])))
+        i += 1 + 2 * k
+    return generators
@@ -0,0 +1,136 @@
+# Optional counters for the hot paths of refinement, search and the permutation group algorithms,
+# to see where the time of an instance goes.
+#
+# Counting is off unless a SearchStats is active: every hot path only checks `search_stats.current() is not None`,
+# and the inner loops count in local variables that are added once at the end. With collecting():
+#
+#     with collecting() as stats:
+#         AUT_single_readcsr(csr, False)
+#     print(stats)
+#
+# The active SearchStats is per thread, so runs in a thread pool count separately. A worker process has its own,
+# so work done in other processes is counted with counted(): the function runs with a fresh SearchStats in the
+# worker, which is sent back with the result.
+
+import threading
+
+FIELDS = [
+    'refinement_rounds',    # passes of color_refinement(), popped cells of refine_info() / partition_refinement
+    'refinement_splits',    # new color classes / cells created by refinement
+    'nodes',                # nodes of the search trees, leaves included
+    'leaves',               # nodes where the coloring is a bijection (or the partition is discrete)
+    'dead_ends',            # nodes where the coloring is unbalanced
+    'pruned',               # branches skipped, by orbits, by node invariants or after an early stop
+    'generators',           # automorphisms added to a generating set
+    'schreier_generators',  # non-trivial Schreier generators built
+    'reduce_iterations',    # iterations of basicpermutationgroup.Reduce()
+    'sifts',                # sifts through a stabilizer chain, see permutation_group.py
+]
+
+
+class SearchStats():
+
+    def __init__(self):
+        for field in FIELDS:
+            setattr(self, field, 0)
+        # {graph index: SearchStats} for the work done on single graphs of a .grl file, see final_AUT.AUT()
+        self.per_graph = {}
+
+    def add(self, other):
+        """
+        Add the counters (not per_graph) of <other> to this one.
+        """
+        for field in FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        return self
+
+    def add_graph(self, index, other):
+        """
+        Add <other> to this one, and record it as (part of) the work on graph <index>.
+        """
+        self.add(other)
+        if index not in self.per_graph:
+            self.per_graph[index] = SearchStats()
+        self.per_graph[index].add(other)
+
+    def as_dict(self):
+        """
+        Return the counters as a dict, with per_graph as {graph index: dict}, e.g. for json.dump().
+        """
+        d = {}
+        for field in FIELDS:
+            d[field] = getattr(self, field)
+        if len(self.per_graph) > 0:
+            d['per_graph'] = {}
+            for index in sorted(self.per_graph):
+                d['per_graph'][index] = self.per_graph[index].as_dict()
+        return d
+
+    def __repr__(self):
+        return 'SearchStats({})'.format(', '.join('{}={}'.format(field, getattr(self, field)) for field in FIELDS))
+
+
+# state.active: the SearchStats that is counted into in this thread, None if counting is off
+state = threading.local()
+
+
+# tier 0
+def current():
+    """
+    Return the active SearchStats of this thread, or None if counting is off.
+    """
+    return getattr(state, 'active', None)
+
+
+class collecting():
+
+    def __init__(self, stats=None):
+        """
+        A context manager that makes <stats> (default a new SearchStats) the active one,
+        and restores the previously active one on exit. The counts are not added to the previous one.
+        """
+        self.stats = SearchStats() if stats is None else stats
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = current()
+        state.active = self.stats
+        return self.stats
+
+    def __exit__(self, *args):
+        state.active = self.previous
+
+
+# tier 0: can run in a worker process
+def counted(function, *args):
+    """
+    Return:
+        - (function(*args), the SearchStats of the call)
+    """
+    with collecting() as stats:
+        result = function(*args)
+    return result, stats
+
+
+# tier 0
+def submit(executor, function, *args):
+    """
+    executor.submit(function, *args), but if counting is on, the function is run with counted().
+    The future must be read with result().
+    """
+    if current() is None:
+        return executor.submit(function, *args)
+    return executor.submit(counted, function, *args)
+
+
+# tier 0
+def result(future):
+    """
+    Return the result of a future from submit(), and add the stats of the worker to the active SearchStats.
+    """
+    stats = current()
+    if stats is None:
+        return future.result()
+    value, worker_stats = future.result()
+    stats.add(worker_stats)
+    return value
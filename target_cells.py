@@ -0,0 +1,100 @@
+# Target cell selection for the individualization search of utilities.get_generating_set() and count_isomorphism().
+#
+# At every node of the search tree that is balanced but not a bijection, one color class (cell) with at least
+# 4 vertices (2 per graph) is chosen, and a vertex x of the first graph is mapped to every vertex of the cell in
+# the second graph in turn. Any such cell gives the right answer, but the size of the tree depends a lot on it.
+#
+# A strategy is a function
+#     strategy(st_info, candidates, matrix, reference) -> the color (key of st_info) of the target cell
+# where candidates are the colors of all cells with at least 4 vertices, in the order of st_info.
+# matrix and reference are the ones of the search (matrix is None when searching on Vertex objects).
+# The built-in strategies are in STRATEGIES, by name:
+#   - first:    the first candidate, what the search always did
+#   - smallest: the smallest cell, the fewest branches at this node
+#   - largest:  the largest cell, individualizing in it tends to split the most
+#   - joined:   the cell that is non-trivially joined to the most other cells, i.e. whose vertices have some
+#               but not all of their possible neighbours in those cells (as the nauty/Traces heuristic)
+# Ties go to the first candidate. The choice must only depend on the coloring, never on the vertex ids, so that it
+# is the same for G and its copy, and for the workers of the parallel search.
+
+
+# tier 2
+def first_cell(st_info, candidates, matrix, reference):
+    return candidates[0]
+
+
+# tier 2
+def smallest_cell(st_info, candidates, matrix, reference):
+    return min(candidates, key=lambda color: len(st_info[color]))
+
+
+# tier 2
+def largest_cell(st_info, candidates, matrix, reference):
+    return max(candidates, key=lambda color: len(st_info[color]))
+
+
+# tier 2
+def most_joined_cell(st_info, candidates, matrix, reference):
+    best = candidates[0]
+    best_joins = -1
+    for color in candidates:
+        joins = count_joins(st_info, st_info[color][0], matrix, reference)
+        if joins > best_joins:
+            best = color
+            best_joins = joins
+    return best
+
+
+STRATEGIES = {
+    'first': first_cell,
+    'smallest': smallest_cell,
+    'largest': largest_cell,
+    'joined': most_joined_cell,
+}
+
+
+# tier 1
+def select_target(st_info, strategy=None, matrix=None, reference=None):
+    """
+    Params:
+        - st_info: a balanced stable info that is not a bijection, see utilities.check_balanced_bijection()
+        - strategy: the name of a strategy in STRATEGIES, a strategy function, or None for 'first'
+    Return:
+        - the color of the target cell
+    """
+    candidates = [color for color in st_info if len(st_info[color]) >= 4]
+    if strategy is None:
+        return candidates[0]
+    if isinstance(strategy, str):
+        strategy = STRATEGIES[strategy]
+    return strategy(st_info, candidates, matrix, reference)
+
+
+# tier 3
+def count_joins(st_info, v, matrix, reference):
+    """
+    Return the number of cells with at least 4 vertices that v has some but not all of its possible neighbours in.
+    In a stable coloring every vertex of a cell has the same number of neighbours in every cell,
+    so this is the same for all the vertices of the cell of v.
+    """
+    if matrix is not None:
+        neighbours = [reference[key] for key in matrix.neighbours(v.idx)]
+    else:
+        neighbours = v.neighbours
+    # {color: number of neighbours of that color}
+    counts = {}
+    for nb in neighbours:
+        if nb.colornum in counts:
+            counts[nb.colornum] += 1
+        else:
+            counts[nb.colornum] = 1
+
+    joins = 0
+    for color in counts:
+        # the cells hold the vertices of both graphs, half of them in the graph of v
+        size = len(st_info[color]) // 2
+        if color == v.colornum:
+            size -= 1
+        if len(st_info[color]) >= 4 and counts[color] < size:
+            joins += 1
+    return joins
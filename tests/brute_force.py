@@ -0,0 +1,60 @@
+import random
+from itertools import permutations
+
+# Reference answers by exhaustive search, for the small graphs of the tests.
+
+
+def random_edges(n, p, seed):
+    """
+    Return the edge list of a G(n, p) random graph on the vertex ids 0...n-1.
+    """
+    rng = random.Random(seed)
+    return [(u, v) for u in range(n) for v in range(u + 1, n) if rng.random() < p]
+
+
+def num_automorphisms(n, edges):
+    """
+    Return |Aut| of the graph by trying all n! permutations.
+    """
+    edge_set = set(frozenset(e) for e in edges)
+    count = 0
+    for perm in permutations(range(n)):
+        if all(frozenset((perm[u], perm[v])) in edge_set for u, v in edges):
+            count += 1
+    return count
+
+
+def is_isomorphic(n, edges, other_n, other_edges):
+    """
+    Return True iff the two graphs are isomorphic, by trying all n! bijections.
+    """
+    if n != other_n or len(edges) != len(other_edges):
+        return False
+    other_set = set(frozenset(e) for e in other_edges)
+    for perm in permutations(range(n)):
+        if all(frozenset((perm[u], perm[v])) in other_set for u, v in edges):
+            return True
+    return False
+
+
+def stable_partition(n, edges):
+    """
+    Return the coarsest equitable partition of the unit partition by naive color refinement,
+    as a set of frozensets of vertex ids.
+    """
+    nbs = [[] for _ in range(n)]
+    for u, v in edges:
+        nbs[u].append(v)
+        nbs[v].append(u)
+    colors = [0] * n
+    while True:
+        signatures = [(colors[v], tuple(sorted(colors[u] for u in nbs[v]))) for v in range(n)]
+        ranks = {s: i for i, s in enumerate(sorted(set(signatures)))}
+        new = [ranks[s] for s in signatures]
+        if len(set(new)) == len(set(colors)):
+            break
+        colors = new
+    cells = {}
+    for v in range(n):
+        cells.setdefault(colors[v], set()).add(v)
+    return set(frozenset(cell) for cell in cells.values())
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the modules of the repository are flat top-level modules, they are imported from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.setrecursionlimit(100000)
@@ -0,0 +1,63 @@
+from brute_force import random_edges, is_isomorphic
+from canonical_form import canonical_order, csr_certificate
+from final_AUT import GI
+from graph_families import GeneratedGraph, cycle, complete, petersen, random_tree, cartesian_product, path, \
+    disjoint_union, complement_graph, relabel, to_csr, write_grl
+from grb_format import convert_to_grb, close_graph_files
+
+
+def edge_set(csr):
+    return set(frozenset((v, u)) for v in range(csr.n) for u in csr.neighbours(v))
+
+
+def samples():
+    graphs = [petersen(), random_tree(25, 3), complement_graph(cycle(9)), disjoint_union([cycle(4), path(3)]),
+              cartesian_product(cycle(3), cycle(5)), complete(6)]
+    for seed in range(8):
+        graphs.append(GeneratedGraph('G{}'.format(seed), 9, random_edges(9, 0.4, seed), None, None, False))
+    return graphs
+
+
+def test_relabelled_copies_get_equal_certificates():
+    for g in samples():
+        certificate, order = canonical_order(to_csr(g))
+        for seed in range(3):
+            h = relabel(g, seed)
+            other, other_order = canonical_order(to_csr(h))
+            assert other == certificate
+            # order[i] -> other_order[i] is an isomorphism
+            mapping = {order[i]: other_order[i] for i in range(g.n)}
+            assert set(frozenset((mapping[u], mapping[v])) for u, v in g.edges) == edge_set(to_csr(h))
+
+
+def test_equal_degrees_different_certificates():
+    assert csr_certificate(to_csr(cycle(6))) != csr_certificate(to_csr(disjoint_union([cycle(3), cycle(3)])))
+    prism = cartesian_product(path(2), cycle(3))
+    k33 = GeneratedGraph('K3,3', 6, [(u, v) for u in range(3) for v in range(3, 6)], 72)
+    assert csr_certificate(to_csr(prism)) != csr_certificate(to_csr(k33))
+
+
+def test_certificates_match_brute_force():
+    graphs = [random_edges(6, 0.5, seed) for seed in range(12)]
+    certificates = [csr_certificate(to_csr(GeneratedGraph('G', 6, edges, None))) for edges in graphs]
+    for i in range(len(graphs)):
+        for j in range(i + 1, len(graphs)):
+            assert (certificates[i] == certificates[j]) == is_isomorphic(6, graphs[i], 6, graphs[j])
+
+
+def test_GI_classes_of_relabelled_copies(tmp_path):
+    originals = samples()
+    graphs = []
+    expected = {}
+    for k in range(len(originals)):
+        for seed in range(k % 3 + 1):
+            expected.setdefault(k, []).append(len(graphs))
+            graphs.append(relabel(originals[k], 10 * k + seed))
+    filename = str(tmp_path / 'copies.grl')
+    write_grl(filename, graphs)
+    classes = sorted(expected.values())
+
+    assert GI(filename) == classes
+    convert_to_grb(filename, str(tmp_path / 'copies.grb'))
+    assert GI(str(tmp_path / 'copies.grb')) == classes
+    close_graph_files()
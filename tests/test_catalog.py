@@ -0,0 +1,96 @@
+import sqlite3
+from catalog import IsoCatalog
+from canonical_form import csr_certificate
+from final_AUT import GI
+from graph_families import path, cycle, star, petersen, random_tree, cartesian_product, disjoint_union, relabel, \
+    to_csr, write_grl
+from grb_format import convert_to_grb, close_graph_files
+
+
+def test_insert_and_query_round_trip(tmp_path):
+    filename = str(tmp_path / 'catalog.sqlite')
+    graphs = [petersen(), cycle(10), random_tree(30, 1), cartesian_product(cycle(3), cycle(4))]
+    with IsoCatalog(filename) as catalog:
+        ids = []
+        for g in graphs:
+            class_id, new = catalog.insert(to_csr(g), g.name)
+            assert new
+            ids.append(class_id)
+        class_id, new = catalog.insert(to_csr(relabel(petersen(), 4)))
+        assert (class_id, new) == (ids[0], False)
+        assert catalog.query(to_csr(path(10))) is None
+        assert catalog.connection.in_transaction is False
+
+    with IsoCatalog(filename) as catalog:
+        assert len(catalog) == len(graphs)
+        for g, class_id in zip(graphs, ids):
+            assert catalog.query(to_csr(relabel(g, 9))) == class_id
+            info = catalog.class_info(class_id)
+            assert (info['n'], info['m'], info['num_auto'], info['source']) == (g.n, g.m, g.num_auto, g.name)
+            assert csr_certificate(catalog.representative(class_id)) == csr_certificate(to_csr(g))
+        assert catalog.class_info(ids[0])['size'] == 2
+
+
+def test_files_give_the_GI_classes(tmp_path):
+    originals = [petersen(), star(5), disjoint_union([cycle(4), cycle(4)]), cycle(8), random_tree(12, 3)]
+    graphs = [relabel(originals[k % len(originals)], k) for k in range(12)]
+    grl = str(tmp_path / 'graphs.grl')
+    grb = str(tmp_path / 'graphs.grb')
+    write_grl(grl, graphs)
+    convert_to_grb(grl, grb)
+
+    with IsoCatalog(str(tmp_path / 'catalog.sqlite')) as catalog:
+        class_ids, new_classes = catalog.insert_file(grl)
+        assert new_classes == len(originals)
+        classes = {}
+        for i, class_id in enumerate(class_ids):
+            classes.setdefault(class_id, []).append(i)
+        assert sorted(classes.values()) == GI(grl)
+        assert catalog.query_file(grb) == class_ids
+        assert catalog.insert_file(grb) == (class_ids, 0)
+        assert sum(catalog.class_info(class_id)['size'] for class_id in classes) == 2 * len(graphs)
+    close_graph_files()
+
+
+def test_class_added_meanwhile_is_found_in_the_transaction(tmp_path):
+    with IsoCatalog(str(tmp_path / 'catalog.sqlite')) as catalog:
+        class_id, _ = catalog.insert(to_csr(cycle(6)))
+        # the class has no certificate yet, since nothing else shared its fingerprints
+        assert catalog.connection.execute('SELECT certificate FROM classes').fetchone()[0] is None
+
+        # pretend that find() ran before the class was added by another process
+        find = catalog.find
+
+        def stale_find(csr, invariants=None):
+            _, levels = find(csr, invariants)
+            levels.pop('certificate', None)
+            return None, levels
+        catalog.find = stale_find
+
+        assert catalog.insert(to_csr(relabel(cycle(6), 2))) == (class_id, False)
+        # the certificate was computed outside the transaction, which was then repeated
+        assert catalog.connection.execute('SELECT certificate FROM classes').fetchone()[0] is not None
+        assert catalog.class_info(class_id)['size'] == 2
+        assert catalog.insert(to_csr(path(6)))[1]
+        assert catalog.connection.in_transaction is False
+
+
+def test_without_num_auto_and_old_versions(tmp_path):
+    filename = str(tmp_path / 'catalog.sqlite')
+    with IsoCatalog(filename, num_auto=False) as catalog:
+        class_id, _ = catalog.insert(to_csr(star(4)))
+        assert catalog.class_info(class_id)['num_auto'] is None
+        other, _ = catalog.insert(to_csr(petersen()))
+
+    # a file of version 1 stored |Aut| in decimal
+    connection = sqlite3.connect(filename)
+    connection.execute('UPDATE classes SET num_auto = ?, level0 = ?, certificate = ? WHERE id = ?',
+                       ('120', 'stale', 'stale', other))
+    connection.execute('PRAGMA user_version = 1')
+    connection.commit()
+    connection.close()
+
+    with IsoCatalog(filename) as catalog:
+        assert catalog.class_info(other)['num_auto'] == 120
+        assert catalog.query(to_csr(relabel(petersen(), 1))) == other
+        assert catalog.class_info(class_id)['num_auto'] is None
@@ -0,0 +1,59 @@
+from brute_force import random_edges, num_automorphisms
+from csr_graph import connected_components, induced_subgraph
+from final_AUT import GI, AUT_generators_readcsr
+from graph_families import GeneratedGraph, cycle, path, petersen, complete, cartesian_product, disjoint_union, \
+    relabel, to_csr, write_grl
+from permutation_group import PermutationGroup
+from permv2 import permutation
+
+
+def check_generators(g, num_auto, generators):
+    edges = set(frozenset(e) for e in g.edges)
+    perms = []
+    for moved in generators:
+        mapping = list(range(g.n))
+        for point, image in moved:
+            mapping[point] = image
+        assert set(frozenset((mapping[u], mapping[v])) for u, v in g.edges) == edges
+        perms.append(permutation(g.n, mapping=mapping))
+    assert PermutationGroup(perms, g.n).order() == num_auto
+
+
+def test_components_and_induced_subgraphs():
+    csr = to_csr(disjoint_union([cycle(4), path(3), path(1)]))
+    components = connected_components(csr)
+    assert sorted(sorted(c) for c in components) == [[0, 1, 2, 3], [4, 5, 6], [7]]
+    sub = induced_subgraph(csr, components[1])
+    assert sub.n == 3 and sub.m == 2
+
+
+def test_AUT_of_unions_with_known_counts():
+    unions = [disjoint_union([petersen(), petersen(), cycle(5)]),
+              disjoint_union([cartesian_product(cycle(3), cycle(4)), cycle(12), cartesian_product(cycle(4), cycle(3))]),
+              disjoint_union([complete(4), cycle(3), cycle(3), cycle(3), path(1), path(1)])]
+    for g in unions:
+        g = relabel(g, 7)
+        num_auto, generators = AUT_generators_readcsr(to_csr(g), False)
+        assert num_auto == g.num_auto
+        check_generators(g, num_auto, generators)
+
+
+def test_AUT_of_random_disconnected_graphs_matches_brute_force():
+    for seed in range(12):
+        k = 2 + seed % 2
+        part = random_edges(k, 0.7, seed)
+        # two copies of a random part, and a path
+        edges = part + [(u + k, v + k) for u, v in part] + [(2 * k, 2 * k + 1)]
+        g = GeneratedGraph('G', 2 * k + 2, edges, None, None, False)
+        num_auto, generators = AUT_generators_readcsr(to_csr(g), False)
+        assert num_auto == num_automorphisms(g.n, edges)
+        check_generators(g, num_auto, generators)
+
+
+def test_GI_of_disconnected_graphs(tmp_path):
+    union = disjoint_union([petersen(), cycle(6), path(4)])
+    graphs = [union, cycle(12), relabel(union, 1), disjoint_union([cycle(6), cycle(6)]),
+              disjoint_union([cycle(3), cycle(3), cycle(3), cycle(3)]), relabel(union, 2)]
+    filename = str(tmp_path / 'unions.grl')
+    write_grl(filename, graphs)
+    assert GI(filename) == [[0, 2, 5], [1], [3], [4]]
@@ -0,0 +1,51 @@
+from math import factorial
+from brute_force import random_edges, num_automorphisms
+from canonical_form import csr_certificate
+from csr_graph import complement, sparse_side, is_dense, is_simple
+from final_AUT import GI, AUT_single_readcsr
+from graph_families import GeneratedGraph, complete, cycle, petersen, complement_graph, relabel, to_csr, write_grl
+
+
+def edge_set(csr):
+    return set(frozenset((v, u)) for v in range(csr.n) for u in csr.neighbours(v))
+
+
+def test_complement_edges():
+    for seed in range(10):
+        n = 5 + seed
+        g = GeneratedGraph('G', n, random_edges(n, 0.5, seed), None)
+        csr = to_csr(g)
+        co = complement(csr)
+        assert edge_set(co) == edge_set(to_csr(complement_graph(g)))
+        assert co.m == n * (n - 1) // 2 - csr.m
+        assert edge_set(complement(co)) == edge_set(csr)
+        assert list(co.labels) == list(csr.labels) and list(co.graph_idx) == list(csr.graph_idx)
+
+
+def test_sparse_side():
+    sparse, complemented = sparse_side(to_csr(complete(7)))
+    assert complemented and sparse.m == 0
+    csr = to_csr(cycle(7))
+    assert sparse_side(csr) == (csr, False)
+    assert is_dense(to_csr(complement_graph(petersen())))
+    assert not is_simple(to_csr(GeneratedGraph('loop', 2, [(0, 1), (0, 0)], None)))
+
+
+def test_AUT_of_dense_graphs():
+    assert AUT_single_readcsr(to_csr(complete(9)), False) == factorial(9)
+    assert AUT_single_readcsr(to_csr(complement_graph(petersen())), False) == 120
+    for seed in range(15):
+        n = 6 + seed % 3
+        edges = random_edges(n, 0.75, seed)
+        assert AUT_single_readcsr(to_csr(GeneratedGraph('G', n, edges, None)), False) == num_automorphisms(n, edges)
+
+
+def test_dense_certificates_and_GI(tmp_path):
+    dense = complement_graph(cycle(9))
+    other = complement_graph(GeneratedGraph('C4+C5', 9, [(i, (i + 1) % 4) for i in range(4)] +
+                                            [(4 + i, 4 + (i + 1) % 5) for i in range(5)], None))
+    assert csr_certificate(to_csr(dense)) == csr_certificate(to_csr(relabel(dense, 3)))
+    assert csr_certificate(to_csr(dense)) != csr_certificate(to_csr(other))
+    filename = str(tmp_path / 'dense.grl')
+    write_grl(filename, [dense, other, relabel(dense, 1), relabel(other, 2), complete(9)])
+    assert GI(filename) == [[0, 2], [1, 3], [4]]
@@ -0,0 +1,75 @@
+from brute_force import random_edges, stable_partition
+from graph_families import GeneratedGraph, path, cycle, petersen, random_tree, relabel, to_csr
+from partition_refinement import Partition, refine
+
+
+def cells_of(part):
+    return set(frozenset(part.cell_vertices(s)) for s in part.cells())
+
+
+def is_equitable(csr, part):
+    cell_of = part.colors()
+    for s in part.cells():
+        counts = set()
+        for v in part.cell_vertices(s):
+            row = {}
+            for u in csr.neighbours(v):
+                row[cell_of[u]] = row.get(cell_of[u], 0) + 1
+            counts.add(tuple(sorted(row.items())))
+        if len(counts) > 1:
+            return False
+    return True
+
+
+def test_path_cells_by_distance_to_the_ends():
+    csr = to_csr(path(5))
+    part = refine(csr, Partition(csr.n))
+    assert cells_of(part) == {frozenset({0, 4}), frozenset({1, 3}), frozenset({2})}
+
+
+def test_vertex_transitive_graph_stays_one_cell():
+    for g in [cycle(7), petersen()]:
+        csr = to_csr(g)
+        part = refine(csr, Partition(csr.n))
+        assert part.num_cells == 1
+
+
+def test_coarsest_equitable_partition_of_random_graphs():
+    for seed in range(30):
+        n = 6 + seed % 7
+        edges = random_edges(n, 0.3, seed)
+        csr = to_csr(GeneratedGraph('G', n, edges, None))
+        part = refine(csr, Partition(csr.n))
+        assert is_equitable(csr, part)
+        assert cells_of(part) == stable_partition(n, edges)
+
+
+def test_initial_colors_are_respected():
+    csr = to_csr(cycle(6))
+    part = refine(csr, Partition(csr.n, [1, 0, 0, 0, 0, 0]))
+    assert cells_of(part) == {frozenset({0}), frozenset({1, 5}), frozenset({2, 4}), frozenset({3})}
+
+
+def test_undo_restores_the_cells():
+    csr = to_csr(random_tree(30, 4))
+    part = refine(csr, Partition(csr.n))
+    before = cells_of(part)
+    marker = part.mark()
+    s = part.cells()[0]
+    v = part.cell_vertices(s)[0]
+    refine(csr, part, [part.individualize(v)])
+    assert part.num_cells > len(before) or part.cell_end[s] - s == 1
+    part.undo(marker)
+    assert cells_of(part) == before
+    assert part.num_cells == len(before)
+
+
+def test_trace_does_not_depend_on_labels():
+    g = random_tree(40, 2)
+    traces = []
+    for h in [g, relabel(g, 1), relabel(g, 2)]:
+        csr = to_csr(h)
+        trace = []
+        part = refine(csr, Partition(csr.n), trace=trace)
+        traces.append((trace, [part.cell_size(s) for s in part.cells()]))
+    assert traces[0] == traces[1] == traces[2]
@@ -0,0 +1,67 @@
+from math import factorial
+from brute_force import random_edges, num_automorphisms
+from final_AUT import AUT, AUT_single_readcsr, AUT_generators_readcsr
+from graph_families import GeneratedGraph, cycle, complete, path, star, petersen, hypercube, to_csr, write_grl
+from permutation_group import PermutationGroup
+from permv2 import permutation
+
+
+def as_mapping(n, moved):
+    mapping = list(range(n))
+    for point, image in moved:
+        mapping[point] = image
+    return mapping
+
+
+def test_order_of_known_groups():
+    n = 7
+    transposition = permutation(n, cycles=[[0, 1]])
+    rotation = permutation(n, cycles=[list(range(n))])
+    reflection = permutation(n, mapping=[(-i) % n for i in range(n)])
+    assert PermutationGroup([transposition, rotation]).order() == factorial(n)
+    assert PermutationGroup([rotation, reflection]).order() == 2 * n
+    assert PermutationGroup([rotation]).order() == n
+    assert PermutationGroup([], n).order() == 1
+
+
+def test_membership():
+    n = 6
+    group = PermutationGroup([permutation(n, cycles=[list(range(n))])])
+    assert group.contains(permutation(n, cycles=[[0, 2, 4], [1, 3, 5]]))
+    assert not group.contains(permutation(n, cycles=[[0, 1]]))
+
+
+def test_AUT_matches_brute_force():
+    for seed in range(40):
+        n = 4 + seed % 5
+        edges = random_edges(n, 0.2 + 0.1 * (seed % 6), seed)
+        g = GeneratedGraph('G', n, edges, None)
+        assert AUT_single_readcsr(to_csr(g), False) == num_automorphisms(n, edges)
+
+
+def test_generators_generate_the_automorphism_group():
+    for g in [petersen(), hypercube(3), cycle(8), complete(5), star(6),
+              GeneratedGraph('G', 8, random_edges(8, 0.5, 3), None)]:
+        csr = to_csr(g)
+        num_auto, generators = AUT_generators_readcsr(csr, False)
+        edges = set(frozenset(e) for e in g.edges)
+        perms = []
+        for moved in generators:
+            mapping = as_mapping(g.n, moved)
+            assert set(frozenset((mapping[u], mapping[v])) for u, v in g.edges) == edges
+            perms.append(permutation(g.n, mapping=mapping))
+        assert PermutationGroup(perms, g.n).order() == num_auto
+        if g.num_auto is not None:
+            assert num_auto == g.num_auto
+
+
+def test_AUT_of_a_file(tmp_path):
+    graphs = [cycle(6), path(5), GeneratedGraph('G', 7, random_edges(7, 0.4, 1), None)]
+    filename = str(tmp_path / 'three.grl')
+    write_grl(filename, graphs)
+    expected = [num_automorphisms(g.n, g.edges) for g in graphs]
+    assert AUT(filename) == [([i], expected[i]) for i in range(len(graphs))]
+    for i, g in enumerate(graphs):
+        single = str(tmp_path / 'g{}.gr'.format(i))
+        write_grl(single, [g])
+        assert AUT(single) == expected[i]
@@ -0,0 +1,83 @@
+import sqlite3
+from math import factorial
+from final_AUT import AUT, GI
+from graph_families import GeneratedGraph, cycle, path, star, petersen, random_tree, relabel, to_csr, write_grl
+from result_cache import ResultCache, VERSION, ENTRY_SIZE, graph_key, encode_count, decode_count, pack_generators, \
+    unpack_generators
+
+
+def test_count_and_generator_encoding():
+    for num in [0, 1, 255, factorial(3000)]:
+        assert decode_count(encode_count(num)) == num
+    generators = [[(0, 1), (1, 0)], [], [(5, 7), (7, 9), (9, 5)]]
+    assert unpack_generators(pack_generators(generators)) == generators
+
+
+def test_graph_key_is_the_labelled_edge_set():
+    g = random_tree(20, 1)
+    reordered = GeneratedGraph(g.name, g.n, [(v, u) for u, v in reversed(g.edges)], g.num_auto)
+    assert graph_key(to_csr(g)) == graph_key(to_csr(reordered))
+    assert graph_key(to_csr(g)) != graph_key(to_csr(relabel(g, 3)))
+    assert graph_key(to_csr(cycle(5))) != graph_key(to_csr(path(5)))
+
+
+def test_round_trip_through_the_file(tmp_path):
+    filename = str(tmp_path / 'cache.sqlite')
+    csr = to_csr(star(3000))
+    generators = [[(1, 2), (2, 1)], [(1, 2), (2, 3), (3, 1)]]
+    with ResultCache(filename) as cache:
+        key = cache.key(csr)
+        assert cache.automorphisms(key) is None
+        cache.store_automorphisms(key, csr.n, csr.m, factorial(3000), generators)
+        digest = cache.store_certificate(key, csr.n, csr.m, ('some', 'certificate'))
+        _, fingerprint = cache.fingerprint_of(csr, key)
+
+    with ResultCache(filename) as cache:
+        assert len(cache) == 1
+        assert cache.automorphisms(key) == (factorial(3000), generators)
+        assert cache.certificate(key) == digest
+        assert cache.fingerprint_of(csr) == (key, fingerprint)
+        assert cache.hits == 3 and cache.misses == 0
+
+
+def test_other_version_is_dropped(tmp_path):
+    filename = str(tmp_path / 'cache.sqlite')
+    with ResultCache(filename) as cache:
+        cache.fingerprint_of(to_csr(petersen()))
+    connection = sqlite3.connect(filename)
+    connection.execute('PRAGMA user_version = {}'.format(VERSION - 1))
+    connection.commit()
+    connection.close()
+    with ResultCache(filename) as cache:
+        assert len(cache) == 0
+
+
+def test_eviction_by_size_keeps_the_recently_used(tmp_path):
+    filename = str(tmp_path / 'cache.sqlite')
+    csrs = [to_csr(cycle(n)) for n in range(3, 13)]
+    with ResultCache(filename) as cache:
+        for csr in csrs:
+            cache.fingerprint_of(csr)
+    with ResultCache(filename) as cache:
+        # csrs[0] is now the most recently used entry, and the only one that fits
+        cache.fingerprint_of(csrs[0])
+        cache.commit()
+        cache.max_bytes = cache.connection.execute('SELECT {} FROM graphs WHERE key = ?'.format(ENTRY_SIZE),
+                                                   (graph_key(csrs[0]),)).fetchone()[0]
+        assert cache.evict() == len(csrs) - 1
+        assert cache.lookup(graph_key(csrs[0]), 'fingerprint') is not None
+
+
+def test_AUT_and_GI_with_a_cache(tmp_path):
+    graphs = [petersen(), relabel(petersen(), 1), cycle(10), random_tree(30, 2), relabel(random_tree(30, 2), 5)]
+    filename = str(tmp_path / 'mixed.grl')
+    write_grl(filename, graphs)
+    expected_GI = GI(filename)
+    expected_AUT = AUT(filename)
+    cache_file = str(tmp_path / 'cache.sqlite')
+    for run in range(2):
+        with ResultCache(cache_file) as cache:
+            assert GI(filename, cache=cache) == expected_GI
+            assert AUT(filename, cache=cache) == expected_AUT
+            if run == 1:
+                assert cache.misses == 0
@@ -0,0 +1,61 @@
+import random
+from brute_force import num_automorphisms, is_isomorphic
+from graph_families import GeneratedGraph, path, star, spider, cycle, disjoint_union, random_tree, relabel, to_csr
+from permutation_group import PermutationGroup
+from permv2 import permutation
+from trees import RootedForest, is_forest, forest_certificate
+
+
+def random_forest(n, trees, seed):
+    rng = random.Random(seed)
+    sizes = [1] * trees
+    for _ in range(n - trees):
+        sizes[rng.randrange(trees)] += 1
+    return disjoint_union([random_tree(size, rng.randrange(1000)) for size in sizes])
+
+
+def test_is_forest():
+    assert is_forest(to_csr(random_tree(50, 1)))
+    assert is_forest(to_csr(random_forest(30, 4, 2)))
+    assert not is_forest(to_csr(cycle(5)))
+    assert not is_forest(to_csr(GeneratedGraph('loop', 2, [(0, 1), (1, 1)], None)))
+
+
+def test_num_auto_of_known_trees():
+    assert RootedForest(to_csr(path(7))).num_auto == 2
+    assert RootedForest(to_csr(star(6))).num_auto == 720
+    assert RootedForest(to_csr(spider(4, 3))).num_auto == 24
+    # two copies of P3 and an isolated vertex: 2^2 * 2!
+    assert RootedForest(to_csr(disjoint_union([path(3), path(3), path(1)]))).num_auto == 8
+
+
+def test_num_auto_and_generators_match_brute_force():
+    graphs = [random_tree(8, seed) for seed in range(15)] + [random_forest(8, 3, seed) for seed in range(15)]
+    for g in graphs:
+        forest = RootedForest(to_csr(g))
+        assert forest.num_auto == num_automorphisms(g.n, g.edges)
+        edges = set(frozenset(e) for e in g.edges)
+        perms = []
+        for moved in forest.generators():
+            mapping = list(range(g.n))
+            for point, image in moved:
+                mapping[point] = image
+            assert set(frozenset((mapping[u], mapping[v])) for u, v in g.edges) == edges
+            perms.append(permutation(g.n, mapping=mapping))
+        assert PermutationGroup(perms, g.n).order() == forest.num_auto
+
+
+def test_certificates_of_relabelled_and_different_trees():
+    for seed in range(10):
+        g = random_tree(60, seed)
+        assert forest_certificate(to_csr(g)) == forest_certificate(to_csr(relabel(g, seed)))
+    trees = [random_tree(7, seed) for seed in range(20)]
+    for i in range(len(trees)):
+        for j in range(i + 1, len(trees)):
+            same = forest_certificate(to_csr(trees[i])) == forest_certificate(to_csr(trees[j]))
+            assert same == is_isomorphic(7, trees[i].edges, 7, trees[j].edges)
+
+
+def test_deep_path_without_recursion_limit():
+    # a long path has depth n / 2 below its center
+    assert RootedForest(to_csr(path(200000))).num_auto == 2
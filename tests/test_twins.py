@@ -0,0 +1,84 @@
+from math import factorial
+from brute_force import random_edges, num_automorphisms
+from final_AUT import AUT_single_readcsr
+from graph_families import GeneratedGraph, star, complete, cycle, to_csr
+from twins import TwinQuotient, swap_blocks, moved_points
+
+
+def complete_multipartite(sizes):
+    parts = []
+    for size in sizes:
+        start = sum(len(part) for part in parts)
+        parts.append(list(range(start, start + size)))
+    edges = [(u, v) for i in range(len(parts)) for j in range(i + 1, len(parts)) for u in parts[i] for v in parts[j]]
+    return GeneratedGraph('K' + ','.join(map(str, sizes)), sum(sizes), edges, None, None)
+
+
+def with_twins(n, edges, false_twin_of, true_twin_of):
+    """
+    Add a false twin of vertex <false_twin_of> and a true twin of vertex <true_twin_of>.
+    """
+    edges = list(edges)
+    nbs = [set() for _ in range(n)]
+    for u, v in edges:
+        nbs[u].add(v)
+        nbs[v].add(u)
+    edges.extend((n, u) for u in nbs[false_twin_of])
+    edges.extend((n + 1, u) for u in nbs[true_twin_of] | {true_twin_of})
+    if true_twin_of in nbs[false_twin_of]:
+        edges.append((n, n + 1))
+    return n + 2, edges
+
+
+def check_generators(g, twins):
+    edges = set(frozenset(e) for e in g.edges)
+    for moved in twins.generators:
+        mapping = list(range(g.n))
+        for point, image in moved:
+            mapping[point] = image
+        assert set(frozenset((mapping[u], mapping[v])) for u, v in g.edges) == edges
+
+
+def test_star_and_complete_graph_collapse():
+    for g in [star(6), complete(6)]:
+        twins = TwinQuotient(to_csr(g))
+        assert twins.quotient.n <= 2
+        assert twins.factor == factorial(6)
+        check_generators(g, twins)
+
+
+def test_complete_multipartite_graphs():
+    for sizes, num_auto in [([3, 4], 144), ([3, 3], 72), ([2, 2, 2], 48), ([1, 2, 3], 12)]:
+        g = complete_multipartite(sizes)
+        twins = TwinQuotient(to_csr(g))
+        assert sorted(v for members in twins.members for v in members) == list(range(g.n))
+        check_generators(g, twins)
+        assert AUT_single_readcsr(to_csr(g), False) == num_auto
+
+
+def test_no_twins_leaves_the_graph():
+    csr = to_csr(cycle(7))
+    twins = TwinQuotient(csr)
+    assert twins.quotient is csr and twins.factor == 1 and twins.colors is None and twins.generators == []
+
+
+def test_non_simple_graph_is_left_as_is():
+    csr = to_csr(GeneratedGraph('loop', 3, [(0, 1), (0, 2), (1, 1)], None))
+    twins = TwinQuotient(csr)
+    assert twins.quotient is csr and twins.factor == 1
+
+
+def test_AUT_with_twins_matches_brute_force():
+    for seed in range(25):
+        edges = random_edges(6, 0.5, seed)
+        n, edges = with_twins(6, edges, seed % 6, (seed + 2) % 6)
+        g = GeneratedGraph('G', n, edges, None)
+        twins = TwinQuotient(to_csr(g))
+        assert twins.factor > 1
+        check_generators(g, twins)
+        assert AUT_single_readcsr(to_csr(g), False) == num_automorphisms(n, edges)
+
+
+def test_swap_blocks_and_moved_points():
+    assert swap_blocks([[0, 1], [2, 3]]) == [(0, 2), (1, 3), (2, 0), (3, 1)]
+    assert moved_points([0, 2, 1, 3]) == [(1, 2), (2, 1)]
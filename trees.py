@@ -0,0 +1,246 @@
+from collections import deque
+from math import factorial
+from csr_graph import connected_components, is_simple
+
+# Trees and forests without search: an AHU-style canonical encoding, and |Aut| in closed form.
+#
+# Every tree is rooted at its center (the middle vertex of a longest path), or, if it has two centers,
+# at a virtual "edge" node with the two centers as children. The trees of a forest are the children of one
+# virtual "forest" node. Every automorphism maps centers to centers, so the automorphisms of the forest are
+# exactly those of this rooted tree, and
+#     |Aut| = prod over all nodes of prod over the classes of isomorphic child subtrees of (class size)!
+#
+# Isomorphic subtrees are found bottom-up, level by level of height: a node is labeled (height, rank), where
+# rank orders the nodes of that height by their kind and the sorted labels of their children. This order only
+# depends on the shape of the subtrees, so writing every node as brackets around its children, in label order,
+# gives a canonical string: two forests are isomorphic iff their strings are equal.
+# Everything takes O(n log n), the time of sorting the children by label.
+
+REAL = 0
+EDGE = 1
+FOREST = 2
+
+OPEN = {REAL: '(', EDGE: '[', FOREST: '{'}
+CLOSE = {REAL: ')', EDGE: ']', FOREST: '}'}
+
+
+class RootedForest():
+
+    def __init__(self, csr):
+        """
+        Root the forest given by the CSRGraph <csr>, see is_forest(), and label every node.
+        After construction:
+            - encoding: the canonical string of the forest
+            - num_auto: |Aut| of the forest
+            - children: a list indexed by node, the children of every node sorted by label;
+                        nodes 0...n-1 are the vertex ids of csr, the others are virtual
+            - order: the nodes in preorder, with children in sorted order, and size: the subtree size of every node
+        """
+        self.csr = csr
+        self.n = csr.n
+        self.kind = [REAL] * self.n
+        self.children = [[] for _ in range(self.n)]
+
+        roots = []
+        for component in connected_components(csr):
+            centers = find_centers(csr, component)
+            if len(centers) == 1:
+                roots.append(centers[0])
+                self.hang(centers[0], -1)
+            else:
+                edge = self.add_node(EDGE)
+                self.children[edge] = list(centers)
+                self.hang(centers[0], centers[1])
+                self.hang(centers[1], centers[0])
+                roots.append(edge)
+        self.root = self.add_node(FOREST)
+        self.children[self.root] = roots
+
+        self.label = self.labeling()
+        for v in range(len(self.children)):
+            self.children[v].sort(key=lambda c: self.label[c])
+
+        self.num_auto = 1
+        for v in range(len(self.children)):
+            for k in self.class_sizes(v):
+                self.num_auto *= factorial(k)
+
+        self.order = []
+        self.size = [1] * len(self.children)
+        encoding = []
+        stack = [(self.root, False)]
+        while len(stack) > 0:
+            v, done = stack.pop()
+            if done:
+                encoding.append(CLOSE[self.kind[v]])
+                for c in self.children[v]:
+                    self.size[v] += self.size[c]
+                continue
+            self.order.append(v)
+            encoding.append(OPEN[self.kind[v]])
+            stack.append((v, True))
+            for c in reversed(self.children[v]):
+                stack.append((c, False))
+        self.encoding = ''.join(encoding)
+
+    def certificate(self):
+        """
+        Return the canonical certificate of the forest, comparable with canonical_form.csr_certificate().
+        """
+        return 'forest', self.n, self.encoding
+
+    def add_node(self, kind):
+        """
+        (Mostly for internal use.)
+        Add a virtual node of <kind>, and return it.
+        """
+        self.kind.append(kind)
+        self.children.append([])
+        return len(self.kind) - 1
+
+    def hang(self, root, parent):
+        """
+        (Mostly for internal use.)
+        Fill in the children of the tree hanging from <root>, away from <parent>.
+        """
+        queue = deque([(root, parent)])
+        offsets = self.csr.offsets
+        nbs = self.csr.nbs
+        while len(queue) > 0:
+            v, p = queue.popleft()
+            for j in range(offsets[v], offsets[v + 1]):
+                u = nbs[j]
+                if u != p:
+                    self.children[v].append(u)
+                    queue.append((u, v))
+
+    def labeling(self):
+        """
+        (Mostly for internal use.)
+        Return a list indexed by node, the (height, rank) of every node, see the module description.
+        """
+        # the nodes in BFS order from the root, so every child comes after its parent
+        bfs = [self.root]
+        for v in bfs:
+            bfs.extend(self.children[v])
+
+        height = [0] * len(self.children)
+        for v in reversed(bfs):
+            for c in self.children[v]:
+                if height[c] + 1 > height[v]:
+                    height[v] = height[c] + 1
+
+        levels = {}
+        for v in bfs:
+            if height[v] in levels:
+                levels[height[v]].append(v)
+            else:
+                levels[height[v]] = [v]
+
+        label = [None] * len(self.children)
+        for h in sorted(levels):
+            keys = {}
+            for v in levels[h]:
+                keys[v] = (self.kind[v], tuple(sorted(label[c] for c in self.children[v])))
+            rank = {}
+            for key in sorted(set(keys.values())):
+                rank[key] = len(rank)
+            for v in levels[h]:
+                label[v] = (h, rank[keys[v]])
+        return label
+
+    def class_sizes(self, v):
+        """
+        (Mostly for internal use.)
+        Return the sizes of the classes of isomorphic subtrees among the (sorted) children of node v.
+        """
+        sizes = []
+        children = self.children[v]
+        start = 0
+        for i in range(1, len(children) + 1):
+            if i == len(children) or self.label[children[i]] != self.label[children[start]]:
+                sizes.append(i - start)
+                start = i
+        return sizes
+
+    def generators(self):
+        """
+        Return a generating set of Aut(forest), as lists of (vertex id, image) pairs of the moved points:
+        for every class of k >= 2 isomorphic child subtrees, the swap of the first two and (if k > 2) the cycle
+        of all of them.
+        Isomorphic subtrees are mapped position by position in preorder.
+        """
+        position = [0] * len(self.children)
+        for i in range(len(self.order)):
+            position[self.order[i]] = i
+
+        generators = []
+        for v in range(len(self.children)):
+            children = self.children[v]
+            start = 0
+            for k in self.class_sizes(v):
+                same = children[start:start + k]
+                start += k
+                if k < 2:
+                    continue
+                generators.append(self.swap_subtrees(same[:2], position))
+                if k > 2:
+                    generators.append(self.swap_subtrees(same, position))
+        return generators
+
+    def swap_subtrees(self, roots, position):
+        """
+        (Mostly for internal use.)
+        Return the permutation that maps the subtree of roots[i] onto the subtree of roots[i+1], and the last one
+        onto the first, as a list of (vertex id, image) pairs of its moved points.
+        """
+        pairs = []
+        for i in range(len(roots)):
+            a = position[roots[i]]
+            b = position[roots[(i + 1) % len(roots)]]
+            for j in range(self.size[roots[i]]):
+                u = self.order[a + j]
+                if u < self.n:
+                    pairs.append((u, self.order[b + j]))
+        return pairs
+
+
+# tier 0
+def is_forest(csr):
+    """
+    Return True iff the graph given by the CSRGraph is a simple graph without cycles (m = n - number of components).
+    """
+    return is_simple(csr) and csr.m == csr.n - len(connected_components(csr))
+
+
+# tier 0
+def forest_certificate(csr):
+    """
+    Return the canonical certificate of a forest, see RootedForest.certificate().
+    """
+    return RootedForest(csr).certificate()
+
+
+# tier 1
+def find_centers(csr, component):
+    """
+    Return the one or two centers of the tree on the vertices of <component>, by removing leaves layer by layer.
+    """
+    if len(component) <= 2:
+        return component
+    degree = {}
+    for v in component:
+        degree[v] = csr.offsets[v + 1] - csr.offsets[v]
+    layer = [v for v in component if degree[v] == 1]
+    remaining = len(component)
+    while remaining > 2:
+        remaining -= len(layer)
+        next_layer = []
+        for v in layer:
+            for j in range(csr.offsets[v], csr.offsets[v + 1]):
+                u = csr.nbs[j]
+                degree[u] -= 1
+                if degree[u] == 1:
+                    next_layer.append(u)
+        layer = next_layer
+    return sorted(layer)
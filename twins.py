@@ -0,0 +1,237 @@
+import random
+from array import array
+from math import factorial
+from csr_graph import CSRGraph, is_simple
+
+# Twin reduction: a preprocessing stage that shrinks a graph before refinement and search.
+#
+# Two vertices u and v are false twins if N(u) == N(v), and true twins if N(u) + u == N(v) + v.
+# Both relations are equivalence relations, every vertex is in a non-trivial class of at most one of them,
+# and every permutation of a twin class is an automorphism. Between two twin classes, the edges are all or none.
+# So the graph is determined by its quotient: one vertex per twin class, colored by (kind, class size, color),
+# with an edge between two classes iff they are adjacent, and
+#     |Aut(G)| = |Aut(quotient)| * prod over the twin classes of |class|!
+# where Aut(quotient) only maps vertices to vertices of the same color. Two graphs are isomorphic iff their
+# quotients are (as colored graphs), since the colors only depend on the structure.
+#
+# Twins of the same color in the quotient are collapsed again, until there are none, so that e.g. a star,
+# a complete (multipartite) graph or a complete bipartite graph becomes a single vertex or an edge.
+#
+# One round finds the twin classes in expected O(n + m): every vertex gets a random 64-bit number, a neighbourhood
+# is hashed as the sum of the numbers of its vertices, and only vertices with equal hashes are compared.
+
+TRUE_TWINS = 1
+FALSE_TWINS = 0
+
+MASK = (1 << 64) - 1
+
+
+class TwinQuotient():
+
+    def __init__(self, csr, seed=0):
+        """
+        Reduce the graph given by the CSRGraph <csr> (with vertex ids as labels) to its twin quotient.
+        Graphs with self-loops or multiple edges are left as they are.
+        After construction:
+            - quotient: a CSRGraph of the quotient, vertex i has label i; csr itself if there are no twins
+            - colors: a list indexed by vertex id of the quotient, with comparable values that do not depend
+                      on the labeling of csr, or None if every vertex has the same color
+            - members: a list indexed by vertex id of the quotient, the vertex ids of csr it stands for
+            - factor: the product of |class|! over all twin classes, in every round
+            - generators: permutations of csr generating the permutations within the twin classes,
+                          as lists of (vertex id, image) pairs of their moved points, see swap_blocks()
+        """
+        self.csr = csr
+        self.quotient = csr
+        self.colors = None
+        self.members = [[v] for v in range(csr.n)]
+        self.factor = 1
+        self.generators = []
+        if not is_simple(csr):
+            return
+
+        rng = random.Random(seed)
+        colors = [()] * csr.n
+        graph = csr
+        while True:
+            classes = twin_classes(graph, colors, rng)
+            if len(classes) == graph.n:
+                break
+
+            new_colors = []
+            members = []
+            for cls, kind in classes:
+                if len(cls) == 1:
+                    new_colors.append(colors[cls[0]])
+                    members.append(self.members[cls[0]])
+                    continue
+                self.factor *= factorial(len(cls))
+                new_colors.append((kind, len(cls), colors[cls[0]]))
+                # the members of twins with equal colors are built alike, position i maps to position i
+                self.generators.append(swap_blocks([self.members[v] for v in cls[:2]]))
+                if len(cls) > 2:
+                    self.generators.append(swap_blocks([self.members[v] for v in cls]))
+                merged = []
+                for v in cls:
+                    merged.extend(self.members[v])
+                members.append(merged)
+
+            graph = quotient_graph(graph, classes)
+            colors = new_colors
+            self.members = members
+
+        self.quotient = graph
+        if any(len(c) > 0 for c in colors):
+            self.colors = colors
+
+    def color_ranks(self):
+        """
+        Return the colors as ints, the rank of every color among the sorted distinct colors, or None.
+        Ranks are only comparable within one graph (e.g. G and its copy G' in the automorphism search).
+        """
+        if self.colors is None:
+            return None
+        rank = {}
+        for c in sorted(set(self.colors)):
+            rank[c] = len(rank)
+        return [rank[c] for c in self.colors]
+
+    def lift(self, mapping):
+        """
+        Lift an automorphism of the colored quotient, a mapping (list) indexed by quotient vertex id,
+        to an automorphism of csr: the members of vertex i are mapped in order onto the members of mapping[i].
+        Return:
+            - the automorphism of csr as a list of (vertex id, image) pairs of its moved points
+        """
+        lifted = []
+        for i in range(len(mapping)):
+            if mapping[i] != i:
+                lifted.extend(zip(self.members[i], self.members[mapping[i]]))
+        return lifted
+
+
+# tier 1
+def twin_classes(csr, colors, rng):
+    """
+    Params:
+        - colors: a list of hashable colors indexed by vertex id, only vertices of equal color can be twins
+    Return:
+        - a list of (list of vertex ids, kind) with TRUE_TWINS or FALSE_TWINS as kind, one per twin class
+          (singletons included, as FALSE_TWINS), ordered by smallest vertex id
+    """
+    n = csr.n
+    offsets = csr.offsets
+    nbs = csr.nbs
+    weight = [rng.getrandbits(64) for _ in range(n)]
+
+    open_hash = [0] * n
+    for v in range(n):
+        h = 0
+        for j in range(offsets[v], offsets[v + 1]):
+            h += weight[nbs[j]]
+        open_hash[v] = h & MASK
+
+    # class_of[v]: index of the class of v in classes
+    class_of = [-1] * n
+    classes = []
+    for kind in [TRUE_TWINS, FALSE_TWINS]:
+        buckets = {}
+        for v in range(n):
+            if class_of[v] >= 0:
+                continue
+            h = open_hash[v]
+            if kind == TRUE_TWINS:
+                h = (h + weight[v]) & MASK
+            key = (colors[v], offsets[v + 1] - offsets[v], h)
+            if key in buckets:
+                buckets[key].append(v)
+            else:
+                buckets[key] = [v]
+
+        for bucket in buckets.values():
+            if len(bucket) == 1:
+                continue
+            # split the bucket by the actual neighbourhoods, hash collisions are rare
+            groups = []
+            for v in bucket:
+                nb = closed_neighbourhood(csr, v, kind == TRUE_TWINS)
+                for group, group_nb in groups:
+                    if group_nb == nb:
+                        group.append(v)
+                        break
+                else:
+                    groups.append(([v], nb))
+            for group, _ in groups:
+                if len(group) > 1:
+                    for v in group:
+                        class_of[v] = len(classes)
+                    classes.append((group, kind))
+
+    for v in range(n):
+        if class_of[v] < 0:
+            class_of[v] = len(classes)
+            classes.append(([v], FALSE_TWINS))
+
+    classes.sort(key=lambda c: c[0][0])
+    return classes
+
+
+# tier 2
+def closed_neighbourhood(csr, v, closed):
+    """
+    Return the set of neighbours of v, including v itself if <closed>.
+    """
+    nb = set(csr.nbs[csr.offsets[v]:csr.offsets[v + 1]])
+    if closed:
+        nb.add(v)
+    return nb
+
+
+# tier 1
+def quotient_graph(csr, classes):
+    """
+    Return the CSRGraph with one vertex per class, in the order of classes, and an edge between two classes
+    iff their vertices are adjacent (which is all or none for twin classes).
+    """
+    class_of = [0] * csr.n
+    for i in range(len(classes)):
+        for v in classes[i][0]:
+            class_of[v] = i
+
+    offsets = array('i', [0])
+    nbs = array('i')
+    for cls, _ in classes:
+        # all members have the same neighbours outside the class, so the first one is enough
+        v = cls[0]
+        seen = set()
+        for j in range(csr.offsets[v], csr.offsets[v + 1]):
+            c = class_of[csr.nbs[j]]
+            if c != class_of[v] and c not in seen:
+                seen.add(c)
+                nbs.append(c)
+        offsets.append(len(nbs))
+    k = len(classes)
+    return CSRGraph(offsets, nbs, array('i', [csr.graph_idx[0] if csr.n > 0 else 0]) * k, array('i', range(k)))
+
+
+# tier 2
+def swap_blocks(blocks):
+    """
+    Params:
+        - blocks: disjoint lists of vertex ids of equal length
+    Return:
+        - the permutation that maps blocks[i][j] to blocks[i+1][j], and the last block onto the first,
+          as a list of (vertex id, image) pairs of its moved points
+    """
+    pairs = []
+    for i in range(len(blocks)):
+        pairs.extend(zip(blocks[i], blocks[(i + 1) % len(blocks)]))
+    return pairs
+
+
+# tier 2
+def moved_points(mapping):
+    """
+    Return the permutation given by a mapping (list) as a list of (vertex id, image) pairs of its moved points.
+    """
+    return [(v, image) for v, image in enumerate(mapping) if v != image]
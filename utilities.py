@@ -1,7 +1,15 @@
 from graph import *
 from SimpleVertex import SimpleVertex
+from csr_graph import CSRGraph, csr_from_graphs, csr_disjoint_union, sparse_side
 from permv2 import *
 from basicpermutationgroup import *
+from permutation_group import PermutationGroup
+from parallel import num_workers
+import search_stats
+from target_cells import select_target
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Event
 
 # All the helper functions are defined here.
 # "tier 0" means the function is called directly by a main somewhere,
@@ -14,6 +22,227 @@ from basicpermutationgroup import *
 
 # ================ end of finalizing functions ================
 
+# ================ parallel search ================
+# The top levels of the search tree of count_isomorphism() / get_generating_set() are split into tasks.
+# A task is a node of the tree given by the vertex ids of D and I, which a worker process searches from scratch:
+# the CSRGraph is sent to every worker once when the pool starts, and every worker makes its own SimpleVertex objects.
+
+# worker state, set by init_search_worker()
+search_matrix = None
+search_reference = None
+search_colors = None
+search_strategy = None
+# a multiprocessing Event, the workers stop searching when it is set; always None in the main process
+cancel_event = None
+
+# the tree is split at most this many levels deep, to have a few tasks per worker
+MAX_SPLIT_DEPTH = 3
+
+
+# tier 1
+def count_isomorphism_parallel(st_info, D, I, stop_at_first_iso, matrix, reference, workers, colors=None,
+                               strategy=None):
+    """
+    The parallel counterpart of count_isomorphism_search(), see count_isomorphism().
+    With stop_at_first_iso, the first task that finds an isomorphism cancels the tasks that have not started,
+    and makes the running ones stop.
+    """
+    workers = num_workers(workers)
+
+    # go one level deeper until there are a few tasks per worker
+    depth = 0
+    while True:
+        depth += 1
+        frontier = []
+        num = search_frontier(st_info, D, I, matrix, reference, [], depth, frontier, strategy)
+        if len(frontier) >= 4 * workers or len(frontier) == 0 or depth == MAX_SPLIT_DEPTH:
+            break
+
+    if len(frontier) == 0 or (stop_at_first_iso and num > 0):
+        return min(num, 1) if stop_at_first_iso else num
+
+    event = Event()
+    with ProcessPoolExecutor(max_workers=min(workers, len(frontier)),
+                             initializer=init_search_worker, initargs=(matrix, event, colors, strategy)) as executor:
+        futures = []
+        for D_ids, I_ids in frontier:
+            futures.append(search_stats.submit(executor, count_isomorphism_task, D_ids, I_ids, stop_at_first_iso))
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            num += search_stats.result(future)
+            if stop_at_first_iso and num > 0:
+                event.set()
+                for f in futures:
+                    f.cancel()
+                break
+
+    return min(num, 1) if stop_at_first_iso else num
+
+
+# tier 1
+def generating_set_parallel(st_info, D, I, matrix, reference, X, enable_m_test, workers, colors=None, strategy=None):
+    """
+    The parallel counterpart of generating_set_search(), see get_generating_set().
+    Require:
+        - D and I form a trivial path, see is_trivial_path()
+    Every branch (x, y) of this node is a task. Whenever a task finishes, the tasks whose y is in the orbit of x
+    under the automorphisms found so far are cancelled if they have not started yet.
+    The automorphisms found by the tasks are merged into X in the order of the branches,
+    so X does not depend on the order in which the tasks finish.
+    """
+    bijection, unbalanced = check_balanced_bijection(st_info)
+    if bijection or unbalanced:
+        return generating_set_search(st_info, D, I, matrix, reference, X, enable_m_test, [], strategy)
+
+    fromG, fromH = branching_vertices(st_info, D, matrix, reference, strategy)
+    x = fromG[0]
+    reorder_fromH(x, fromH)
+
+    D_ids = [v.idx for v in D]
+    I_ids = [v.idx for v in I]
+    fixed = [v.label for v in D]
+    # results[i]: (num, list of automorphisms) of the branch (x, fromH[i])
+    results = [None] * len(fromH)
+
+    with ProcessPoolExecutor(max_workers=min(num_workers(workers), len(fromH)),
+                             initializer=init_search_worker, initargs=(matrix, Event(), colors, strategy)) as executor:
+        futures = []
+        for y in fromH:
+            futures.append(search_stats.submit(executor, generating_set_task, D_ids + [x.idx], I_ids + [y.idx],
+                                               enable_m_test))
+        index = {}
+        for i in range(len(futures)):
+            index[futures[i]] = i
+
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            results[index[future]] = search_stats.result(future)
+
+            # orbit pruning with the automorphisms found so far
+            found = list(X)
+            for result in results:
+                if result is not None:
+                    found.extend(result[1])
+            orbit_of = stabilizer_orbits(found, fixed)
+            if orbit_of is None:
+                continue
+            for i in range(len(fromH)):
+                if fromH[i].label != x.label and orbit_of[fromH[i].label] == orbit_of[x.label]:
+                    futures[i].cancel()
+
+    num = 0
+    stats = search_stats.current()
+    for result in results:
+        if result is None:
+            # the branch was cancelled by orbit pruning
+            if stats is not None:
+                stats.pruned += 1
+            continue
+        num += result[0]
+        for perm in result[1]:
+            if enable_m_test and len(X) > 0 and membership_testing(X, perm):
+                continue
+            X.append(perm)
+            if stats is not None:
+                stats.generators += 1
+
+    return num, False
+
+
+# tier 2
+def search_frontier(st_info, D, I, matrix, reference, trail, depth, frontier, strategy=None):
+    """
+    Collect the nodes <depth> levels below the node (st_info, D, I) of the count_isomorphism() search tree
+    into frontier, as (vertex ids of D, vertex ids of I). st_info is restored before returning.
+    Return:
+        - the number of isomorphisms found at leaves less than <depth> levels below the node
+    """
+    bijection, unbalanced = check_balanced_bijection(st_info)
+    if unbalanced:
+        return 0
+    if bijection:
+        return 1
+    if depth == 0:
+        frontier.append(([v.idx for v in D], [v.idx for v in I]))
+        return 0
+
+    fromG, fromH = branching_vertices(st_info, D, matrix, reference, strategy)
+    x = fromG[0]
+    num = 0
+    for y in fromH:
+        mark = len(trail)
+        individualize_refine(st_info, x, y, True, matrix, reference, trail)
+        num += search_frontier(st_info, D + [x], I + [y], matrix, reference, trail, depth - 1, frontier, strategy)
+        undo_refinement(st_info, trail, mark)
+    return num
+
+
+# tier 2
+def branching_vertices(st_info, D, matrix=None, reference=None, strategy=None):
+    """
+    Params:
+        - strategy: how the target cell is chosen, see target_cells.py, None for the first cell
+    Return:
+        - fromG, fromH: the vertices of the target cell (a color class with at least 4 vertices), split by graph
+    """
+    key = select_target(st_info, strategy, matrix, reference)
+
+    if len(D) == 0:
+        return stratify_vertices(st_info[key])
+    else:
+        return stratify_vertices(st_info[key], D[0].graph_idx)
+
+
+# tier 2
+def init_search_worker(matrix, event, colors=None, strategy=None):
+    """
+    Runs once in every worker process of the pool.
+    """
+    global search_matrix, search_reference, search_colors, search_strategy, cancel_event
+    search_matrix = matrix
+    search_colors = colors
+    search_strategy = strategy
+    search_reference = []
+    for i in range(matrix.n):
+        search_reference.append(SimpleVertex(matrix.graph_idx[i], matrix.labels[i], i))
+    cancel_event = event
+
+
+# tier 2
+def task_vertices(D_ids, I_ids):
+    """
+    Return D, I and other of the node given by vertex ids, as SimpleVertex objects of this worker.
+    """
+    D = [search_reference[i] for i in D_ids]
+    I = [search_reference[i] for i in I_ids]
+    individualized = set(D_ids)
+    individualized.update(I_ids)
+    other = [v for v in search_reference if v.idx not in individualized]
+    return D, I, other
+
+
+# tier 2: runs in a worker process
+def count_isomorphism_task(D_ids, I_ids, stop_at_first_iso):
+    if cancel_event.is_set():
+        return 0
+    D, I, other = task_vertices(D_ids, I_ids)
+    return count_isomorphism(D, I, other, stop_at_first_iso, search_matrix, search_reference, 1, search_colors,
+                             search_strategy)
+
+
+# tier 2: runs in a worker process
+def generating_set_task(D_ids, I_ids, enable_m_test):
+    D, I, other = task_vertices(D_ids, I_ids)
+    X = []
+    num, _ = get_generating_set(D, I, other, search_matrix, search_reference, X, enable_m_test, 1, search_colors,
+                                search_strategy)
+    return num, X
+
+
+# ================ end of parallel search ================
+
 # ================ wk6 ================
 
 # tier 0
@@ -21,48 +250,50 @@ def initialization_automorphism(g: "Graph"):
     """
     - For each vertex v in g, generate two SimpleVertex object v' and v'', with the same v.label,
     but v'.graph_idx = 0, v'.graph_idx = 1. These two number together can uniquely identify a SimpleVertex obj.
-    - In the process make an adjacency matrix, because when Vertex --> SimpleVertex,
+    - In the process make a CSRGraph of the disjoint union of g and its copy g', because when Vertex --> SimpleVertex,
     the neighborhood information is lost, so need an external structure to store neighborhood info.
-    - Also, make a dictionary of reference, that maps each (graph_idx, label) pair to a SimpleVertex object.
-    So that each SimpleVertex obj, through adj.matrix can find its neighbor,
+    - Also, make a reference list, that maps each vertex id of the CSRGraph to a SimpleVertex object.
+    So that each SimpleVertex obj, through the CSRGraph can find the ids of its neighbours,
     and through reference can actually refer back to the SimpleVertex, to get the color of its neighbor.
     Return:
         - new_vs: list of SimpleVertex that contains "vertex" of G and G',
-                  which now **only** have two attr: v.graph_idx and v.label
-        - mtx: an adjacency matrix recording the neighbouring info in the original graph,
-               with the format { (graph_idx, label):   { (graph_idx, label):  1 } }
-        -ref: a reference dict to refer back to the simplevertex obj,
-              with format  { (graph_idx, label):  simple_vertex_obj }
-    """
-    # a dict of format { (graph_idx, label):   { (graph_idx, label):  1 }},
-    mtx = {}
+                  which now **only** have three attr: v.graph_idx, v.label and v.idx
+        - mtx: a CSRGraph recording the neighbouring info of the disjoint union of G and G',
+               where the vertex v of G has id i, and its copy in G' has id n+i
+        - ref: a reference list to refer back to the simplevertex obj,
+               with format  [simple_vertex_obj_of_id_0, simple_vertex_obj_of_id_1, ...]
+    """
+    return initialization_automorphism_csr(csr_from_graphs([g]))
+
+
+# tier 0
+def initialization_automorphism_csr(single: CSRGraph):
+    """
+    Same as initialization_automorphism(), for a graph given by a CSRGraph <single>.
+    """
+    mtx = csr_disjoint_union([single, single], [0, 1])
+
+    n = single.n
     # all the new SimpleVeretx
     new_vs = []
-    # a dict of format { (graph_idx, label):  simple_vertex_obj},
+    # a list indexed by vertex id of mtx,
     # is used to traceback to the simplevertex v2 that is neighboring to v1
-    ref = {}
-    # init v.label and v.graph_idx
-    for v in g.vertices:
-        new_v0 = SimpleVertex(0, v.label)
+    ref = [None] * (2 * n)
+    # init v.label, v.graph_idx and v.idx
+    for i in range(n):
+        new_v0 = SimpleVertex(0, mtx.labels[i], i)
         new_vs.append(new_v0)
-        ref[(0, v.label)] = new_v0
+        ref[i] = new_v0
 
-        new_v1 = SimpleVertex(1, v.label)
+        new_v1 = SimpleVertex(1, mtx.labels[n + i], n + i)
         new_vs.append(new_v1)
-        ref[(1, v.label)] = new_v1
-
-        # --- record v in mtx ---
-        mtx[(0, v.label)] = {}
-        mtx[(1, v.label)] = {}
-        for nb in v.neighbours:
-            mtx[(0, v.label)][(0, nb.label)] = 1
-            mtx[(1, v.label)][(1, nb.label)] = 1
+        ref[n + i] = new_v1
 
     return new_vs, mtx, ref
 
 
 # tier 0
-def get_generating_set(D, I, other, matrix, reference, X, enable_m_test):
+def get_generating_set(D, I, other, matrix, reference, X, enable_m_test, workers=1, colors=None, strategy=None):
     """
     Require:
         - len(D) == len(I)
@@ -71,34 +302,69 @@ def get_generating_set(D, I, other, matrix, reference, X, enable_m_test):
         - D: a subset of vertices of a graph G
         - I: a subset of vertices of the same graph G
         - other: all the other vertices in the graphs of interest that do not have a bijection relationship yet
-        - matrix: adjacency matrix of the format { (graph_idx, label):   { (graph_idx, label):  1 } }
-        - reference: a reference dict to refer back to the simplevertex obj,
-              with format  { (graph_idx, label):  simple_vertex_obj }
+        - matrix: a CSRGraph of the disjoint union of G and G', see initialization_automorphism()
+        - reference: a reference list to refer back to the simplevertex obj, indexed by vertex id of matrix
         - X: a list of permutation found so far that forms automorphism
+        - workers: the number of worker processes to search the branches of this node with,
+                   None for one per core, 1 to search in this process, see generating_set_parallel()
+        - colors: optional initial colors of the vertices, see get_info()
+        - strategy: how the cell to branch on is chosen, see target_cells.py, None for the first cell
     Return:
         - number of isomorphisms between the (two) graphs of interest
         - X: a list of permutation that forms automorphism
     """
     # ===== [1] get info from D + I + other =====
-    init_info = get_info(D, I, other, True, matrix, reference)
+    init_info = get_info(D, I, other, True, matrix, reference, colors)
 
     # ===== [2] coarsest stable info under the assumption that D_i and I_i bijection =====
     st_info = color_refinement(init_info, True, matrix, reference)
 
+    if workers != 1 and is_trivial_path(D, I):
+        return generating_set_parallel(st_info, D, I, matrix, reference, X, enable_m_test, workers, colors,
+                                       strategy)
+
+    # the rest of the search tree refines incrementally from st_info
+    return generating_set_search(st_info, D, I, matrix, reference, X, enable_m_test, [], strategy)
+
+
+# tier 1
+def generating_set_search(st_info, D, I, matrix, reference, X, enable_m_test, trail, strategy=None):
+    """
+    The recursive part of get_generating_set().
+    Every child node starts from the stable info of its parent: the new pair (x, y) is individualized,
+    only the new color class is used to seed the refinement, and the changes are undone on backtrack.
+    Params:
+        - st_info: the coarsest stable info under the assumption that D_i and I_i bijection,
+                   it is modified during the call, but restored before returning
+        - trail: the list recording every split of st_info, see refine_info()
+        - see get_generating_set() for the other params
+    Return:
+        - number of isomorphisms between the (two) graphs of interest
+        - non_trivial_found: True if a non-trivial automorphism is found below this node, off the trivial path
+    """
+    stats = search_stats.current()
+    if stats is not None:
+        stats.nodes += 1
+
     # ===== [3] quick check =====
     bijection, unbalanced = check_balanced_bijection(st_info)
 
     # print("bijection: {}; unbalanced: {}".format(bijection, unbalanced))
 
     if unbalanced:
+        if stats is not None:
+            stats.dead_ends += 1
         return 0, False
     if bijection:
+        if stats is not None:
+            stats.leaves += 1
         trivial, perm_obj = process_bijection_info(st_info)
         # X.append(permutation(len(perm_list), mapping=perm_list))  # add the perm_list to X, regardless trivial or not
         if trivial:
             return 1, False      # non_trivial_found is False
         else:
             # print("non trivial found: {}".format(st_info))
+            num_gens = len(X)
             if enable_m_test:
                 if len(X) == 0:
                     X.append(perm_obj)  # perm_obj is the first perm ever
@@ -107,37 +373,109 @@ def get_generating_set(D, I, other, matrix, reference, X, enable_m_test):
                         X.append(perm_obj)  # add the perm_list to X
             else:
                 X.append(perm_obj)
+            if stats is not None:
+                stats.generators += len(X) - num_gens
             return 1, True
 
     # ===== [4] recursion comes into play when info is balanced =====
-    for key in st_info:
-        if len(st_info[key]) >= 4:
-            break
-
-    if len(D) == 0:
-        fromG, fromH = stratify_vertices(st_info[key])
-    else:
-        fromG, fromH = stratify_vertices(st_info[key], D[0].graph_idx)
+    fromG, fromH = branching_vertices(st_info, D, matrix, reference, strategy)
 
     x = fromG[0]
     num = 0
     reorder_fromH(x, fromH)
-    for y in fromH:
+
+    # on the trivial path (every vertex in D is mapped to its own copy) all branches are needed,
+    # except the ones whose y is in the same orbit as an explored y, under the automorphisms
+    # in X that fix D pointwise; below it, one automorphism per branch is enough
+    trivial_path = is_trivial_path(D, I)
+    fixed = [v.label for v in D]
+    num_gens = -1
+    explored = []
+    for i in range(len(fromH)):
+        y = fromH[i]
+        # pruning by orbits
+        if trivial_path:
+            if len(X) != num_gens:
+                num_gens = len(X)
+                orbit_of = stabilizer_orbits(X, fixed)
+                explored_orbits = set(orbit_of[label] for label in explored)
+            if orbit_of is not None and orbit_of[y.label] in explored_orbits:
+                if stats is not None:
+                    stats.pruned += 1
+                continue
+            explored.append(y.label)
+            if orbit_of is not None:
+                explored_orbits.add(orbit_of[y.label])
+
         new_D = D + [x]
         new_I = I + [y]
-        new_other = list(filter(lambda ele: ele is not x and ele is not y, other))
 
-        num_found, non_trivial_auto_found = get_generating_set(new_D, new_I, new_other, matrix, reference, X, enable_m_test)
+        mark = len(trail)
+        individualize_refine(st_info, x, y, True, matrix, reference, trail)
+        num_found, non_trivial_auto_found = generating_set_search(st_info, new_D, new_I, matrix, reference, X,
+                                                                  enable_m_test, trail, strategy)
+        undo_refinement(st_info, trail, mark)
         num += num_found
 
         # pruning
-        if non_trivial_auto_found:
-            # upon finding the first non-trivial automorphism, don't spawn more branches
-            break
+        if non_trivial_auto_found and not trivial_path:
+            # upon finding the first non-trivial automorphism off the trivial path, don't spawn more branches
+            if stats is not None:
+                stats.pruned += len(fromH) - i - 1
+            return num, True
 
     return num, False
 
 
+# tier 2
+def is_trivial_path(D, I):
+    """
+    Return True iff every vertex in D is mapped to the vertex with the same label in I.
+    """
+    for i in range(len(D)):
+        if D[i].label != I[i].label:
+            return False
+    return True
+
+
+# tier 2
+def stabilizer_orbits(X, fixed):
+    """
+    Params:
+        - X: a list of permutation object, indexed by vertex label
+        - fixed: a list of labels
+    Return:
+        - a list indexed by label, with a representative of the orbit of every label under the group generated by
+          the permutations in X that fix every label in <fixed>, or None if X is empty
+    """
+    if len(X) == 0:
+        return None
+    n = X[0].n
+    parent = list(range(n))
+
+    def find(v):
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+
+    for perm in X:
+        fixes_all = True
+        for label in fixed:
+            if perm[label] != label:
+                fixes_all = False
+                break
+        if not fixes_all:
+            continue
+        for v in range(n):
+            a = find(v)
+            b = find(perm[v])
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+    return [find(v) for v in range(n)]
+
+
 # tier 1
 def reorder_fromH(x, fromH):
     """
@@ -199,22 +537,13 @@ def is_trivial(perm_list):
 # tier 0
 def order_computing(X):
     """
+    Compute |<X>| with a stabilizer chain built by random Schreier-Sims, see permutation_group.py.
     Params:
         - X: a list of permutation object
     """
-    # base case, trivial generating set
     if len(X) == 0:
         return 1
-
-    # find the element with its |orbit| >= 2
-    for ele in X[0].P:
-        O = Orbit(X, ele)
-        if len(O) >= 2:
-            break
-
-    new_gen_set = Stabilizer(X, ele)
-
-    return len(O) * order_computing(new_gen_set)
+    return PermutationGroup(X).order()
 
 
 # tier 1
@@ -228,25 +557,26 @@ def membership_testing(X, permu: "permutation"):
     """
     if permu.istrivial():
         return True
+    if len(X) == 0:
+        return False
 
     # find the element with its |orbit| >= 2
+    # the transversal is a Schreier vector, so only the one coset representative needed is built
     for alpha in range(len(permu.P)):
-        O, U = Orbit(X, alpha, True)
+        O, U = Orbit(X, alpha, True, True)
         if len(O) >= 2:
             break
 
 
-    # if there is no element with its |orbit| >= 2, must be trivial mapping
+    # if there is no element with its |orbit| >= 2, <X> is trivial, and permu is not
     if len(O) == 1:
-        return True
+        return False
 
 
     image = permu[alpha]
-    for i in range(len(O)):
-        if image == O[i]:
-            return membership_testing( Stabilizer(X, alpha),  -U[i] * permu)
-
-    return False
+    if image not in U:
+        return False
+    return membership_testing(Stabilizer(X, alpha, True), -U.representative(image) * permu)
 
 
 # ================ end of wk6 ================
@@ -261,27 +591,42 @@ def membership_testing(X, permu: "permutation"):
 
 
 # tier 0
-def extract_vertices(lst_graphs, lst_idx) -> List["Vertex"]:
+def extract_vertices(lst_graphs, lst_idx) -> List["SimpleVertex"]:
     """
     Given a list of graphs, and a list of indexes, extract all the vertices of the graphs of interest,
-    in the process add an attr v.graph_idx to each vertex.
+    as copies with v.graph_idx and v.neighbours, see copy_vertices(). The Vertex objects are left untouched.
     Params:
         - lst_graphs: a list of graph object
         - lst_idx: a list of indices of all the graph of interest
     Return:
         - a list of vertices that comes from disjoint union of all the graphs of interest
     """
-    target_vertices = []
-    for idx in lst_idx:
-        # init v.graph_idx
-        for v in lst_graphs[idx].vertices:
-            v.graph_idx = idx
-        target_vertices.extend(lst_graphs[idx].vertices)
-    return target_vertices
+    _, ref = copy_vertices([lst_graphs[idx] for idx in lst_idx], lst_idx)
+    return ref
 
 
 # tier 0
-def count_isomorphism(D, I, other, stop_at_first_iso = False):
+def initialization_isomorphism(lst_graphs, lst_idx):
+    """
+    The CSRGraph counterpart of extract_vertices(), the Vertex objects of the graphs are left untouched.
+    Params:
+        - lst_graphs: a list of graph object
+        - lst_idx: a list of indices of all the graph of interest
+    Return:
+        - new_vs: a list of SimpleVertex that comes from disjoint union of all the graphs of interest
+        - mtx: a CSRGraph of the disjoint union of all the graphs of interest
+        - ref: a reference list to refer back to the simplevertex obj, indexed by vertex id of mtx
+    """
+    mtx = csr_from_graphs([lst_graphs[idx] for idx in lst_idx], lst_idx)
+    new_vs = []
+    for i in range(mtx.n):
+        new_vs.append(SimpleVertex(mtx.graph_idx[i], mtx.labels[i], i))
+    return new_vs, mtx, new_vs
+
+
+# tier 0
+def count_isomorphism(D, I, other, stop_at_first_iso = False, matrix = None, reference = None, workers = 1,
+                      colors = None, strategy = None):
     """
     Require:
         - len(D) == len(I)
@@ -291,17 +636,48 @@ def count_isomorphism(D, I, other, stop_at_first_iso = False):
         - I: a subset of vertices of another graph H
         - other: all the other vertices in the graphs of interest that do not have a bijection relationship yet
         - stop_at_first_iso: True if you are satisfied as long as there is 1 iso
+        - matrix, reference: a CSRGraph and reference list from initialization_isomorphism(),
+          if given, D, I and other are SimpleVertex and the neighbours are looked up in matrix
+        - workers: the number of worker processes to search the top levels of the tree with (needs matrix),
+                   None for one per core, 1 to search in this process, see count_isomorphism_parallel()
+        - colors: optional initial colors of the vertices, see get_info()
+        - strategy: how the cell to branch on is chosen, see target_cells.py, None for the first cell
     Return:
         - number of isomorphisms between the (two) graphs of interest
     """
+    use_mtx = matrix is not None
+
     # print("one call")
     # print("len(D) is {}; len(I) is {}".format(len(D), len(I)))
 
     # ===== [1] get info from D + I + other =====
-    info = get_info(D, I, other)
+    info = get_info(D, I, other, use_mtx, matrix, reference, colors)
 
     # ===== [2] coarsest stable info under the assumption that D_i and I_i bijection =====
-    st_info = color_refinement(info)
+    st_info = color_refinement(info, use_mtx, matrix, reference)
+
+    if workers != 1 and use_mtx:
+        return count_isomorphism_parallel(st_info, D, I, stop_at_first_iso, matrix, reference, workers, colors,
+                                          strategy)
+
+    return count_isomorphism_search(st_info, D, I, stop_at_first_iso, use_mtx, matrix, reference, [], strategy)
+
+
+# tier 1
+def count_isomorphism_search(st_info, D, I, stop_at_first_iso, use_mtx, matrix, reference, trail, strategy=None):
+    """
+    The recursive part of count_isomorphism(), refining incrementally from st_info,
+    see generating_set_search().
+    Return:
+        - number of isomorphisms between the (two) graphs of interest
+    """
+    # in a worker of count_isomorphism_parallel(), another task found an isomorphism already
+    if cancel_event is not None and cancel_event.is_set():
+        return 0
+
+    stats = search_stats.current()
+    if stats is not None:
+        stats.nodes += 1
 
     # ===== [3] quick check =====
     bijection, unbalanced = check_balanced_bijection(st_info)
@@ -309,40 +685,195 @@ def count_isomorphism(D, I, other, stop_at_first_iso = False):
     # print("bijection: {}; unbalanced: {}".format(bijection, unbalanced))
 
     if unbalanced:
+        if stats is not None:
+            stats.dead_ends += 1
         return 0
     if bijection:
+        if stats is not None:
+            stats.leaves += 1
         return 1
 
     # ===== [4] recursion comes into play when info is balanced =====
-    for key in st_info:
-        if len(st_info[key]) >= 4:
-            break
-
-    if len(D) == 0:
-        fromG, fromH = stratify_vertices(st_info[key])
-    else:
-        fromG, fromH = stratify_vertices(st_info[key], D[0].graph_idx)
+    fromG, fromH = branching_vertices(st_info, D, matrix, reference, strategy)
 
     x = fromG[0]
     num = 0
-    for y in fromH:
-        new_other = list(filter(lambda ele: ele is not x and ele is not y, other))
+    for i in range(len(fromH)):
+        y = fromH[i]
         new_D = D + [x]
         new_I = I + [y]
-        num += count_isomorphism(new_D, new_I, new_other, stop_at_first_iso)
+
+        mark = len(trail)
+        individualize_refine(st_info, x, y, use_mtx, matrix, reference, trail)
+        num += count_isomorphism_search(st_info, new_D, new_I, stop_at_first_iso, use_mtx, matrix, reference, trail,
+                                        strategy)
+        undo_refinement(st_info, trail, mark)
+
         # enable this line when want to stop as far as there is ONE isomorphism
         if stop_at_first_iso:
             if num == 1:
+                if stats is not None:
+                    stats.pruned += len(fromH) - i - 1
                 break
 
     return num
 
 
+# tier 2
+def individualize_refine(info, x, y, use_mtx, matrix, reference, trail):
+    """
+    Assume x and y (of the same color) have a bijection relationship:
+    move x and y from their color class into a new color class of their own,
+    and refine info to the coarsest stable info, with only the new color class in the work queue.
+    Require:
+        - info is stable, and the color class of x and y has more than 2 vertices
+    """
+    old_color = x.colornum
+    new_color = max(info.keys()) + 1
+
+    info[old_color] = [v for v in info[old_color] if v is not x and v is not y]
+    info[new_color] = [x, y]
+    x.colornum = new_color
+    y.colornum = new_color
+    trail.append((old_color, new_color, [x, y]))
+
+    refine_info(info, [new_color], use_mtx, matrix, reference, trail, new_color + 1)
+
+
+# tier 2
+def refine_info(info, queue, use_mtx, matrix, reference, trail, next_color):
+    """
+    Refine info in place, in the way of wk5 fast refinement:
+    for every color C popped from the queue, only the neighbours of C are visited,
+    and every color class is split by the number of neighbours its vertices have in C.
+    Every split is recorded in trail as (old_color, new_color, [list_of_vertices_moved_to_new_color]),
+    so that undo_refinement() can restore info.
+    Params:
+        - queue: a list of colors to refine with
+        - next_color: the smallest color label that is not used in info
+    """
+    queue = deque(queue)
+    in_q = set(queue)
+    first_color = next_color
+    rounds = 0
+
+    while len(queue) > 0:
+        C = queue.popleft()
+        in_q.discard(C)
+        rounds += 1
+
+        # ===== [1] count the neighbours in C, {vertex: num_of_nb_in_C} =====
+        if use_mtx:
+            nb_count = count_neighbours_csr(info[C], matrix, reference)
+        else:
+            nb_count = {}
+            for v in info[C]:
+                for nb in v.neighbours:
+                    if nb in nb_count:
+                        nb_count[nb] += 1
+                    else:
+                        nb_count[nb] = 1
+
+        # ===== [2] {color: {num_of_nb_in_C: [list_of_vertices]}} of the vertices adjacent to C =====
+        L_v = {}
+        for v in nb_count:
+            if v.colornum not in L_v:
+                L_v[v.colornum] = {}
+            if nb_count[v] not in L_v[v.colornum]:
+                L_v[v.colornum][nb_count[v]] = [v]
+            else:
+                L_v[v.colornum][nb_count[v]].append(v)
+
+        # ===== [3] split, the colors and counts are handled in sorted order to keep it deterministic =====
+        for old_color in sorted(L_v):
+            parts = []
+            num_touched = 0
+            for i in sorted(L_v[old_color]):
+                parts.append(L_v[old_color][i])
+                num_touched += len(L_v[old_color][i])
+
+            if num_touched == len(info[old_color]):
+                if len(parts) == 1:
+                    continue
+                # the largest part stays in old_color
+                largest = 0
+                for i in range(1, len(parts)):
+                    if len(parts[i]) > len(parts[largest]):
+                        largest = i
+                parts.pop(largest)
+
+            new_colors = []
+            for part in parts:
+                for v in part:
+                    v.colornum = next_color
+                info[next_color] = part
+                trail.append((old_color, next_color, part))
+                new_colors.append(next_color)
+                next_color += 1
+            info[old_color] = [v for v in info[old_color] if v.colornum == old_color]
+
+            # ===== [4] update queue: all new colors, or all but the largest one =====
+            if old_color in in_q:
+                to_add = new_colors
+            else:
+                largest = old_color
+                for color in new_colors:
+                    if len(info[color]) > len(info[largest]):
+                        largest = color
+                to_add = [old_color] + new_colors
+                to_add.remove(largest)
+            for color in to_add:
+                queue.append(color)
+                in_q.add(color)
+
+    stats = search_stats.current()
+    if stats is not None:
+        stats.refinement_rounds += rounds
+        stats.refinement_splits += next_color - first_color
+
+
+# tier 3
+def count_neighbours_csr(cell, matrix, reference):
+    """
+    (Mostly for internal use.)
+    Return {vertex: num_of_nb_in_cell} for a list of SimpleVertex cell, where matrix is a CSRGraph and
+    reference[i] is the SimpleVertex of id i. The neighbours are counted by vertex id on the slices of matrix.nbs,
+    only the vertices adjacent to the cell are looked up in reference.
+    """
+    offsets = matrix.offsets
+    nbs = matrix.nbs
+    id_count = {}
+    for v in cell:
+        for key in nbs[offsets[v.idx]:offsets[v.idx + 1]]:
+            if key in id_count:
+                id_count[key] += 1
+            else:
+                id_count[key] = 1
+    return {reference[key]: count for key, count in id_count.items()}
+
+
+# tier 2
+def undo_refinement(info, trail, mark):
+    """
+    Undo every split recorded in trail after position mark, in reverse order.
+    """
+    while len(trail) > mark:
+        old_color, new_color, moved = trail.pop()
+        for v in moved:
+            v.colornum = old_color
+        info[old_color].extend(moved)
+        del info[new_color]
+
+
 # tier 1
-def get_info(D, I, other, use_mtx = False, matrix = None, reference = None):
+def get_info(D, I, other, use_mtx = False, matrix = None, reference = None, colors = None):
     """
     Adding v.colornum and v.nb attr to each vertex of D + I + other,
     and organize D + I + other into an info dict.
+    Params:
+        - colors: optional list of non-negative ints indexed by vertex id of matrix (so use_mtx is True),
+                  the initial colors of the vertices in other, e.g. the twin class colors of twins.TwinQuotient.
+                  By default they all get color 0.
     """
     info = {}
     next_color = 1
@@ -357,17 +888,28 @@ def get_info(D, I, other, use_mtx = False, matrix = None, reference = None):
             next_color += 1
 
     # all the other vertices are colored 0
-    for v in other:
-        v.colornum = 0
-    info[0] = other
+    if colors is None:
+        for v in other:
+            v.colornum = 0
+        info[0] = other
+    else:
+        # color c > 0 comes after the colors of D and I
+        for v in other:
+            c = colors[v.idx]
+            if c > 0:
+                c += next_color - 1
+            v.colornum = c
+            if c in info:
+                info[c].append(v)
+            else:
+                info[c] = [v]
 
     # add v.nb to v in D + I + other
-    for v in D:
-        add_v_nb(v, use_mtx, matrix, reference)
-    for v in I:
-        add_v_nb(v, use_mtx, matrix, reference)
-    for v in other:
-        add_v_nb(v, use_mtx, matrix, reference)
+    if use_mtx:
+        add_nb_csr([D, I, other], matrix, reference)
+    else:
+        for v in D + I + other:
+            add_v_nb(v, use_mtx, matrix, reference)
     return info
 
 
@@ -393,8 +935,11 @@ def add_v_nb(v, use_mtx, matrix, reference):
 
 # tier 3
 def add_v_nb_use_mtx(v, mtx, ref):
+    """
+    Add v.nb attr for a SimpleVertex v, where mtx is a CSRGraph and ref[i] is the SimpleVertex of id i.
+    """
     v.nb = {}
-    for key in mtx[(v.graph_idx, v.label)]:
+    for key in mtx.neighbours(v.idx):
         nb = ref[key]
         if nb.colornum not in v.nb:
             v.nb[nb.colornum] = 1
@@ -402,6 +947,32 @@ def add_v_nb_use_mtx(v, mtx, ref):
             v.nb[nb.colornum] += 1
 
 
+# tier 3
+def add_nb_csr(groups, mtx, ref):
+    """
+    Add v.nb attr for every SimpleVertex v in the lists of groups, which hold every vertex of the CSRGraph mtx,
+    where ref[i] is the SimpleVertex of id i.
+    The colors are copied once into a list indexed by vertex id, and the neighbours are read from the slices of
+    mtx.nbs, so no SimpleVertex of a neighbour is looked up.
+    """
+    color = [0] * len(ref)
+    for group in groups:
+        for v in group:
+            color[v.idx] = v.colornum
+    offsets = mtx.offsets
+    nbs = mtx.nbs
+    for group in groups:
+        for v in group:
+            nb = {}
+            for key in nbs[offsets[v.idx]:offsets[v.idx + 1]]:
+                c = color[key]
+                if c in nb:
+                    nb[c] += 1
+                else:
+                    nb[c] = 1
+            v.nb = nb
+
+
 
 # tier 1
 def check_balanced_bijection(info):
@@ -501,19 +1072,17 @@ def stratify_vertices(lst_vertices, g = None):
 
 
 # tier 2
-def init_single_graph(a: "Graph", idx: int):
+def init_single_graph(vertices: List["SimpleVertex"]):
     """
-    Adds 3 fields to a vertex:
+    Adds 2 fields to the copies of the vertices of the graphs, see copy_vertices():
     - v.colornum: the color of the vertex
-    - v.graph_idx: the graph(int) this vertex belongs to
     - v.nb: dictionary recording neighboring information of the vertex, where the neighbor information is {color_of_neighbor: num_of_nb_of_that_color}
     """
-    for v in a.vertices:
+    for v in vertices:
         v.colornum = v.degree
-        v.graph_idx = idx
 
     # v.nb = {degree_of_nb: number_of_nb_with_that_degree, .....}
-    for v in a.vertices:
+    for v in vertices:
         v.nb = {}
         for neighbor in v.neighbours:
             if neighbor.degree not in v.nb:
@@ -524,9 +1093,13 @@ def init_single_graph(a: "Graph", idx: int):
 
 # tier 0
 def initialization(graphs: List["Graph"]):
-    # init each graph by adding 3 attr to each vertex of each graph
-    for i in range(len(graphs)):
-        init_single_graph(graphs[i], i)
+    """
+    The graphs are represented by copies of their vertices, see copy_vertices(), so the Vertex objects are left
+    untouched: the same graphs can be used by several runs at once, and the state of a run is gone with its info.
+    """
+    mtx, ref = copy_vertices(graphs)
+    # init the graphs by adding 2 attr to each copy of a vertex
+    init_single_graph(ref)
 
     # organize graph into info
     # info is a dictionary of format {color1: [list_of_vertices_of_this_color_regardless_of_which_graph_they_belong_to],
@@ -534,52 +1107,113 @@ def initialization(graphs: List["Graph"]):
     #                                 color3: [list_of_vertices_of_this_color_regardless_of_which_graph_they_belong_to],
     #                                }
     info = {}
-    for graph in graphs:
-        for v in graph.vertices:
-            if v.colornum not in info:
-                info[v.colornum] = [v]
-            else:
-                info[v.colornum].append(v)
+    for v in ref:
+        if v.colornum not in info:
+            info[v.colornum] = [v]
+        else:
+            info[v.colornum].append(v)
 
     return info
 
 
+# tier 1
+def copy_vertices(graphs: List["Graph"], graph_indices=None):
+    """
+    Make a copy of every vertex of the graphs, for the algorithms that work on vertex objects (v.neighbours)
+    instead of a CSRGraph. All the state of a run (v.colornum, v.nb, ...) is set on the copies,
+    so the Graph and Vertex objects are only read.
+    Params:
+        - graph_indices: the v.graph_idx of the copies of each graph, default 0...len(graphs)-1
+    Return:
+        - mtx: a CSRGraph of the disjoint union of the graphs, see csr_from_graphs()
+        - ref: a list of SimpleVertex indexed by vertex id of mtx, with v.graph_idx, v.label, v.idx and
+               v.neighbours, the list of the copies of the neighbours
+    """
+    mtx = csr_from_graphs(graphs, graph_indices)
+    ref = []
+    for i in range(mtx.n):
+        ref.append(SimpleVertex(mtx.graph_idx[i], mtx.labels[i], i))
+    for v in ref:
+        v.neighbours = [ref[key] for key in mtx.neighbours(v.idx)]
+    return mtx, ref
+
+
+# tier 0
+def initialization_csr(graphs: List["Graph"]):
+    """
+    The CSRGraph counterpart of initialization(), the Vertex objects of the graphs are left untouched.
+    Each graph is represented by SimpleVertex objects with v.colornum = 2 * degree (+ 1 for a dense graph)
+    and v.nb initialized, to be refined by color_refinement(info, True, mtx, ref).
+    Dense graphs are refined as their complement, which has the same stable coloring with fewer edges,
+    see csr_graph.sparse_side(). The odd colors keep them apart from the graphs that are not complemented.
+    Return:
+        - info: same format as initialization()
+        - mtx: a CSRGraph of the disjoint union of all the graphs (dense ones complemented)
+        - ref: a reference list to refer back to the simplevertex obj, indexed by vertex id of mtx
+    """
+    parts = [sparse_side(csr_from_graphs([g])) for g in graphs]
+    mtx = csr_disjoint_union([part for part, _ in parts])
+    ref = []
+    info = {}
+    for i in range(mtx.n):
+        v = SimpleVertex(mtx.graph_idx[i], mtx.labels[i], i)
+        v.colornum = 2 * mtx.degree(i) + parts[mtx.graph_idx[i]][1]
+        ref.append(v)
+        if v.colornum not in info:
+            info[v.colornum] = [v]
+        else:
+            info[v.colornum].append(v)
+
+    # v.nb = {degree_of_nb: number_of_nb_with_that_degree, .....}
+    add_nb_csr([ref], mtx, ref)
+
+    return info, mtx, ref
+
+
 # tier 1
 def typify_group(group):
-    # recording the definition of each type: {type: nb_dict}
-    type_definition = {}
-    # recording the type-vertices relationship: {type: [list_of_vertices_of_this_type]}
-    type_vertices = {}
+    """
+    Group the vertices of a color class by their neighborhood information v.nb, in one pass over the group.
+    Each v.nb is turned into a hashable signature, so a vertex is typified by one dict lookup,
+    instead of comparing its v.nb against every type seen so far.
+    The types are numbered in sorted order of their signatures, so the numbering only depends on
+    the neighborhood information, not on the order of the vertices in group.
+    Return:
+        - type_definition: {type: nb_dict}
+        - type_vertices: {type: [list_of_vertices_of_this_type]}
+    """
+    # recording the vertices of each signature: {signature: [list_of_vertices_of_this_signature]}
+    signature_vertices = {}
+    for v in group:
+        signature = nb_signature(v.nb)
+        if signature not in signature_vertices:
+            signature_vertices[signature] = [v]
+        else:
+            signature_vertices[signature].append(v)
 
     # a dict of format {type_num: {color_of_neighbor: num_of_nb_of_that_color}
-    type_definition[0] = group[0].nb
+    type_definition = {}
     # a dict of format {type_num: [list_of_vertices_of_this_type_regardless_of_which_graph_they_belong_to]}
-    type_vertices[0] = [group[0]]
-
-    next_type = 1
-    # iter check vertices v_2 to v_n of this group
-    for i in range(1, len(group)):
-        target_vertex = group[i]
-        typified = False
-        # if the vertex match one of the existing type
-        # record the vertex in type_ver
-        for type_key in type_definition:
-            if same_dict_value(type_definition[type_key], target_vertex.nb):
-                type_vertices[type_key].append(target_vertex)
-                typified = True
-                break  #
-            else:
-                pass
-        # if the vertex does not match any existing type
-        # record this new type in type_def
-        # record the vertex in the type_ver
-        if not typified:
-            type_definition[next_type] = target_vertex.nb
-            type_vertices[next_type] = [target_vertex]
-            next_type += 1
+    type_vertices = {}
+
+    next_type = 0
+    for signature in sorted(signature_vertices):
+        type_definition[next_type] = signature_vertices[signature][0].nb
+        type_vertices[next_type] = signature_vertices[signature]
+        next_type += 1
     return type_definition, type_vertices
 
 
+# tier 2
+def nb_signature(nb):
+    """
+    Params: nb is a dictionary of neighborhood infomation of the format {color_of_nb: num_of_nb_of_this_color}
+    Return: a sorted tuple of (color_of_nb, num_of_nb_of_this_color) pairs,
+            two nb dicts have the same value if and only if they have the same signature.
+    """
+    return tuple(sorted(nb.items()))
+
+
 # tier 0 & tier 2
 def same_dict_value(nb1, nb2):
     """
@@ -606,19 +1240,19 @@ def update_nb(new_info, use_mtx, matrix, reference):
     update v.nb field for all the vertice in the graph
     v.nb = {color_of_nb: number_of_nb_with_that_color, .....}
     """
+    if use_mtx:
+        # adding v.nb using adj.matrix
+        add_nb_csr(list(new_info.values()), matrix, reference)
+        return
     for color_key in new_info:
         for v in new_info[color_key]:
-            if not use_mtx:
-                # adding v.nb using v.neighbours
-                v.nb = {}
-                for neighbor in v.neighbours:
-                    if neighbor.colornum not in v.nb:
-                        v.nb[neighbor.colornum] = 1
-                    else:
-                        v.nb[neighbor.colornum] += 1
-            else:
-                # adding v.nb using adj.matrix
-                add_v_nb_use_mtx(v, matrix, reference)
+            # adding v.nb using v.neighbours
+            v.nb = {}
+            for neighbor in v.neighbours:
+                if neighbor.colornum not in v.nb:
+                    v.nb[neighbor.colornum] = 1
+                else:
+                    v.nb[neighbor.colornum] += 1
 
 
 # tier 0
@@ -642,10 +1276,13 @@ def color_refinement(info, use_mtx=False, matrix=None, reference=None):
     """
 
     next_color = max(info.keys()) + 1
+    first_color = next_color
+    rounds = 0
 
     new_info = {}
     while True:
         change = False
+        rounds += 1
 
         for color_key in sorted(info.keys()):
             group = info[color_key]
@@ -683,6 +1320,11 @@ def color_refinement(info, use_mtx=False, matrix=None, reference=None):
         # nothing changed, has reach stable coloring, break
         else:
             break
+
+    stats = search_stats.current()
+    if stats is not None:
+        stats.refinement_rounds += rounds
+        stats.refinement_splits += next_color - first_color
     return info
 
 
@@ -54,8 +54,8 @@ start = datetime.now()
 
 
 # color refinement
-init_info = initialization(list_of_graphs)
-info = color_refinement(init_info)
+init_info, matrix, reference = initialization_csr(list_of_graphs)
+info = color_refinement(init_info, True, matrix, reference)
 
 # processing result
 num_graphs = len(list_of_graphs)
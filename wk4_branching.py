@@ -45,9 +45,10 @@ print("{} contains {} graphs, each {} vertices".format(filename, len(G[0]), len(
 # ========== test on specific pair of graph ==========
 p = 0
 q = 6
-v = extract_vertices(G[0], [p, q])
+v, matrix, reference = initialization_isomorphism(G[0], [p, q])
 
-print("{}: graph {} and graph {} has {} isomorphism ".format(filename, p, q, count_isomorphism([], [], v)))
+print("{}: graph {} and graph {} has {} isomorphism ".format(filename, p, q,
+                                                          count_isomorphism([], [], v, False, matrix, reference)))
 
 end = datetime.now()
 print("It took {} seconds to compute".format(end - start))
@@ -1,6 +1,7 @@
 from graph_io import write_dot, load_graph
 from utilities import *
 from datetime import datetime
+from collections import deque
 
 
 # whenever update dlls, also update dlls_len
@@ -8,20 +9,19 @@ from datetime import datetime
 
 # ================== temp section ==================
 
-def init_single_graph_fast_refinement(g: "Graph", idx: int):
+def init_single_graph_fast_refinement(vertices: List["SimpleVertex"]):
     """
-    Add two attr to each vertice of a graph:
+    Add one attr to each copy of a vertex, see utilities.copy_vertices() (which already set v.graph_idx):
     - v.colornum
-    - v.graph_idx
     """
-    for v in g.vertices:
+    for v in vertices:
         v.colornum = v.degree
-        v.graph_idx = idx
 
 # tier 0
 def initialization_fast_refinement(graphs: List["Graph"]):
     """
-    Add 4 attr to each vertex, and summarize some overview of the entire disjoint union of all graphs.
+    Add 3 attr to each copy of a vertex, and summarize some overview of the entire disjoint union of all graphs.
+    The vertices are copies, see utilities.copy_vertices(), so the Graph and Vertex objects are left untouched.
     Return:
         - dlls, a dictionary dll of each color, with format:
                 {color1: the_first_vertex_of_color1_regardless_of_which_graph_it_belongs_to,
@@ -36,8 +36,8 @@ def initialization_fast_refinement(graphs: List["Graph"]):
                }
        - all_vertices, a list of all vertices regardless of which graph they belong to.
     """
-    for i in range(len(graphs)):
-        init_single_graph_fast_refinement(graphs[i], i)
+    _, all_vertices = copy_vertices(graphs)
+    init_single_graph_fast_refinement(all_vertices)
 
     # organize graph into dlls
 
@@ -45,21 +45,17 @@ def initialization_fast_refinement(graphs: List["Graph"]):
     dlls = {}
     # dlls_len is recording the lenth of each dll in dlls
     dlls_len = {}
-    # a list of all vertices in the disjoint union of all graphs
-    all_vertices = []
     # init biggest color label
     max_color = 0
-    for graph in graphs:
-        all_vertices.extend(graph.vertices)
-        for v in graph.vertices:
-            if v.colornum not in dlls:
-                # add v as the first ele in the dll of its color
-                dlls[v.colornum] = create_new_dll_head(v)
-                dlls_len[v.colornum] = 1
-            else:
-                # insert v to the start of an existing, non-empty dll of its color
-                dlls[v.colornum] = insert_new_head(dlls[v.colornum], v)
-                dlls_len[v.colornum] += 1
+    for v in all_vertices:
+        if v.colornum not in dlls:
+            # add v as the first ele in the dll of its color
+            dlls[v.colornum] = create_new_dll_head(v)
+            dlls_len[v.colornum] = 1
+        else:
+            # insert v to the start of an existing, non-empty dll of its color
+            dlls[v.colornum] = insert_new_head(dlls[v.colornum], v)
+            dlls_len[v.colornum] += 1
 
     next_color = max(dlls.keys()) + 1
 
@@ -108,10 +104,10 @@ def init_queue(init_dlls):
     Params:
         - init_dlls, the initial dlls
     Return:
-        - q, a list recording every color_key in dlls, apart from the first key
+        - q, a deque recording every color_key in dlls, apart from the first key
         - in_q, a dict of {color_key: whether_this_color_is_in_q}
     """
-    q = []
+    q = deque()
     in_q = {}
     is_first = True
     for key in init_dlls:
@@ -126,91 +122,107 @@ def init_queue(init_dlls):
 
 
 def pop_queue_head(q, in_q):
-    head = q.pop(0)
+    head = q.popleft()
     in_q[head] = False
     return head
 
 
-def update_queue(q, in_q, old_color, new_color):
+def update_queue(q, in_q, old_color, new_colors, sizes):
     """
     Params:
-        - q: the queue, a list of color class
+        - q: the queue, a deque of color class
         - in_q: whether a color is in queue, a dict of {color_class: whether_this_color_is_in_queue}
-        - old_color, new_color: some vertices of old_color is going to be split into a new_color, and the rest remains
+        - old_color, new_colors: some vertices of old_color have been split into each of new_colors, and the rest remains
+        - sizes: a dict of {color: size} of old_color and each of new_colors after the split
     """
-    if old_color in in_q:
-        # if in_q has recorded old_color as one of its key,
-        # then add new_color to queue
-        q.append(new_color)
-        in_q[new_color] = True
+    if in_q.get(old_color, False):
+        # if old_color is in queue,
+        # then add all the new_colors to queue
+        to_add = new_colors
     else:
-        # in_q has NOT recorded old_color as one of its key,
-        # then add the smaller one of old_color and new_color to queue
-        to_add = min(old_color, new_color)
-        q.append(to_add)
-        in_q[to_add] = True
-
-
-def refine_color(color, dlls, dlls_len, all_vertices, q, in_q):
-    max_num_nb = dlls_len[color]
-    for i in range(0, max_num_nb + 1):
-        # print("========================= one call to refine(C, i) =========================")
-        # print("C is {}; i is {}".format(color, i))
-        refine_color_numnb_pair(color, i, dlls, dlls_len, all_vertices, q, in_q)
-
-
-def refine_color_numnb_pair(C, i, dlls, dlls_len, all_vertices, q, in_q):
-
-    # ===== [1] get a list of vertices that have i neighbors of color C =====
-    # O(n^2)
-    D = list(filter(lambda v: if_v_has_i_nb_in_C(v, i, C), all_vertices))
+        # old_color is NOT in queue,
+        # then add all but the largest one of old_color and new_colors to queue
+        largest = old_color
+        for color in new_colors:
+            if sizes[color] > sizes[largest]:
+                largest = color
+        to_add = [old_color] + new_colors
+        to_add.remove(largest)
+
+    for color in new_colors:
+        in_q[color] = False
+    for color in to_add:
+        q.append(color)
+        in_q[color] = True
+
+
+def refine_color(color, dlls, dlls_len, all_vertices, q, in_q, next_color):
+    """
+    Refine every color class that has a neighbour in color, by the number of neighbours in color.
+    Only the neighbours of the vertices in color are visited, instead of filtering all_vertices once per i.
+    Return:
+        - next_color: the smallest color label that is not used yet
+    """
+    # ===== [1] count the neighbours in color C of every vertex adjacent to C =====
+    # a dict of format {vertex: num_of_nb_in_C}
+    nb_count = {}
+    current = dlls[color]
+    while current is not None:
+        for nb in current.neighbours:
+            if nb in nb_count:
+                nb_count[nb] += 1
+            else:
+                nb_count[nb] = 1
+        current = current.next
 
     # ===== [2] prepare the material to decide whether a color class is splittable =====
-    # a dict of format {potentially_splittable_color: [list_of_vertices_in_D_of_this_color]}
+    # a dict of format {potentially_splittable_color: {i: [list_of_vertices_of_this_color_with_i_nb_in_C]}}
     L_v = {}
-    # a dict of format {potentially_splittable_color: num_of_v_in_D_of_this_color}
-    L_len = {}
-    for v in D:
+    for v in nb_count:
         if v.colornum not in L_v:
-            L_v[v.colornum] = [v]
-            L_len[v.colornum] = 1
+            L_v[v.colornum] = {}
+        if nb_count[v] not in L_v[v.colornum]:
+            L_v[v.colornum][nb_count[v]] = [v]
         else:
-            L_v[v.colornum].append(v)
-            L_len[v.colornum] += 1
-
+            L_v[v.colornum][nb_count[v]].append(v)
 
     # ===== [3] split the splittable color class =====
-    for old_color in L_v:
-        # print("===== one iter over a old_color =====")
-        # print("L_len: {}".format(L_len))
-        # print("dlls_len: {}".format(dlls_len))
-        # print("target color in L_v: {}".format(old_color))
-
-        # do the following things only when old_color is splittable
-        if L_len[old_color] < dlls_len[old_color]:
-            # === [3.1] generate new color label ===
-            new_color = max(dlls_len.keys()) + 1
-            # print("----- this old_color is to be splitted -----")
-            # print("L_len[old_color]: {}; dlls_len[old_color]: {}".format(L_len[old_color], dlls_len[old_color]))
-            # print("old_color: {}; new_color: {}".format(old_color, new_color))
-
-            # === [3.2] update q, in_q ===
-            # print("before update_queue, q: {}; in_q: {}".format(q, in_q))
-
-            update_queue(q, in_q, old_color, new_color)
-
-            # print("after update_queue, q: {}; in_q: {}".format(q, in_q))
-
-            # === [3.3] move every v in L_v[old_color] from dlls[old_color] to dlls[new_color] ===
-            # === in the process also update v.colornum ===
-            for v in L_v[old_color]:
-                # print("going to move this vertex: {}".format(v))
+    for old_color in sorted(L_v):
+        parts = []
+        num_touched = 0
+        for i in sorted(L_v[old_color]):
+            parts.append(L_v[old_color][i])
+            num_touched += len(L_v[old_color][i])
+
+        if num_touched == dlls_len[old_color]:
+            if len(parts) == 1:
+                # not splittable
+                continue
+            # every vertex is adjacent to C, the largest part stays in old_color
+            largest = 0
+            for i in range(1, len(parts)):
+                if len(parts[i]) > len(parts[largest]):
+                    largest = i
+            parts.pop(largest)
+
+        # === [3.1] move every v of each part from dlls[old_color] to dlls[new_color] ===
+        # === in the process also update v.colornum ===
+        new_colors = []
+        sizes = {}
+        for part in parts:
+            new_color = next_color
+            next_color += 1
+            for v in part:
                 dlls[v.colornum] = remove_v_from_old_dll(v, dlls)   # if v is the head, then after rm v, head has changed
                 add_v_to_new_dll(v, dlls, new_color)
-                # move_v_to_new_dll(v, dlls, old_color, new_color)
+            new_colors.append(new_color)
+            sizes[new_color] = len(part)
+        sizes[old_color] = dlls_len[old_color]
 
-        else:
-            pass
+        # === [3.2] update q, in_q ===
+        update_queue(q, in_q, old_color, new_colors, sizes)
+
+    return next_color
 
 
 def remove_v_from_old_dll(v, dlls):
@@ -404,7 +416,7 @@ while len(q) > 0:
     # print("color {} popped out of queue".format(C))
     # print("now queue is: {}; in_queue is: {}".format(q, in_q))
 
-    refine_color(C, dlls, dlls_len, all_vertices, q, in_q)
+    next_color = refine_color(C, dlls, dlls_len, all_vertices, q, in_q, next_color)
 
 
 end = datetime.now()
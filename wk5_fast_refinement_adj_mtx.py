@@ -1,6 +1,7 @@
 from graph_io import write_dot, load_graph
 from utilities import *
 from datetime import datetime
+from collections import deque
 
 
 # whenever update dlls, also update dlls_len
@@ -8,21 +9,21 @@ from datetime import datetime
 
 # ================== temp section ==================
 
-def init_single_graph_fast_refinement(g: "Graph", idx: int):
+def init_single_graph_fast_refinement(vertices: List["SimpleVertex"]):
     """
-    Add two attr to each vertice of a graph:
+    Add one attr to each copy of a vertex, see utilities.copy_vertices() (which already set v.graph_idx and v.idx,
+    the id of v in the CSRGraph of the disjoint union):
     - v.colornum
-    - v.graph_idx
     """
-    for v in g.vertices:
+    for v in vertices:
         v.colornum = v.degree
-        v.graph_idx = idx
 
 
 # tier 0
 def initialization_fast_refinement(graphs: List["Graph"]):
     """
-    Add 4 attr to each vertex, and summarize some overview of the entire disjoint union of all graphs.
+    Add 3 attr to each copy of a vertex, and summarize some overview of the entire disjoint union of all graphs.
+    The vertices are copies, see utilities.copy_vertices(), so the Graph and Vertex objects are left untouched.
     Return:
         - dlls, a dictionary dll of each color, with format:
                 {color1: the_first_vertex_of_color1_regardless_of_which_graph_it_belongs_to,
@@ -35,23 +36,14 @@ def initialization_fast_refinement(graphs: List["Graph"]):
                 color2: number_of_vertices_of_color2_regardless_of_which_graph_it_belongs_to,
                 color3: number_of_vertices_of_color3_regardless_of_which_graph_it_belongs_to,
                }
-       - matrix, an adjacency matrix recording the neighborhood information of all the vertices,
-         in the format:
-              {v1: {nb_of_v1: 1,
-                    nb_of_v1: 1,
-                    nb_of_v1: 1,}
-               v2: {nb_of_v2: 1,
-                    nb_of_v2: 1,
-                    nb_of_v2: 1}
-              }
-          where type(v1) == Vertex, type(nb_of_v2 == Vertex.
-          That is, the "matrix" is actually with many holes, because it's a dict that only records
-          every vertex and it's neighbor:
-              - v2 is v1's neighbour <==> v2 in matrix[v1] == True
-              - v2 is not v1's neighbour <==> v2 in matrix[v1] == False
+       - mtx, a CSRGraph recording the neighborhood information of the disjoint union of all graphs,
+         where vertex v has id v.idx, and its neighbours have ids mtx.neighbours(v.idx)
+       - ref, a reference list to refer back to the copy of a vertex, with format
+              [vertex_of_id_0, vertex_of_id_1, ...]
     """
-    for i in range(len(graphs)):
-        init_single_graph_fast_refinement(graphs[i], i)
+    # adjacency "matrix" of the disjoint union of graphs, built once, and the copies of the vertices
+    mtx, ref = copy_vertices(graphs)
+    init_single_graph_fast_refinement(ref)
 
     # organize graph into dlls
 
@@ -59,25 +51,18 @@ def initialization_fast_refinement(graphs: List["Graph"]):
     dlls = {}
     # dlls_len is recording the lenth of each dll in dlls
     dlls_len = {}
-    # adjacency "matrix" of the disjoint union of graphs
-    mtx = {}
-    for graph in graphs:
-        for v in graph.vertices:
-            # --- record v in dlls and dlls_len ---
-            if v.colornum not in dlls:
-                # add v as the first ele in the dll of its color
-                dlls[v.colornum] = create_new_dll_head(v)
-                dlls_len[v.colornum] = 1
-            else:
-                # insert v to the start of an existing, non-empty dll of its color
-                dlls[v.colornum] = insert_new_head(dlls[v.colornum], v)
-                dlls_len[v.colornum] += 1
-            # --- record v in mtx ---
-            mtx[v] = {}
-            for nb in v.neighbours:
-                mtx[v][nb] = 1
+    for v in ref:
+        # --- record v in dlls and dlls_len ---
+        if v.colornum not in dlls:
+            # add v as the first ele in the dll of its color
+            dlls[v.colornum] = create_new_dll_head(v)
+            dlls_len[v.colornum] = 1
+        else:
+            # insert v to the start of an existing, non-empty dll of its color
+            dlls[v.colornum] = insert_new_head(dlls[v.colornum], v)
+            dlls_len[v.colornum] += 1
 
-    return dlls, dlls_len, mtx
+    return dlls, dlls_len, mtx, ref
 
 
 def insert_new_head(old_head: "Vertex", v:"Vertex"):
@@ -127,12 +112,12 @@ def init_queue(init_dlls):
     Params:
         - init_dlls, the initial dlls
     Return:
-        - q, a list recording every color_key in dlls, apart from the first key
+        - q, a deque recording every color_key in dlls, apart from the first key
         - in_q, a dict of {color_key: 1}, where
             - color_key is in queue <==> color_key in in_q == True
             - color_key is not in queue <==> color_key in in_q == False
     """
-    q = []              # use list becuase list.pop(0) is fast
+    q = deque()         # use deque because deque.popleft() is O(1)
     in_q = {}           # use dict because key in dict check is fast, and dict.pop(key) is fast
     is_first = True
     for key in init_dlls:
@@ -146,127 +131,143 @@ def init_queue(init_dlls):
 
 
 def pop_queue_head(q, in_q):
-    head = q.pop(0)
+    head = q.popleft()
     in_q.pop(head)
     return head
 
 
-def update_queue(q, in_q, old_color: int, new_color: int):
+def update_queue(q, in_q, old_color: int, new_colors, sizes):
     """
     Params:
-        - q: the queue, a list of color class
+        - q: the queue, a deque of color class
         - in_q: whether a color is in queue, a dict of {color_in_queue: 1}
-        - old_color, new_color: some vertices of old_color is going to be split into a new_color, and the rest remains
+        - old_color, new_colors: some vertices of old_color have been split into each of new_colors, and the rest remains
+        - sizes: a dict of {color: size} of old_color and each of new_colors after the split
     """
     if old_color in in_q:
         # if in_q has recorded old_color as one of its key,
-        # then add new_color to queue
-        q.append(new_color)
-        in_q[new_color] = 1
+        # then add all the new_colors to queue
+        to_add = new_colors
     else:
         # in_q has NOT recorded old_color as one of its key,
-        # then add the smaller one of (old_color, new_color) to queue
-        to_add = min(old_color, new_color)
-        q.append(to_add)
-        in_q[to_add] = 1
-
-
-def refine_color(color: int, dlls, dlls_len, mtx, q, in_q):
-    """
-    For a given color color, refine it over all D_i,
-    where D_i is a set of vertices that have i neighbours in the given color class.
-    """
-    # === [1] compute partition D over all i ===
-    # D's format see doc for get_partition_D()
-    D = get_partition_D(color, dlls, mtx)
-
-
-    for num_nb in D:
-        # === [2] for each cell in D, compute L_len, L_v ===
-        # --- where L_len and L_v is the material to decide whether a color class is splittable ---
-        # sub_D is the list of vertex with num_nb neighbours in color C
-        sub_D = D[num_nb]
-        L_v, L_len = investigate_sub_D(sub_D)
+        # then add all but the largest one of old_color and new_colors to queue ("process the smaller half")
+        largest = old_color
+        for color in new_colors:
+            if sizes[color] > sizes[largest]:
+                largest = color
+        to_add = [old_color] + new_colors
+        to_add.remove(largest)
 
-        for old_color in L_v:
-            # ===== [3] split the splittable color class =====
-            # --- and update related values accordingly ---
-            if L_len[old_color] < dlls_len[old_color]:
-                split_color(dlls, old_color, L_v[old_color], q, in_q)
+    for color in to_add:
+        q.append(color)
+        in_q[color] = 1
 
 
-def split_color(dlls, old_color, vertices_to_split, q, in_q):
+def refine_color(color: int, dlls, dlls_len, mtx, ref, q, in_q, next_color):
     """
-    Split an old color class into two parts:
-        - one part remains in the old class
-        - the other part form a new color class
+    For a given color color, refine every color class that has a neighbour in color,
+    by the number of neighbours each of its vertices has in color.
+    Only the neighbours of the vertices in color are visited.
+    Return:
+        - next_color: the smallest color label that is not used yet
     """
+    # === [1] compute partition D of the vertices that have at least 1 neighbour in color ===
+    # D's format see doc for get_partition_D()
+    D = get_partition_D(color, dlls, mtx, ref)
 
-    # === [3.1] generate new color label ===
-    new_color = max(dlls.keys()) + 1
-
-    # === [3.2] update q, in_q ===
-    update_queue(q, in_q, old_color, new_color)
-
-    # === [3.3] move every v in L_v[old_color] from dlls[old_color] to dlls[new_color] ===
-    # --- in the process also update v.colornum ---
-    for v in vertices_to_split:
-        dlls[v.colornum] = remove_v_from_old_dll(v, dlls)  # if v is the head, then after rm v, head has changed
-        add_v_to_new_dll(v, dlls, new_color)
+    for old_color in sorted(D):
+        # ===== [2] split the splittable color class =====
+        # --- and update related values accordingly ---
+        next_color = split_color(dlls, dlls_len, old_color, D[old_color], q, in_q, next_color)
 
-    return None
+    return next_color
 
 
-def investigate_sub_D(sub_D: List["Vertex"]):
+def split_color(dlls, dlls_len, old_color, sub_D, q, in_q, next_color):
     """
+    Split an old color class according to the number of neighbours its vertices have in the popped color:
+        - the vertices with no neighbour in the popped color remain in the old class,
+          or, if there are none, the largest part of sub_D remains in the old class
+        - every other part of sub_D forms a new color class
+    Only the vertices that move are touched.
     Params:
-        - sub_D: a list of vertex
+        - sub_D: a dict of format {num_nb: [list_of_vertices_of_old_color_with_num_nb_neighbours]}
     Return:
-        - L_v: a dict of format {potentially_splittable_color: [list_of_vertices_in_D_of_this_color]}
-        - L_len: a dict of format {potentially_splittable_color: num_of_v_in_D_of_this_color}
+        - next_color: the smallest color label that is not used yet
     """
-    L_v = {}
-    L_len = {}
-    for v in sub_D:
-        if v.colornum not in L_v:
-            L_v[v.colornum] = [v]
-            L_len[v.colornum] = 1
-        else:
-            L_v[v.colornum].append(v)
-            L_len[v.colornum] += 1
-    return L_v, L_len
-
-
-def get_partition_D(C, dlls, mtx):
+    parts = []
+    num_touched = 0
+    for num_nb in sorted(sub_D):
+        parts.append(sub_D[num_nb])
+        num_touched += len(sub_D[num_nb])
+
+    if num_touched == dlls_len[old_color]:
+        if len(parts) == 1:
+            # every vertex has the same number of neighbours, no need to split
+            return next_color
+        # the largest part stays in old_color
+        largest = 0
+        for i in range(1, len(parts)):
+            if len(parts[i]) > len(parts[largest]):
+                largest = i
+        parts.pop(largest)
+
+    # === [2.1] move every v of each part from dlls[old_color] to dlls[new_color] ===
+    # --- in the process also update v.colornum ---
+    new_colors = []
+    sizes = {}
+    for part in parts:
+        # === [2.2] generate new color label ===
+        new_color = next_color
+        next_color += 1
+        for v in part:
+            dlls[v.colornum] = remove_v_from_old_dll(v, dlls)  # if v is the head, then after rm v, head has changed
+            add_v_to_new_dll(v, dlls, new_color)
+        new_colors.append(new_color)
+        sizes[new_color] = len(part)
+    sizes[old_color] = dlls_len[old_color]
+
+    # === [2.3] update q, in_q ===
+    update_queue(q, in_q, old_color, new_colors, sizes)
+
+    return next_color
+
+
+def get_partition_D(C, dlls, mtx, ref):
     """
-    For a given color C, partition all vertices into: D_0, D_1, ..., D_k, (at most k+1 cells)
-        - where D_i is the set of vertices that has i neighbours in C
-        - k is the number of vertices in C
+    For a given color C, partition the vertices that have at least one neighbour in C, first by their color
+    and then into D_1, ..., D_k, where D_i is the set of vertices that has i neighbours in C.
+    The vertices with 0 neighbours in C are left out, so this takes time proportional to the degrees in C.
     Params:
         - C: the target class
-        - dlls, dlls_len, mtx: see definition in initialization_fast_refinement()
+        - dlls, dlls_len, mtx, ref: see definition in initialization_fast_refinement()
     Return:
-        - D: a partition of all the vertices, with the format
-                {0: [list_of_vertices_that_has_0_nb_in_C],
-                 1: [list_of_vertices_that_has_1_nb_in_C],
-                 2: [list_of_vertices_that_has_2_nb_in_C] }
+        - D: a partition of the vertices adjacent to C, with the format
+                {color1: {1: [list_of_vertices_of_color1_that_has_1_nb_in_C],
+                          2: [list_of_vertices_of_color1_that_has_2_nb_in_C]},
+                 color2: {1: [list_of_vertices_of_color2_that_has_1_nb_in_C]} }
     """
+    # nb_count {vertex_id: number_of_neighbours_in_C}, only for the vertices adjacent to C
+    nb_count = {}
+    current = dlls[C]
+    # iter over every vertex in the color C, every vertex in C is a neighbour of its neighbours
+    while current is not None:
+        for nb in mtx.neighbours(current.idx):
+            if nb in nb_count:
+                nb_count[nb] += 1
+            else:
+                nb_count[nb] = 1
+        current = current.next
+
     D = {}
-    # iter over every vertex in the disjoint union
-    for vertex_key in mtx:
-        nb_count = 0
-        current = dlls[C]
-        # iter over every vertex in the color C
-        while current is not None:
-            # if current is neighbour of vertex_key, incr nb_count
-            if current in mtx[vertex_key]:
-                nb_count += 1
-            current = current.next
-        # add vertex_key to D[nb_count]
-        if nb_count in D:
-            D[nb_count].append(vertex_key)
+    for i in nb_count:
+        v = ref[i]
+        if v.colornum not in D:
+            D[v.colornum] = {}
+        if nb_count[i] in D[v.colornum]:
+            D[v.colornum][nb_count[i]].append(v)
         else:
-            D[nb_count] = [vertex_key]
+            D[v.colornum][nb_count[i]] = [v]
 
     return D
 
@@ -431,8 +432,9 @@ list_of_graphs = [G]
 # start time after file-reading
 start = datetime.now()
 
-dlls, dlls_len, matrix = initialization_fast_refinement(list_of_graphs)
+dlls, dlls_len, matrix, reference = initialization_fast_refinement(list_of_graphs)
 q, in_q = init_queue(dlls)
+next_color = max(dlls.keys()) + 1
 
 
 while len(q) > 0:
@@ -444,7 +446,7 @@ while len(q) > 0:
     # print("color {} popped out of queue".format(C))
     # print("now queue is: {}; in_queue is: {}".format(q, in_q))
 
-    refine_color(C, dlls, dlls_len, matrix, q, in_q)
+    next_color = refine_color(C, dlls, dlls_len, matrix, reference, q, in_q, next_color)
 
 
 end = datetime.now()